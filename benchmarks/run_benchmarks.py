@@ -0,0 +1,218 @@
+"""
+Times every stage of the analysis pipeline on synthetic data and measures its memory, the results are written as
+JSON and compared with a baseline run, run it from the root of the repo (the report templates are read from there):
+
+    python -m benchmarks.run_benchmarks --output /tmp/benchmarks.json --baseline /tmp/baseline.json
+"""
+import argparse
+import datetime
+import gc
+import json
+import logging
+import sys
+import time
+import tracemalloc
+
+from pandas_report_tracer.utils.columns_to_work_with import MultiColumnFilters, SingleColumnFilters
+from pandas_report_tracer.utils.instrumentation import peak_rss_bytes
+from pandas_report_tracer.utils.report_generation import generate_data_usage_plot, print_report
+
+from .synthetic import (
+    CARDINALITY, CATEGORY_COLS, DATE_SPREAD_DAYS, JOIN_SELECTIVITY, NAN_RATIO, ROWS, make_frames
+)
+
+MERGING_COLS = ['row_id']
+REPEAT = 3
+# a stage is reported as a regression when it is this ratio slower, or uses this ratio more memory, than the baseline
+TOLERANCE = 0.2
+
+
+def measure(setup, stage, repeat=REPEAT):
+    """Runs 'stage' on the state returned by 'setup' 'repeat' times for the timings, with a fresh state every time,
+    and once more under tracemalloc for its memory, tracing slows down the stage so that run is not timed.
+
+    :param setup: (function) returns the state the stage needs, it is not measured
+    :param stage: (function) receives the state
+    :param repeat: (int) number of timed runs
+    :return: (dict) best and mean 'seconds' and 'cpu_seconds', 'peak_traced_bytes' (python and numpy allocations of
+        the stage above the memory of its state) and the process 'peak_rss_bytes' after it
+    """
+    seconds, cpu_seconds = list(), list()
+    for _ in range(repeat):
+        state = setup()
+        gc.collect()
+        start, cpu_start = time.perf_counter(), time.process_time()
+        stage(state)
+        seconds.append(time.perf_counter() - start)
+        cpu_seconds.append(time.process_time() - cpu_start)
+    state = setup()
+    gc.collect()
+    tracemalloc.start()
+    stage(state)
+    peak_traced_bytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        'seconds': min(seconds),
+        'mean_seconds': sum(seconds) / repeat,
+        'cpu_seconds': min(cpu_seconds),
+        'peak_traced_bytes': peak_traced_bytes,
+        'peak_rss_bytes': peak_rss_bytes()
+    }
+
+
+def _merged_analysis(input_df, resulting_df):
+    analysis = SingleColumnFilters(input_df, resulting_df, MERGING_COLS)
+    analysis.find_matching_cols()
+    analysis._merge_input_to_final()
+    analysis._set_final_df_to_work_with()
+    return analysis
+
+
+def _profiled_analysis(input_df, resulting_df):
+    analysis = _merged_analysis(input_df, resulting_df)
+    analysis.columns_usage_percentage()
+    analysis.get_dtypes_for_natural_divider_cols()
+    return analysis
+
+
+def _complete_analysis(input_df, resulting_df):
+    analysis = SingleColumnFilters(input_df, resulting_df, MERGING_COLS)
+    analysis.make_analysis()
+    return analysis
+
+
+def _slicing_col_filters(analysis, date_cols):
+    for col, dtype in analysis.natural_dividers_dtypes.items():
+        if (dtype == 'date') == date_cols:
+            analysis._determine_slicing_col_filters(col)
+
+
+def _render_report(analysis):
+    print_report(analysis, 'input.csv', 'result.csv', generate_data_usage_plot(analysis))
+
+
+def benchmark_cases(input_df, resulting_df):
+    """The stages of the pipeline, in order, each with the setup that runs the stages before it.
+
+    :param input_df: (DataFrame)
+    :param resulting_df: (DataFrame)
+    :return: (dict) name of the stage to (setup, stage) functions
+    """
+    def new_analysis():
+        analysis = SingleColumnFilters(input_df, resulting_df, MERGING_COLS)
+        analysis.find_matching_cols()
+        return analysis
+
+    return {
+        'merge': (new_analysis, lambda analysis: analysis._merge_input_to_final()),
+        'usage_percentage': (
+            lambda: _merged_analysis(input_df, resulting_df), lambda analysis: analysis.columns_usage_percentage()
+        ),
+        'natural_dividers': (
+            lambda: _merged_analysis(input_df, resulting_df),
+            lambda analysis: (analysis.columns_usage_percentage(), analysis.get_dtypes_for_natural_divider_cols())
+        ),
+        'date_filters': (
+            lambda: _profiled_analysis(input_df, resulting_df), lambda analysis: _slicing_col_filters(analysis, True)
+        ),
+        'category_filters': (
+            lambda: _profiled_analysis(input_df, resulting_df), lambda analysis: _slicing_col_filters(analysis, False)
+        ),
+        'make_analysis': (
+            lambda: SingleColumnFilters(input_df, resulting_df, MERGING_COLS), lambda analysis: analysis.make_analysis()
+        ),
+        'multi_column_combos': (
+            lambda: MultiColumnFilters(input_df, resulting_df, MERGING_COLS),
+            lambda analysis: analysis.get_multi_column_filters()
+        ),
+        'report_rendering': (lambda: _complete_analysis(input_df, resulting_df), _render_report)
+    }
+
+
+def run_benchmarks(data_params, repeat=REPEAT, stages=None):
+    """Measures the stages of the pipeline on the synthetic DFs of 'make_frames'.
+
+    :param data_params: (dict) keyword arguments of 'make_frames'
+    :param repeat: (int) number of timed runs of every stage
+    :param stages: (list) names of the stages to run, all of them by default
+    :return: (dict) the 'data_params', the 'created' date and the measures of the 'stages'
+    """
+    input_df, resulting_df = make_frames(**data_params)
+    results = {'created': datetime.datetime.now().isoformat(), 'data_params': data_params, 'stages': dict()}
+    for name, (setup, stage) in benchmark_cases(input_df, resulting_df).items():
+        if stages and name not in stages:
+            continue
+        results['stages'][name] = measure(setup, stage, repeat)
+        logging.info("Benchmark {}: {}".format(name, results['stages'][name]))
+    return results
+
+
+def compare_with_baseline(results, baseline, tolerance=TOLERANCE):
+    """The stages slower, or using more traced memory, than in the 'baseline' by more than 'tolerance'.
+
+    :param results: (dict) returned by 'run_benchmarks'
+    :param baseline: (dict) returned by 'run_benchmarks', usually loaded from a previous JSON
+    :param tolerance: (float) ratio over the baseline allowed
+    :return: (list) dicts with the 'stage', the 'measure' and its 'baseline' and 'current' values and 'ratio'
+    """
+    if results['data_params'] != baseline['data_params']:
+        logging.warning("The baseline was run with other data params: {}".format(baseline['data_params']))
+    regressions = list()
+    for name, measures in results['stages'].items():
+        baseline_measures = baseline['stages'].get(name)
+        if baseline_measures is None:
+            continue
+        for measure_name in ('seconds', 'peak_traced_bytes'):
+            ratio = measures[measure_name] / max(baseline_measures[measure_name], 1e-9)
+            if ratio > 1 + tolerance:
+                regressions.append({
+                    'stage': name,
+                    'measure': measure_name,
+                    'baseline': baseline_measures[measure_name],
+                    'current': measures[measure_name],
+                    'ratio': ratio
+                })
+    return regressions
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', help='JSON file the results are written to')
+    parser.add_argument('--baseline', help='JSON file of a previous run to compare with')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    parser.add_argument('--repeat', type=int, default=REPEAT)
+    parser.add_argument('--stages', nargs='*', help='stages to run, all of them by default')
+    parser.add_argument('--rows', type=int, default=ROWS)
+    parser.add_argument('--category-cols', type=int, default=CATEGORY_COLS)
+    parser.add_argument('--cardinality', type=int, default=CARDINALITY)
+    parser.add_argument('--date-spread-days', type=int, default=DATE_SPREAD_DAYS)
+    parser.add_argument('--nan-ratio', type=float, default=NAN_RATIO)
+    parser.add_argument('--join-selectivity', type=float, default=JOIN_SELECTIVITY)
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+    data_params = {
+        'rows': args.rows, 'category_cols': args.category_cols, 'cardinality': args.cardinality,
+        'date_spread_days': args.date_spread_days, 'nan_ratio': args.nan_ratio,
+        'join_selectivity': args.join_selectivity, 'seed': args.seed
+    }
+    results = run_benchmarks(data_params, args.repeat, args.stages)
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+    for name, measures in results['stages'].items():
+        print('{:<20} {:>9.3f}s {:>12} traced bytes'.format(name, measures['seconds'], measures['peak_traced_bytes']))
+    if not args.baseline:
+        return 0
+    with open(args.baseline) as baseline_file:
+        regressions = compare_with_baseline(results, json.load(baseline_file), args.tolerance)
+    for regression in regressions:
+        print('Regression in {stage}: {measure} {baseline} -> {current} ({ratio:.2f}x)'.format(**regression))
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+
+from pandas_report_tracer.utils.columns_to_work_with import TODAY
+
+CARDINALITY = 50
+CATEGORY_COLS = 4
+DATE_SPREAD_DAYS = 730
+JOIN_SELECTIVITY = 0.3
+NAN_RATIO = 0.02
+ROWS = 200000
+# ratio of the categories of every category column that never make it to the result
+UNUSED_CATEGORIES_RATIO = 0.25
+
+
+def make_frames(rows=ROWS, category_cols=CATEGORY_COLS, cardinality=CARDINALITY, date_spread_days=DATE_SPREAD_DAYS,
+                nan_ratio=NAN_RATIO, join_selectivity=JOIN_SELECTIVITY, seed=0):
+    """Synthetic input and result DFs with the shape the analysis looks for: a unique 'row_id' key, a high
+    cardinality 'customer_id', 'category_cols' string columns of 'cardinality' values, a 'ship_date' spread over
+    'date_spread_days' days up to TODAY and a float 'amount'. The result keeps, out of the input rows shipped in the
+    second half of the date spread whose categories are not among the 'UNUSED_CATEGORIES_RATIO' unused ones, a
+    random sample of about 'join_selectivity' of the input rows.
+
+    :param rows: (int) rows of the input
+    :param category_cols: (int) number of category columns
+    :param cardinality: (int) distinct values of every category column
+    :param date_spread_days: (int) days between the oldest 'ship_date' and TODAY
+    :param nan_ratio: (float) ratio of nans in the category and date columns
+    :param join_selectivity: (float) rows of the result as a ratio of the rows of the input, at most the rows that
+        pass the conditions above
+    :param seed: (int) seed of the random generator
+    :return: (tuple) input DF, result DF
+    """
+    rng = np.random.RandomState(seed)
+    input_df = pd.DataFrame({
+        'row_id': np.arange(rows),
+        'customer_id': rng.randint(0, max(rows // 10, 1), rows),
+        'amount': rng.gamma(2., 50., rows)
+    })
+    kept_rows = np.ones(rows, dtype=bool)
+    used_categories = cardinality - int(cardinality * UNUSED_CATEGORIES_RATIO)
+    for col_number in range(category_cols):
+        codes = rng.randint(0, cardinality, rows)
+        kept_rows &= codes < used_categories
+        values = np.array(['cat{}_{}'.format(col_number, code) for code in range(cardinality)], dtype=object)
+        input_df['category_{}'.format(col_number)] = np.where(rng.rand(rows) < nan_ratio, np.nan, values[codes])
+    days_ago = rng.randint(0, date_spread_days, rows)
+    kept_rows &= days_ago < date_spread_days // 2
+    ship_date = pd.Timestamp(TODAY) - pd.to_timedelta(days_ago, unit='D')
+    input_df['ship_date'] = ship_date.where(rng.rand(rows) >= nan_ratio)
+    kept_df = input_df.loc[kept_rows & input_df['ship_date'].notna().values]
+    result_rows = min(int(rows * join_selectivity), len(kept_df))
+    result_cols = ['row_id', 'customer_id', 'category_0', 'ship_date']
+    resulting_df = kept_df.sample(n=result_rows, random_state=seed)[result_cols].reset_index(drop=True)
+    resulting_df['value'] = rng.rand(result_rows)
+    return input_df, resulting_df
@@ -0,0 +1,322 @@
+"""
+Command line interface of the tool, run as a module (the repo is not an installable package, there is no console
+script) from the root of the repo, the report templates are read from there:
+
+    python -m pandas_report_tracer analyze --input-path /tmp/input --result-path /tmp/result
+    python -m pandas_report_tracer iterate --input-path /tmp/input --result-path /tmp/result --max-runs 3
+    python -m pandas_report_tracer report /tmp/analyses.pickle --combined
+
+'analyze' analyses every input against the result, 'iterate' filters the first input run after run while the
+filters pay off, and 'report' renders the analyses saved by 'analyze --save-analyses'. The merging and renaming
+dicts are given as JSON, e.g. --merging-dict '{"/tmp/input/example.csv": ["revisionId"]}'.
+
+pandas is imported once a subcommand starts, plotly and jinja2 only to write reports, so a batch job that only needs
+the findings ('--no-report --findings findings.json') never loads them.
+"""
+import argparse
+import datetime
+import json
+import logging
+import numbers
+import pickle
+import sys
+
+INPUT_PATH = "/tmp/input"
+MAX_NUMBER_OF_RUNS = 3
+MIN_BENEFIT_RATIO = 0.2
+RESULT_PATH = "/tmp/result"
+
+
+def _json_default(value):
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if isinstance(value, numbers.Integral):
+        return int(value)
+    if isinstance(value, numbers.Real):
+        return float(value)
+    return str(value)
+
+
+def findings(analysis, input_file):
+    """The findings of an analysis that can be written as JSON, without its frames.
+
+    :param analysis: (SingleColumnFilters) an analysed object
+    :param input_file: (str) path of the input
+    :return: (dict)
+    """
+    return {
+        'input_file': input_file,
+        'overall_percentage': analysis.overall_percentage,
+        'usage_percentage': analysis.usage_percentage,
+        'best_filter': getattr(analysis, 'best_filter', None),
+        'filtering_quick_gains': analysis.filtering_quick_gains,
+        'filter_plan': analysis.filter_plan,
+        'predicates': analysis.predicates
+    }
+
+
+def _write_findings(all_findings, findings_file):
+    with open(findings_file, 'w') as output:
+        json.dump(all_findings, output, default=_json_default, indent=2)
+
+
+def _write_reports(analyses, result_file, combined, output_dir):
+    from .utils.report_generation import generate_data_usage_plot, print_combined_report, print_report
+    if combined:
+        report_paths = [print_combined_report(
+            [analysis for _, analysis in analyses], [input_file for input_file, _ in analyses], result_file,
+            output_dir
+        )]
+    else:
+        report_paths = [
+            print_report(analysis, input_file, result_file, generate_data_usage_plot(analysis), output_dir)
+            for input_file, analysis in analyses
+        ]
+    for report_path in report_paths:
+        logging.info("Report written to {}".format(report_path))
+
+
+def _finish(analyses, result_file, args):
+    """Writes the outputs asked for of the finished 'analyses', a list of (input file, analysis) pairs."""
+    if args.findings:
+        _write_findings([findings(analysis, input_file) for input_file, analysis in analyses], args.findings)
+    if args.save_analyses:
+        with open(args.save_analyses, 'wb') as output:
+            pickle.dump({'result_file': result_file, 'analyses': analyses}, output)
+    if not args.no_report:
+        _write_reports(analyses, result_file, args.combined, args.report_dir)
+
+
+def _analysis_kwargs(args):
+    from .utils.instrumentation import Instrumentation
+    return {
+        'categorical': args.categorical, 'date_window': args.date_window,
+        'instrumentation': Instrumentation(stats_file=args.stats_file)
+    }
+
+
+def _input_options(args, profile_cache):
+    """The arguments of 'analyze_input' given on the command line, the same for every input and for the sequential
+    and the parallel runs.
+
+    """
+    return {
+        'chunksize': args.chunksize, 'sample_size': args.sample_size, 'plan_filters': args.plan_filters,
+        'parquet_copy_dir': args.parquet_copy_dir, 'profile_cache': profile_cache, 'n_jobs': args.n_jobs,
+        'analysis_kwargs': _analysis_kwargs(args)
+    }
+
+
+def _analyze_in_parallel(filenames, resulting_df, profile_cache, args):
+    from .utils.parallel_analysis import analyze_inputs_in_parallel
+    from .utils.scratch_store import ScratchStore
+    scratch_store = ScratchStore(args.scratch_dir) if args.scratch_dir else None
+    try:
+        return analyze_inputs_in_parallel(
+            filenames, resulting_df, args.merging_dict, args.renaming_cols_dict, args.parallel_workers,
+            scratch_store, **_input_options(args, profile_cache)
+        )
+    finally:
+        if scratch_store:
+            scratch_store.close()
+
+
+def analyze(args):
+    from .utils.input_analysis import analyze_input
+    from .utils.loading import list_data_files, load_result
+    from .utils.profile_cache import ProfileCache
+    from .utils.result_index import ResultIndex
+    result_file = list_data_files(args.result_path)[0]
+    filenames = list_data_files(args.input_path)
+    # only the result columns shared with the inputs are loaded, with the date columns already parsed
+    resulting_df = load_result(result_file, filenames, args.merging_dict, args.renaming_cols_dict)
+    profile_cache = ProfileCache(args.profile_cache_dir)
+    if args.parallel_workers:
+        # every worker profiles the result once for the inputs it analyses, the input profiles are cached
+        analyses = _analyze_in_parallel(filenames, resulting_df, profile_cache, args)
+    else:
+        # the result is profiled and its merge keys hashed once for all the inputs
+        result_index = ResultIndex(resulting_df, profile_cache.load_profile(result_file, resulting_df))
+        analyses = [
+            analyze_input(
+                csv_file, result_index, args.merging_dict.get(csv_file), args.renaming_cols_dict.get(csv_file),
+                **_input_options(args, profile_cache)
+            ) for csv_file in filenames
+        ]
+        profile_cache.store_profile(result_index.profile)
+    _finish(list(zip(filenames, analyses)), result_file, args)
+    return 0
+
+
+def _iteration_analysis(input_file, result_index, args):
+    """The analysis 'iterate' runs again every run: a chunked one if the input is streamed, that reads the file
+    filtered by the previous run, otherwise the same incremental one, that subtracts the rows filtered before.
+
+    """
+    from .utils.chunked_analysis import ChunkedSingleColumnFilters
+    from .utils.incremental_analysis import IncrementalSingleColumnFilters
+    from .utils.loading import load_frame
+    merging_cols, renaming_cols = args.merging_dict.get(input_file), args.renaming_cols_dict.get(input_file)
+    if args.chunksize:
+        return lambda: ChunkedSingleColumnFilters(
+            input_file, result_index.resulting_df, merging_cols, renaming_cols, chunksize=args.chunksize,
+            result_profile=result_index.profile, result_index=result_index, **_analysis_kwargs(args)
+        )
+    # every input column is loaded, the filtered input is saved over the original file
+    input_df = load_frame(input_file).rename(columns=renaming_cols or dict())
+    incremental_analysis = result_index.analysis(
+        input_df, merging_cols, IncrementalSingleColumnFilters, input_file_name=input_file, **_analysis_kwargs(args)
+    )
+    return lambda: incremental_analysis
+
+
+def iterate(args):
+    from .utils.loading import list_data_files, load_result
+    from .utils.scratch_store import ScratchStore
+    result_file = list_data_files(args.result_path)[0]
+    input_file = list_data_files(args.input_path)[0]
+    resulting_df = load_result(result_file, [input_file], args.merging_dict, args.renaming_cols_dict)
+    scratch_store = ScratchStore(args.scratch_dir) if args.scratch_dir else None
+    try:
+        if scratch_store:
+            resulting_df = scratch_store.spill_and_open('result', resulting_df)
+        run_findings = _run_iterations(result_file, input_file, resulting_df, args)
+    finally:
+        if scratch_store:
+            scratch_store.close()
+    if args.findings:
+        _write_findings(run_findings, args.findings)
+    return 0
+
+
+def _run_iterations(result_file, input_file, resulting_df, args):
+    """Filters the input run after run until the benefit of a run falls under 'min_benefit_ratio'.
+
+    :return: (list) the findings of every run
+    """
+    from .utils.profile_cache import ProfileCache
+    from .utils.result_index import ResultIndex
+    # the result does not change between runs, it is profiled (or read from the cache) and its keys hashed once
+    profile_cache = ProfileCache(args.profile_cache_dir)
+    result_index = ResultIndex(resulting_df, profile_cache.load_profile(result_file, resulting_df))
+    next_analysis = _iteration_analysis(input_file, result_index, args)
+    run_findings = list()
+    for run_number in range(args.max_runs):
+        logging.info("Starting run: {}".format(run_number + 1))
+        analysis = next_analysis()
+        analysis.make_analysis(apply_filter=True, n_jobs=args.n_jobs)
+        if not run_number:
+            input_rows = analysis.input_profile.n_rows
+        logging.info("Applied weighted benefit: {}".format(analysis.max_weighted_benefit))
+        # the incremental analysis is the same object every run, so every run is reported as soon as it is over
+        run_findings.append(dict(findings(analysis, input_file), run=run_number + 1))
+        if not args.no_report:
+            _write_reports([(input_file, analysis)], result_file, False, args.report_dir)
+        if args.chunksize:
+            # only the findings of a finished run are kept, the next one streams the filtered csv again
+            analysis.release_frames()
+        if analysis.max_weighted_benefit / input_rows < args.min_benefit_ratio:
+            break
+    if not args.chunksize:
+        analysis.save_inputfile()
+    profile_cache.store_profile(result_index.profile)
+    return run_findings
+
+
+def report(args):
+    with open(args.analyses, 'rb') as saved:
+        saved_analyses = pickle.load(saved)
+    _write_reports(saved_analyses['analyses'], saved_analyses['result_file'], args.combined, args.report_dir)
+    return 0
+
+
+def _add_analysis_arguments(parser):
+    parser.add_argument('--input-path', default=INPUT_PATH, help='directory of the input files')
+    parser.add_argument('--result-path', default=RESULT_PATH, help='directory of the result file')
+    parser.add_argument('--merging-dict', type=json.loads, default=dict(),
+                        help='JSON object of input path to list of columns to merge it to the result on')
+    parser.add_argument('--renaming-cols-dict', type=json.loads, default=dict(),
+                        help='JSON object of input path to object of columns to rename to match the result')
+    parser.add_argument('--categorical', action='store_true',
+                        help='encode the low cardinality string columns as categoricals shared by input and result')
+    parser.add_argument('--chunksize', type=int, help='stream the inputs in batches of this number of rows')
+    parser.add_argument('--date-window', choices=['exact', 'month', 'quarter'],
+                        help='filter dates outside the result window instead of fixed slices')
+    parser.add_argument('--n-jobs', type=int, default=1, help='threads the per column work is spread over')
+    parser.add_argument('--profile-cache-dir', help='directory to reuse the column profiles of unchanged files')
+    parser.add_argument('--scratch-dir', help='directory to spill the result to a memory-mapped Feather file')
+    parser.add_argument('--stats-file', help='path to append the timings and memory of the stages as JSON lines')
+    _add_output_arguments(parser)
+    parser.add_argument('--findings', help='JSON file the findings of the analyses are written to')
+    parser.add_argument('--no-report', action='store_true', help='do not write the html reports')
+
+
+def _add_output_arguments(parser):
+    parser.add_argument('--report-dir', default='/tmp', help='directory the html reports are written to')
+
+
+def command_argv(command, **options):
+    """Command line of 'command' with the 'options' set, for the scripts that keep their settings as constants: an
+    option is left out if None or False, a flag if True and dicts are written as JSON.
+
+        command_argv('analyze', chunksize=1000, categorical=True) == ['analyze', '--chunksize', '1000', '--categorical']
+
+    :param command: (str) the subcommand, e.g. 'analyze'
+    :param options: option name (with underscores) to value
+    :return: (list) the arguments for 'main'
+    """
+    argv = [command]
+    for name, value in options.items():
+        if value is None or value is False:
+            continue
+        argv.append('--' + name.replace('_', '-'))
+        if value is not True:
+            argv.append(json.dumps(value) if isinstance(value, dict) else str(value))
+    return argv
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog='pandas_report_tracer', description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('--log-level', default='INFO', help='level of the logged progress, e.g. WARNING')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    analyze_parser = subparsers.add_parser('analyze', help='analyse every input against the result')
+    _add_analysis_arguments(analyze_parser)
+    analyze_parser.add_argument('--parallel-workers', type=int, help='analyse the inputs in this many processes')
+    analyze_parser.add_argument('--sample-size', type=int,
+                                help='estimate the findings from a sample, confirming only the top ones')
+    analyze_parser.add_argument('--plan-filters', type=int, help='rank a plan of this many filters applied together')
+    analyze_parser.add_argument('--parquet-copy-dir',
+                                help='directory for Parquet copies of the inputs to measure the saving of the filters')
+    analyze_parser.add_argument('--combined', action='store_true', help='one report for all the inputs')
+    analyze_parser.add_argument('--save-analyses', help="file the analyses are saved to, for 'report'")
+    analyze_parser.set_defaults(func=analyze)
+
+    iterate_parser = subparsers.add_parser('iterate', help='filter the first input run after run')
+    _add_analysis_arguments(iterate_parser)
+    iterate_parser.add_argument('--max-runs', type=int, default=MAX_NUMBER_OF_RUNS)
+    iterate_parser.add_argument('--min-benefit-ratio', type=float, default=MIN_BENEFIT_RATIO,
+                                help='stop once a run filters less than this ratio of the input rows')
+    iterate_parser.set_defaults(func=iterate)
+
+    report_parser = subparsers.add_parser('report', help="render the analyses saved by 'analyze --save-analyses'")
+    report_parser.add_argument('analyses', help="file written by 'analyze --save-analyses'")
+    report_parser.add_argument('--combined', action='store_true', help='one report for all the inputs')
+    _add_output_arguments(report_parser)
+    report_parser.set_defaults(func=report)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+    logging.basicConfig(level=args.log_level.upper(), format='%(asctime)s %(levelname)s %(message)s')
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
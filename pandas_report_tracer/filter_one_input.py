@@ -1,21 +1,22 @@
 """
 Small advise: clean your input DF so that it doesn't contain columns with different names but same information
 """
-import glob
-import logging
+import os
+import sys
 
-import pandas as pd
-
-from utils.columns_to_work_with import SingleColumnFilters
-from utils.report_generation import print_report, generate_data_usage_plot
-
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
+# run as a script from this directory, the cli is imported from the package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pandas_report_tracer.cli import command_argv, main  # noqa: E402
 
+CATEGORICAL = False  # encode the low cardinality string columns as categoricals shared by input and result
+CHUNKSIZE = None  # set to a number of rows to stream an input larger than memory
+DATE_WINDOW = None  # 'exact', 'month' or 'quarter' to filter dates outside the result window instead of fixed slices
 INPUT_PATH = "/tmp/input"
 MAX_NUMBER_OF_RUNS = 3
 MIN_BENEFIT_RATIO = 0.2
+PROFILE_CACHE_DIR = None  # set to a directory to reuse the result profile while the result file does not change
 RESULT_PATH = "/tmp/result"
+SCRATCH_DIR = None  # set to a directory to keep the result memory-mapped from a Feather file while the runs go on
 MERGING_DICT = {
     "/tmp/input/committed_revisions_all.csv": ["revisionId"]
 }
@@ -25,29 +26,9 @@ RENAMING_COLS_DICT = {
 
 
 if __name__ == "__main__":
-    result_file = glob.glob(RESULT_PATH + "/*.csv")
-    resulting_df = pd.read_csv(result_file[0], escapechar='\\')
-    filenames = glob.glob(INPUT_PATH + "/*.csv")
-    input_df = pd.read_csv(filenames[0], escapechar='\\')
-    if filenames[0] in RENAMING_COLS_DICT:
-        input_df = input_df.rename(columns=RENAMING_COLS_DICT[filenames[0]])
-    results = dict()
-    for run_number in range(MAX_NUMBER_OF_RUNS):
-        logging.info("-----------------" * 5)
-        logging.info("Starting run: {}".format(str(run_number + 1)))
-        if run_number == 0:
-            input_df_row_num = len(input_df)
-        else:
-            input_df = results[run_number - 1].input_df
-        if filenames[0] in MERGING_DICT:
-            results[run_number] = SingleColumnFilters(
-                input_df, resulting_df, MERGING_DICT[filenames[0]], input_file_name=filenames[0]
-            )
-        else:
-            results[run_number] = SingleColumnFilters(input_df, resulting_df, input_file_name=filenames[0])
-        results[run_number].make_analysis(apply_filter=True)
-        data_usage_plot = generate_data_usage_plot(results[run_number])
-        print_report(results[run_number], filenames[0], result_file, data_usage_plot)
-        logging.info("Applied weighted benefit: {}".format(str(results[run_number].max_weighted_benefit)))
-        if (results[run_number].max_weighted_benefit / input_df_row_num) < MIN_BENEFIT_RATIO:
-            break
+    sys.exit(main(command_argv(
+        'iterate', input_path=INPUT_PATH, result_path=RESULT_PATH, merging_dict=MERGING_DICT,
+        renaming_cols_dict=RENAMING_COLS_DICT, categorical=CATEGORICAL, chunksize=CHUNKSIZE, date_window=DATE_WINDOW,
+        max_runs=MAX_NUMBER_OF_RUNS, min_benefit_ratio=MIN_BENEFIT_RATIO, profile_cache_dir=PROFILE_CACHE_DIR,
+        scratch_dir=SCRATCH_DIR
+    )))
@@ -1,15 +1,25 @@
 """
 clean your input DF so that it doesn't contain columns with different names but same information
 """
-import glob
+import os
+import sys
 
-import pandas as pd
-
-from utils.columns_to_work_with import SingleColumnFilters
-from utils.report_generation import generate_data_usage_plot, print_report
+# run as a script from this directory, the cli is imported from the package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pandas_report_tracer.cli import command_argv, main  # noqa: E402
 
+CATEGORICAL = False  # encode the low cardinality string columns as categoricals shared by input and result
+CHUNKSIZE = None  # set to a number of rows to stream inputs larger than memory
+DATE_WINDOW = None  # 'exact', 'month' or 'quarter' to filter dates outside the result window instead of fixed slices
 INPUT_PATH = "/tmp/input"
+PARALLEL_WORKERS = None  # set to a number of processes to analyze the inputs in parallel, in one combined report
+PARQUET_COPY_DIR = None  # set to a directory for Parquet copies of the inputs to measure the saving of the filters
+PLAN_FILTERS = None  # set to a number of filters to rank a plan of filters to apply together, shown in the report
+PROFILE_CACHE_DIR = None  # set to a directory to reuse the column profiles of unchanged files between sweeps
 RESULT_PATH = "/tmp/result"
+SAMPLE_SIZE = None  # set to a number of rows to estimate the findings from a sample, confirming only the top ones
+SCRATCH_DIR = None  # set to a directory to spill the result to a Feather file the parallel workers memory-map
+STATS_FILE = None  # set to a path to append the timings and memory of every stage and column as JSON lines
 MERGING_DICT = {
     "/tmp/input/AMSBillofLandingHeaders-2018-sample.csv": ["index"]
 }
@@ -19,18 +29,10 @@ RENAMING_COLS_DICT = {
 
 
 if __name__ == "__main__":
-    result_file = glob.glob(RESULT_PATH + "/*.csv")
-    resulting_df = pd.read_csv(result_file[0], escapechar='\\')
-    filenames = glob.glob(INPUT_PATH + "/*.csv")
-    for csv_file in filenames:
-        input_df = pd.read_csv(csv_file, escapechar='\\')
-        if csv_file in RENAMING_COLS_DICT:
-            input_df = input_df.rename(columns=RENAMING_COLS_DICT[csv_file])
-        if csv_file in MERGING_DICT:
-            x = SingleColumnFilters(input_df, resulting_df, MERGING_DICT[csv_file])
-        else:
-            x = SingleColumnFilters(input_df, resulting_df)
-        x.make_analysis()
-
-        data_usage_plot = generate_data_usage_plot(x)
-        print_report(x, filenames[0], result_file[0], data_usage_plot)
+    sys.exit(main(command_argv(
+        'analyze', input_path=INPUT_PATH, result_path=RESULT_PATH, merging_dict=MERGING_DICT,
+        renaming_cols_dict=RENAMING_COLS_DICT, categorical=CATEGORICAL, chunksize=CHUNKSIZE, date_window=DATE_WINDOW,
+        parallel_workers=PARALLEL_WORKERS, combined=bool(PARALLEL_WORKERS), parquet_copy_dir=PARQUET_COPY_DIR,
+        plan_filters=PLAN_FILTERS, profile_cache_dir=PROFILE_CACHE_DIR, sample_size=SAMPLE_SIZE, scratch_dir=SCRATCH_DIR,
+        stats_file=STATS_FILE
+    )))
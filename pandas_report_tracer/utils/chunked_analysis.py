@@ -0,0 +1,338 @@
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_datetime64_any_dtype
+
+from .column_profile import ColumnProfile
+from .columns_to_work_with import SingleColumnFilters
+from .loading import READ_CSV_KWARGS
+from .result_index import key_index, rows_with_keys
+from .sketches import RELATIVE_ERROR, HyperLogLog
+
+BOOL_VALUES = {'True': True, 'TRUE': True, 'true': True, 'False': False, 'FALSE': False, 'false': False}
+CHUNKSIZE = 100000
+# a column of a streamed input with more distinct values than this is sketched instead of counted, see 'add_chunk'
+MAX_COUNTED_VALUES = 100000
+
+
+def infer_dtype(values):
+    """The dtype pandas infers reading a whole csv column with the text 'values', e.g. int64 if they are all integer
+    numbers, or float64 if some are missing too.
+
+    :param values: (array like) the distinct texts of a column, nans included
+    :return: (numpy dtype)
+    """
+    values = pd.Series(values, dtype=object)
+    non_na = values.dropna()
+    has_na = len(non_na) < len(values)
+    if not len(non_na):
+        return np.dtype('float64')
+    try:
+        numeric_dtype = pd.to_numeric(non_na).dtype
+    except (ValueError, TypeError):
+        is_bool = not has_na and non_na.isin(list(BOOL_VALUES)).all()
+        return np.dtype(bool) if is_bool else np.dtype(object)
+    return np.dtype('float64') if has_na and numeric_dtype.kind in 'iu' else numeric_dtype
+
+
+def combine_dtypes(dtype, other_dtype):
+    """The dtype 'infer_dtype' gives to all the values of a column from the dtypes it gives to two parts of them.
+
+    :param dtype: (numpy dtype)
+    :param other_dtype: (numpy dtype)
+    :return: (numpy dtype)
+    """
+    if dtype == other_dtype:
+        return dtype
+    if object in (dtype, other_dtype) or bool in (dtype, other_dtype):
+        return np.dtype(object)
+    return np.result_type(dtype, other_dtype)
+
+
+def cast_column(series, dtype):
+    """Converts the text column 'series' to 'dtype', returned by 'infer_dtype'.
+
+    :param series: (pandas series) of dtype object
+    :param dtype: (numpy dtype)
+    :return: (pandas series)
+    """
+    if series.dtype != object or dtype == object:
+        return series
+    if dtype == bool:
+        return series.map(BOOL_VALUES).astype(bool)
+    return pd.to_numeric(series).astype(dtype)
+
+
+def cast_frame(df, dtypes):
+    """Converts the text columns of 'df' with a dtype in 'dtypes'.
+
+    :param df: (DataFrame)
+    :param dtypes: (dict) name of the column to numpy dtype
+    :return: (DataFrame)
+    """
+    return df.assign(**{col: cast_column(df[col], dtypes[col]) for col in df.columns if col in dtypes})
+
+
+class ChunkedColumnProfile(ColumnProfile):
+    """ColumnProfile of a csv that is never fully loaded, the value counts of each chunk are folded into the
+    running counts so the memory needed depends on the number of distinct values per column, not on the rows. A
+    column with more than 'max_counted_values' distinct values (ids, free text) stops being counted, from then on
+    its chunks are added to a HyperLogLog sketch, so the memory and the cost of folding a chunk stay bounded.
+
+    """
+
+    def __init__(self, max_counted_values=MAX_COUNTED_VALUES):
+        super().__init__(pd.DataFrame())
+        self.max_counted_values = max_counted_values
+        self._n_rows = 0
+        self._sketches = dict()
+        self._sketch_dtypes = dict()
+
+    @property
+    def n_rows(self):
+        return self._n_rows
+
+    def add_chunk(self, chunk):
+        """Folds the value counts of every column of 'chunk' into the profile, or adds the column to its sketch.
+        The date columns are always counted, the date analysis needs their sorted counts.
+
+        :param chunk: (DataFrame) a chunk of the input csv
+        """
+        self._n_rows += len(chunk)
+        for col in chunk.columns:
+            if col in self._sketches:
+                self._add_to_sketch(col, chunk[col])
+                continue
+            counts = chunk[col].value_counts(dropna=False)
+            if col in self._value_counts:
+                counts = self._value_counts[col].add(counts, fill_value=0)
+            if len(counts) > self.max_counted_values and not is_datetime64_any_dtype(chunk[col]):
+                self._value_counts.pop(col, None)
+                self._sketches[col] = HyperLogLog.for_error(RELATIVE_ERROR)
+                self._add_to_sketch(col, pd.Series(counts.index, dtype=counts.index.dtype))
+                continue
+            self._value_counts[col] = counts.astype('int64')
+            self._cumulative_counts.pop(col, None)
+
+    def _add_to_sketch(self, col, values):
+        self._sketches[col].add_series(values)
+        if values.dtype == object:
+            dtype = infer_dtype(values.unique())
+            self._sketch_dtypes[col] = combine_dtypes(self._sketch_dtypes.get(col, dtype), dtype)
+
+    def value_counts(self, col):
+        return self._value_counts[col]
+
+    def worth_sketching(self, col):
+        return col in self._sketches
+
+    def n_unique_bounds(self, col, relative_error=RELATIVE_ERROR):
+        if col in self._sketches:
+            return self._sketches[col].bounds()
+        return super().n_unique_bounds(col, relative_error)
+
+    def infer_dtypes(self):
+        """Converts the counts of the texts of every column, as they are read, to counts of the values of the dtype
+        inferred from all its texts, so the same value is counted once whatever chunks it is in. The dtype of a
+        sketched column is inferred chunk by chunk.
+
+        :return: (dict) name of the column to numpy dtype
+        """
+        dtypes = dict(self._sketch_dtypes)
+        for col, counts in self._value_counts.items():
+            if counts.index.dtype != object:
+                continue
+            dtypes[col] = infer_dtype(counts.index)
+            if dtypes[col] == object:
+                continue
+            non_na = ~counts.index.isna()
+            values = cast_column(pd.Series(counts.index[non_na], dtype=object), dtypes[col])
+            cast_counts = pd.Series(counts.values[non_na], index=values.values).groupby(level=0, sort=False).sum()
+            nan_rows = counts.values[~non_na].sum()
+            if nan_rows:
+                cast_counts = pd.concat([cast_counts, pd.Series([nan_rows], index=[np.nan])])
+            self._value_counts[col] = cast_counts.astype('int64').sort_values(ascending=False)
+            self._cumulative_counts.pop(col, None)
+        return dtypes
+
+    def invalidate(self, col):
+        """The chunks are gone, so instead of dropping the folded counts of the column 'col' they are re-keyed by
+        its values parsed to datetime, the only transformation the analysis applies to the input columns.
+
+        :param col: (str) the name of the column
+        """
+        counts = self._value_counts[col]
+        parsed_index = pd.to_datetime(counts.index)
+        non_na = ~parsed_index.isna()
+        parsed_counts = pd.Series(counts.values[non_na], index=parsed_index[non_na]).groupby(level=0).sum()
+        nan_rows = counts.values[~non_na].sum()
+        if nan_rows:
+            parsed_counts = pd.concat([parsed_counts, pd.Series([nan_rows], index=pd.DatetimeIndex([pd.NaT]))])
+        self._value_counts[col] = parsed_counts.astype('int64')
+        self._cumulative_counts.pop(col, None)
+
+
+class ChunkedSingleColumnFilters(SingleColumnFilters):
+    """SingleColumnFilters for input csv files larger than memory: the input is read in 'chunksize' batches, each
+    batch is folded into a ChunkedColumnProfile and merged to the 'resulting_df' keeping only the rows with keys in
+    the result, so the peak memory is bounded by the chunk size plus the result side frames and distinct values.
+    Only the first chunk is kept as 'input_df', as a sample for the dtype checks.
+
+    pandas would infer the dtypes of each chunk on its own, so a column could be int in a chunk and object in the
+    next one, counting 1 and '1' as different values. The chunks are read as text instead and their columns are
+    cast to the dtypes inferred from all the values of the column once the first pass is over ('input_dtypes'). The
+    date columns are parsed as they are read, as 'load_frame' does, so they are counted as the dates of the result.
+
+    The high cardinality columns the 'input_profile' sketches instead of counting are never natural dividers, their
+    usage percentage is estimated by streaming them again, cast, against the 'final_df', see
+    '_estimated_usage_percentage'.
+
+    """
+
+    def __init__(self, input_file_name, resulting_df, merging_cols=None, renaming_cols=None, chunksize=CHUNKSIZE,
+                 read_csv_kwargs=None, **kwargs):
+        self.chunksize = chunksize
+        self.read_csv_kwargs = read_csv_kwargs if read_csv_kwargs is not None else READ_CSV_KWARGS
+        self.renaming_cols = renaming_cols or dict()
+        input_header = pd.read_csv(input_file_name, nrows=0, **self.read_csv_kwargs).rename(columns=self.renaming_cols)
+        super().__init__(input_header, resulting_df, merging_cols, input_file_name=input_file_name, **kwargs)
+        self.input_dtypes = None
+        self.input_profile = ChunkedColumnProfile()
+        self._sketched_values_in_final = dict()
+
+    def _encode_categorical_cols(self):
+        logging.warning("'categorical' is not supported when the input is streamed in chunks, ignoring it")
+
+    def plan_filters(self, *args, **kwargs):
+        logging.warning("'plan_filters' is not supported when the input is streamed in chunks, ignoring it")
+
+    def _live_input_df(self):
+        raise ValueError("The input is streamed in chunks, only its first chunk is in memory")
+
+    def _read_input_chunks(self, cols=None):
+        """The chunks of the input csv, with its columns renamed and its date columns parsed, as text in the first
+        pass and cast to the 'input_dtypes' after it.
+
+        :param cols: (list) the columns to read (renamed), all of them by default
+        :return: (generator) DataFrames
+        """
+        read_csv_kwargs = dict({'dtype': str}, **self.read_csv_kwargs)
+        if cols is not None:
+            read_csv_kwargs['usecols'] = lambda name: self.renaming_cols.get(name, name) in cols
+        for chunk in pd.read_csv(self.input_file_name, chunksize=self.chunksize, **read_csv_kwargs):
+            chunk = chunk.rename(columns=self.renaming_cols)
+            for col in chunk.columns:
+                if 'date' in col or 'Date' in col:
+                    chunk[col] = pd.to_datetime(chunk[col])
+            yield chunk if self.input_dtypes is None else cast_frame(chunk, self.input_dtypes)
+
+    def _rules_out_natural_divider(self, col):
+        # the values of a sketched column are not counted, they can not be filtered out as categories
+        return self.input_profile.worth_sketching(col)
+
+    def columns_usage_percentage(self):
+        self._find_sketched_values_in_final()
+        super().columns_usage_percentage()
+
+    def _find_sketched_values_in_final(self):
+        """Streams the input once more, only its sketched columns shared with the 'final_df', cast to their
+        'input_dtypes', to find the distinct values of each of them in the 'final_df' (see
+        'ColumnProfile.distinct_in'), those values are at most the distinct values of the 'final_df' column.
+
+        """
+        cols = [col for col in self.matching_cols if self.input_profile.worth_sketching(col)]
+        found_values = {col: list() for col in cols}
+        if cols:
+            for chunk in self._read_input_chunks(cols):
+                for col in cols:
+                    found_values[col].append(self.final_profile.distinct_in(col, chunk[col]))
+        self._sketched_values_in_final = {
+            col: values[0].append(values[1:]).unique() for col, values in found_values.items()
+        }
+
+    def _distinct_input_values_in_final(self, col):
+        return self._sketched_values_in_final[col]
+
+    def _chunk_rows_in_result(self, chunk, keys, result_keys):
+        """The rows of the text 'chunk' with keys in the result, with the keys parsed to the dtypes of the result.
+
+        :param chunk: (DataFrame) a chunk read by '_read_input_chunks' in the first pass
+        :param keys: (list) the columns to merge on
+        :param result_keys: (pandas index) the 'key_index' of the result
+        :return: (DataFrame)
+        """
+        parsed = np.ones(len(chunk), dtype=bool)
+        parsed_keys = dict()
+        for key in keys:
+            kind = self.resulting_df[key].dtype.kind
+            if chunk[key].dtype != object or kind not in 'iufM':
+                continue
+            parse = pd.to_datetime if kind == 'M' else pd.to_numeric
+            parsed_keys[key] = parse(chunk[key], errors='coerce')
+            # a text that is not a number or a date is in no row of the result, not even in the ones without key
+            parsed &= parsed_keys[key].notna().values | chunk[key].isna().values
+        chunk = chunk.assign(**parsed_keys)
+        return chunk.loc[parsed & rows_with_keys(chunk, keys, result_keys)]
+
+    def _merge_input_to_final(self):
+        """Single pass over the input csv that folds every chunk into the 'input_profile' and, if there are
+        'merging_cols' or 'matching_id_cols', left merges the 'resulting_df' to the chunks rows whose keys are in the
+        result, that is the same 'extended_resulting_df' of a merge with the whole 'input_df'.
+
+        """
+        keys = self.merging_cols or self.matching_id_cols
+        input_df_cols = list(set(self.input_df.columns) - set(self.matching_cols)) + list(keys)
+        result_keys = self.result_index.key_index(keys) if keys else None
+        first_chunk, merged_chunks = self.input_df, list()
+        for chunk_number, chunk in enumerate(self._read_input_chunks()):
+            if not chunk_number:
+                first_chunk = chunk
+            self.input_profile.add_chunk(chunk)
+            if keys:
+                merged_chunks.append(self.resulting_df.merge(
+                    self._chunk_rows_in_result(chunk, keys, result_keys)[input_df_cols], how='inner', on=keys
+                ))
+        self.input_dtypes = self.input_profile.infer_dtypes()
+        self.input_df = cast_frame(first_chunk, self.input_dtypes)
+        if not keys:
+            logging.warning("The DFs have no 'id' columns or 'merging_cols' to merge them")
+            return
+        try:
+            self._check_key_dtypes(keys)
+            merged_df = cast_frame(pd.concat(merged_chunks, sort=False), self.input_dtypes)
+            merged_keys = key_index(merged_df, keys)
+            unmatched_result_rows = self.resulting_df.loc[~rows_with_keys(self.resulting_df, keys, merged_keys)]
+            self.extended_resulting_df = pd.concat([merged_df, unmatched_result_rows], sort=False, ignore_index=True)
+        except Exception as e:
+            logging.warning("The DFs have some 'id' columns to merge them but an exception araises when trying merge")
+            logging.warning(e)
+        else:
+            self.matching_cols = self.input_df.columns
+
+    def _check_key_dtypes(self, keys):
+        """Raises, as a merge of the whole input would, if some of the 'keys' are text in the input but not in the
+        result: some of their texts were parsed to match the result, but not the ones counted in the 'input_profile'.
+
+        :param keys: (list) the columns to merge on
+        """
+        for key in keys:
+            input_dtype, result_dtype = self.input_dtypes.get(key), self.resulting_df[key].dtype
+            if input_dtype == object and result_dtype != object:
+                raise ValueError("Merging on {}, an object column in the input and {} in the result".format(
+                    key, result_dtype))
+
+    def _filter_and_save_inputfile(self, input_file_name):
+        """Streams the input csv again applying the 'best_filter' to every chunk, the filtered chunks are written
+        to a temporary file that replaces the original csv once the pass is over.
+
+        :param input_file_name: (str) the path and name of the input csv
+        """
+        tmp_file_name = '{}.tmp'.format(input_file_name)
+        for chunk_number, chunk in enumerate(self._read_input_chunks()):
+            self._apply_best_filter(chunk).to_csv(
+                tmp_file_name, mode='a' if chunk_number else 'w', header=not chunk_number, index=False,
+                encoding='utf-8', escapechar='\\'
+            )
+        os.replace(tmp_file_name, input_file_name)
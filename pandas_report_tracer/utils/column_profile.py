@@ -0,0 +1,252 @@
+import numpy as np
+import pandas as pd
+from pandas.api.types import infer_dtype, is_datetime64_any_dtype, is_dtype_equal
+
+from .sketches import FALSE_POSITIVE_RATE, RELATIVE_ERROR, BloomFilter, HyperLogLog, hash_series
+
+# columns worth sketching with at least this many rows are tested by 'isin' with a BloomFilter, not with their values
+BLOOM_FILTER_MIN_ROWS = 100000
+# a column is only sketched if a strided sample of about this many rows has this ratio of distinct values
+CARDINALITY_SAMPLE_ROWS = 10000
+HIGH_CARDINALITY_SAMPLE_RATIO = 0.5
+# dtypes whose equal values have equal hashes, floats do not (0. and -0.) nor mixed object columns (1 and 1.)
+HASHABLE_DTYPE_KINDS = 'iuMm'
+
+
+class ColumnProfile:
+    """Cache of the per column facts the analysis needs from a DF (distinct values, value counts, nan counts and
+    min / max). Each column is scanned once, with a single 'value_counts', the first time any of its facts is
+    requested, every other fact is derived from those counts.
+
+    """
+
+    def __init__(self, df):
+        self.df = df
+        self._bloom_filters = dict()
+        self._cumulative_counts = dict()
+        self._n_unique_bounds = dict()
+        self._shared = dict()
+        self._value_counts = dict()
+
+    @property
+    def n_rows(self):
+        return len(self.df)
+
+    def value_counts(self, col):
+        """Number of rows for each distinct value of the column 'col', nans included.
+
+        :param col: (str) the name of the column
+        :return: (pandas series) counts indexed by the distinct values
+        """
+        if col in self._shared:
+            return self._shared[col].value_counts(col)
+        if col not in self._value_counts:
+            counts = self.df[col].value_counts(dropna=False)
+            self._value_counts[col] = counts.loc[counts > 0]
+        return self._value_counts[col]
+
+    def distinct(self, col):
+        """Distinct values of the column 'col', nans included, the equivalent of 'df[col].unique()'.
+
+        :param col: (str) the name of the column
+        :return: (pandas index)
+        """
+        return self.value_counts(col).index
+
+    def n_unique(self, col):
+        return len(self.value_counts(col))
+
+    def n_unique_bounds(self, col, relative_error=RELATIVE_ERROR):
+        """Range of the number of distinct values of the column 'col': the exact number if the column was already
+        counted, otherwise the bounds of a HyperLogLog sketch of its hashed values, which needs a fixed amount of
+        memory instead of the distinct values of high cardinality columns.
+
+        :param col: (str) the name of the column
+        :param relative_error: (float) relative standard error of the sketch
+        :return: (tuple) lower bound, upper bound
+        """
+        if col in self._shared:
+            return self._shared[col].n_unique_bounds(col, relative_error)
+        if col in self._value_counts:
+            return self.n_unique(col), self.n_unique(col)
+        if col not in self._n_unique_bounds:
+            sketch = HyperLogLog.for_error(relative_error)
+            sketch.add_series(self.df[col])
+            self._n_unique_bounds[col] = sketch.bounds()
+        return self._n_unique_bounds[col]
+
+    def worth_sketching(self, col):
+        """Whether the column 'col' should be sketched ('n_unique_bounds', BloomFilter) instead of counted: it was not
+        counted yet, its values hash consistently and a strided sample of about 'CARDINALITY_SAMPLE_ROWS' rows is
+        mostly distinct values. The sample is a fraction of a scan, so a low cardinality column is just counted, not
+        sketched first and counted anyway.
+
+        :param col: (str) the name of the column
+        :return: (bool)
+        """
+        if col in self._shared:
+            return self._shared[col].worth_sketching(col)
+        if col in self._value_counts or col not in self.df.columns or len(self.df) < CARDINALITY_SAMPLE_ROWS:
+            return False
+        if col in self._n_unique_bounds:
+            return True
+        sample = self.df[col].iloc[::len(self.df) // CARDINALITY_SAMPLE_ROWS]
+        if sample.nunique(dropna=False) < HIGH_CARDINALITY_SAMPLE_RATIO * len(sample):
+            return False
+        return self._hashes_consistently(col)
+
+    def isin(self, col, values):
+        """Which of the 'values' are in the column 'col', nans included, the equivalent of 'values.isin(df[col])'.
+        A high cardinality column that was not counted is not: its values are tested with a BloomFilter of the
+        column and only the positives are rechecked against it, so the memory needed is a bit array plus the
+        'values' found, not the distinct values of the column.
+
+        :param col: (str) the name of the column
+        :param values: (pandas index) distinct values, e.g. the 'distinct' values of another profile
+        :return: (numpy array) boolean
+        """
+        if col in self._shared:
+            return self._shared[col].isin(col, values)
+        if not self._use_bloom_filter(col, values):
+            return values.isin(self.distinct(col))
+        column = self.df[col]
+        found = np.zeros(len(values), dtype=bool)
+        nans = values.isna()
+        found[nans] = column.hasnans
+        non_nan_values = values[~nans]
+        positives = non_nan_values[self._bloom_filter(col).contains_series(pd.Series(non_nan_values))]
+        found[~nans] = non_nan_values.isin(column.loc[column.isin(positives)].unique())
+        return found
+
+    def distinct_in(self, col, series):
+        """Distinct values of 'series' (e.g. the column of another DF) that are in the column 'col', nans included.
+        A high cardinality column that was not counted is probed with its BloomFilter first, so only the values of
+        'series' likely to be in it are made distinct, never all of them nor the distinct values of the column.
+
+        :param col: (str) the name of the column
+        :param series: (pandas series) the values to look for
+        :return: (pandas index)
+        """
+        if col in self._shared:
+            return self._shared[col].distinct_in(col, series)
+        if not self._use_bloom_filter(col, series):
+            return pd.Index(series.loc[series.isin(self.distinct(col))].unique())
+        # the positives are the values in the column plus a few false ones, rechecked by 'isin'
+        values = pd.Index(series.loc[self._bloom_filter(col).contains_series(series)].unique())
+        return values[self.isin(col, values)]
+
+    def _bloom_filter(self, col):
+        if col not in self._bloom_filters:
+            # sized for every row to be distinct, the column is mostly distinct values (see 'worth_sketching')
+            bloom_filter = BloomFilter(len(self.df), FALSE_POSITIVE_RATE)
+            sketch = HyperLogLog.for_error(RELATIVE_ERROR)
+            for hashes in hash_series(self.df[col]):
+                bloom_filter.add_hashes(hashes)
+                sketch.add_hashes(hashes)
+            self._n_unique_bounds.setdefault(col, sketch.bounds())
+            # stored once complete, a profile shared by several threads never exposes a partial filter
+            self._bloom_filters[col] = bloom_filter
+        return self._bloom_filters[col]
+
+    def _hashes_consistently(self, col, values=None):
+        dtype = self.df[col].dtype
+        if values is not None and not is_dtype_equal(dtype, values.dtype):
+            return False
+        if dtype == object:
+            return infer_dtype(self.df[col]) == 'string' and (values is None or infer_dtype(values) == 'string')
+        return dtype.kind in HASHABLE_DTYPE_KINDS
+
+    def _use_bloom_filter(self, col, values=None):
+        if len(self.df) < BLOOM_FILTER_MIN_ROWS or not self.worth_sketching(col):
+            return False
+        return values is None or self._hashes_consistently(col, values)
+
+    def prepare(self, col):
+        """Computes up front the facts of the column 'col' the analyses ask for: the BloomFilter of a high
+        cardinality column, the value counts of the others and the cumulative counts of the dates. Every fact is
+        stored once complete, so a prepared profile can be read by analyses running in several threads.
+
+        :param col: (str) the name of the column
+        """
+        if self._use_bloom_filter(col):
+            self._bloom_filter(col)
+            return
+        self.value_counts(col)
+        if is_datetime64_any_dtype(self.df[col]):
+            self.count_below(col, [])
+
+    def nan_count(self, col):
+        counts = self.value_counts(col)
+        return int(counts.loc[counts.index.isna()].sum())
+
+    def extent(self, col):
+        """Minimum and maximum non nan values of the column 'col', (None, None) if the column has no values or its
+        values can not be ordered.
+
+        :param col: (str) the name of the column
+        :return: (tuple) min, max
+        """
+        values = self.distinct(col).dropna()
+        if values.empty:
+            return None, None
+        try:
+            return values.min(), values.max()
+        except TypeError:
+            return None, None
+
+    def count_below(self, col, cutoffs, inclusive=False):
+        """Number of rows of the column 'col' with a value lower than each of the 'cutoffs'. The non nan
+        distinct values are sorted once per column, then every cutoff is a binary search over them, so any number
+        of cutoffs costs about the same as one.
+
+        :param col: (str) the name of the column
+        :param cutoffs: (array like) values comparable with the column values, e.g. datetime64 for date columns
+        :param inclusive: (bool) count also the rows equal to the cutoff
+        :return: (numpy array) number of rows for each cutoff
+        """
+        if col not in self._cumulative_counts:
+            counts = self.value_counts(col)
+            counts = counts.loc[counts.index.notna()].sort_index()
+            self._cumulative_counts[col] = (counts.index.values, np.concatenate([[0], counts.values.cumsum()]))
+        sorted_values, cumulative_counts = self._cumulative_counts[col]
+        return cumulative_counts[np.searchsorted(sorted_values, cutoffs, side='right' if inclusive else 'left')]
+
+    def seed(self, value_counts):
+        """Adds value counts computed elsewhere (e.g. read from a ProfileCache) as if the columns had been scanned.
+
+        :param value_counts: (dict) column name to the pandas series 'value_counts' would return for it
+        """
+        for col, counts in value_counts.items():
+            self._value_counts[col] = counts
+            self._cumulative_counts.pop(col, None)
+
+    def share(self, profile, cols):
+        """Serves the facts of the columns 'cols' from another 'profile', so a DF derived from another one (e.g. the
+        'resulting_df' left merged to an input) does not scan them again. The distinct values must be the same in
+        both DFs, the counts may differ.
+
+        :param profile: (ColumnProfile) the profile of the DF the columns come from
+        :param cols: (list) the names of the columns
+        """
+        for col in cols:
+            self._shared[col] = profile
+            self._cumulative_counts.pop(col, None)
+
+    def cached_value_counts(self):
+        """The value counts of the columns scanned (or seeded) so far, not the shared ones.
+
+        :return: (dict) column name to pandas series
+        """
+        return dict(self._value_counts)
+
+    def invalidate(self, col):
+        """Drops the cached facts for the column 'col', needed after the column is transformed in the DF (e.g. parsed
+        to datetime).
+
+        :param col: (str) the name of the column
+        """
+        self._bloom_filters.pop(col, None)
+        self._cumulative_counts.pop(col, None)
+        self._n_unique_bounds.pop(col, None)
+        self._shared.pop(col, None)
+        self._value_counts.pop(col, None)
@@ -1,6 +1,7 @@
+import concurrent.futures
+import contextlib
 import datetime
 import functools
-import itertools
 import logging
 import operator
 import random
@@ -8,16 +9,25 @@ import statistics
 
 from functools import reduce
 
+import numpy as np
 import pandas as pd
-from pandas.api.types import is_string_dtype, is_integer_dtype, is_bool_dtype
+from pandas.api.types import (
+    infer_dtype, is_bool_dtype, is_datetime64_any_dtype, is_integer_dtype, is_object_dtype, is_string_dtype
+)
+
+from .column_profile import ColumnProfile
+from .filter_plan import MAX_CATEGORIES_PER_COLUMN, MAX_FILTERS, MIN_MARGINAL_RATIO, greedy_filter_plan, pack_rows
+from .instrumentation import Instrumentation
+from .result_index import ResultIndex, rows_with_keys
 
 NATURAL_DIVIDER_THRESOLD = 30
 MULTIPLE_COMBINATION_FILTERS = 5000
 MULTI_COL_FILTER_RATIO = 0.05
 TODAY = datetime.date(2019, 4, 1)
-
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
+DATE_WINDOW_FILTER = 'outside_final_window'
+DATE_WINDOW_ROUNDING = {'exact': None, 'month': 'M', 'quarter': 'Q'}
+# rows of the merge per row of the result above which the merge keys are reported as not unique enough
+MAX_MERGE_FANOUT = 10
 
 
 def isin_row(row, df):
@@ -33,6 +43,24 @@ def isin_row(row, df):
     return bool_series.any()
 
 
+def _key_kind(series):
+    """What 'pd.merge' checks of a key column to tell whether two of them can be merged: 'date', 'text' or
+    'number', None for an object column without values.
+
+    :param series: (pandas series)
+    :return: (str)
+    """
+    values = series.cat.categories if isinstance(series.dtype, pd.CategoricalDtype) else series
+    if is_datetime64_any_dtype(values):
+        return 'date'
+    if not is_object_dtype(values):
+        return 'number'
+    inferred_type = infer_dtype(values, skipna=True)
+    if inferred_type == 'empty':
+        return None
+    return 'text' if inferred_type in ('string', 'bytes', 'mixed') else 'number'
+
+
 class SingleColumnFilters:
     date_slices = {
         'one_month_period': TODAY - datetime.timedelta(days=31),
@@ -43,26 +71,48 @@ class SingleColumnFilters:
         'ytd': datetime.date(TODAY.year, 1, 1)
     }
 
-    def __init__(self, input_df, resulting_df, merging_cols=None, input_file_name=None):
+    def __init__(self, input_df, resulting_df, merging_cols=None, input_file_name=None, date_slices=None,
+                 date_window=None, categorical=False, input_profile=None, result_profile=None, instrumentation=None,
+                 result_index=None):
+        self.categorical = categorical
         self.extended_resulting_df = pd.DataFrame()
+        self.filter_plan = list()
         self.filtering_quick_gains = list()
         self.final_df = pd.DataFrame()
+        self.final_profile = ColumnProfile(self.final_df)
         self.input_df = input_df
         self.input_file_name = input_file_name
+        self.input_profile = input_profile if input_profile is not None else ColumnProfile(input_df)
+        # timings, memory and rows of the stages and columns of the analysis, see 'stats'
+        self.instrumentation = instrumentation if instrumentation is not None else Instrumentation()
         self.matching_cols = list()
         self.matching_id_cols = list()
         self.merging_cols = merging_cols
         self.natural_dividers_dtypes = dict()
         self.overall_percentage = float()
+        self.predicates = dict()
         self.resulting_df = resulting_df
+        # the unused categories of each category column with a finding, see 'rank_unused_categories'
+        self.unused_category_rankings = dict()
+        # profile and merge keys of 'resulting_df', they can be shared by several analyses against the same result
+        self.result_profile = result_profile if result_profile is not None else ColumnProfile(resulting_df)
+        self.result_index = result_index if result_index is not None else ResultIndex(resulting_df, self.result_profile)
         self.usage_percentage = dict()
-
-    def make_analysis(self, apply_filter=False):
+        self._executor = None
+        if date_slices is not None:
+            self.date_slices = date_slices
+        if date_window is not None and date_window not in DATE_WINDOW_ROUNDING:
+            raise ValueError("date_window must be one of: {}".format(', '.join(DATE_WINDOW_ROUNDING)))
+        self.date_window = date_window
+
+    def make_analysis(self, apply_filter=False, n_jobs=1):
         """Runs functions of the class SingleColumnFilters on an object of the class to get the best single
         column filter while also generating the data for the 'print_report' and 'generate_data_usage_plot'.
 
         Parameters:
         self (object): an object of the class SingleColumnFilters
+        apply_filter (bool): filter the input with the best filter found and save it to 'input_file_name'
+        n_jobs (int): number of threads the per column work is spread over
         Returns:
         None
         """
@@ -71,20 +121,88 @@ class SingleColumnFilters:
         if not self.matching_cols:
             logging.warning('Without shared columns this tool is worthless, consider renaming columns')
             return
-        self._merge_input_to_final()
-        self._set_final_df_to_work_with()
-        self.columns_usage_percentage()
-        logging.info("Column usage percentage:")
-        logging.info(self.usage_percentage)
-        self.get_dtypes_for_natural_divider_cols()
-        for slicing_col, dtype in self.natural_dividers_dtypes.items():
-            if 'date' in dtype:
-                self._determine_date_range_filters(slicing_col)
-            else:
-                self._determine_category_col_filters(slicing_col)
-        self._determine_best_slicing_col_filter()
+        if self.categorical:
+            with self._stage('encode_categorical', self.input_profile.n_rows):
+                self._encode_categorical_cols()
+        with self._stage('merge') as record:
+            self._merge_input_to_final()
+            self._set_final_df_to_work_with()
+            # a chunked input is only counted while it is merged
+            record['rows'] = self.input_profile.n_rows
+            record['merged_rows'] = len(self.final_df)
+        with self._columns_executor(n_jobs):
+            self.columns_usage_percentage()
+            logging.info("Column usage percentage:")
+            logging.info(self.usage_percentage)
+            self._find_slicing_col_filters()
+        with self._stage('best_filter', len(self.filtering_quick_gains)):
+            self._determine_best_slicing_col_filter()
         if apply_filter:
-            self._filter_and_save_inputfile(self.input_file_name)
+            with self._stage('filter_and_save', self.input_profile.n_rows):
+                self._filter_and_save_inputfile(self.input_file_name)
+
+    @property
+    def stats(self):
+        """The records of the 'instrumentation': dicts with the 'stage', the 'column' (None for a whole stage), the
+        'rows' processed, 'seconds', 'cpu_seconds' and 'memory_bytes'.
+
+        :return: (list)
+        """
+        return self.instrumentation.records
+
+    def _stage(self, name, rows=None, column=None):
+        return self.instrumentation.stage(name, column=column, rows=rows, input_file=self.input_file_name)
+
+    def _instrumented(self, name, func):
+        """Wraps 'func', a function of a column, so every call is recorded as a column of the stage 'name'.
+
+        :param name: (str) name of the stage
+        :param func: (function) receives the name of a column
+        :return: (function)
+        """
+        def instrumented_func(col):
+            with self._stage(name, self.input_profile.n_rows, col):
+                return func(col)
+        return instrumented_func
+
+    def _find_slicing_col_filters(self):
+        """Finds the natural dividers and the filters of each of them, adding them to 'filtering_quick_gains'.
+
+        """
+        with self._stage('natural_dividers', self.input_profile.n_rows):
+            self.get_dtypes_for_natural_divider_cols()
+        with self._stage('slicing_filters', self.input_profile.n_rows):
+            determine_slicing_col_filters = self._instrumented('slicing_filters', self._determine_slicing_col_filters)
+            for findings in self._map_columns(determine_slicing_col_filters, self.natural_dividers_dtypes):
+                self.filtering_quick_gains.extend(findings)
+
+    @contextlib.contextmanager
+    def _columns_executor(self, n_jobs):
+        """Thread pool used by '_map_columns' while the context is open, the per column work is independent and
+        the heavy parts of it (hashing, value counts, isin) run inside pandas / numpy.
+
+        :param n_jobs: (int) number of threads, with 1 the columns are processed serially
+        """
+        if n_jobs > 1:
+            self._executor = concurrent.futures.ThreadPoolExecutor(n_jobs)
+        try:
+            yield
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+    def _map_columns(self, func, cols):
+        """Applies 'func' to each column in 'cols', in the '_columns_executor' threads if there are any. The results
+        are returned in the order of 'cols' so the findings merged from them do not depend on the scheduling.
+
+        :param func: (function) receives the name of a column
+        :param cols: (iterable) names of the columns
+        :return: (list) the result of 'func' for each column
+        """
+        if self._executor is None:
+            return [func(col) for col in cols]
+        return list(self._executor.map(func, cols))
 
     def find_matching_cols(self):
         """Compares the columns in 'input_df' and 'resulting_df' to find columns present in both DF, a second list is
@@ -95,6 +213,33 @@ class SingleColumnFilters:
         self.matching_cols = list(set(self.input_df.columns).intersection(self.resulting_df.columns))
         self.matching_id_cols = [col_name for col_name in self.matching_cols if 'id' in col_name or 'Id' in col_name]
 
+    def _encode_categorical_cols(self):
+        """Converts the object columns of 'input_df' that could be natural dividers (few distinct values per row)
+        to a pd.Categorical with the same categories in 'input_df' and 'resulting_df', the distinct values of both
+        DFs. The merge then copies integer codes instead of python strings and the set operations and isin work on
+        codes. The DFs passed to the instance are not modified, shallow copies are.
+
+        """
+        self.input_df = self.input_df.copy(deep=False)
+        self.resulting_df = self.resulting_df.copy(deep=False)
+        # the cached counts still describe the encoded columns, their values do not change
+        self.input_profile.df = self.input_df
+        for col in self.input_df.columns:
+            if 'date' in col or 'Date' in col or not is_object_dtype(self.input_df[col]):
+                continue
+            # the high cardinality columns (ids, free text) are told apart by a sketch, never counted
+            if self._rules_out_natural_divider(col):
+                continue
+            if self.input_profile.n_rows / self.input_profile.n_unique(col) <= NATURAL_DIVIDER_THRESOLD:
+                continue
+            categories = self.input_profile.distinct(col).dropna()
+            if col in self.resulting_df.columns:
+                categories = categories.union(self.result_profile.distinct(col).dropna())
+            categorical_dtype = pd.CategoricalDtype(categories)
+            self.input_df[col] = self.input_df[col].astype(categorical_dtype)
+            if col in self.resulting_df.columns:
+                self.resulting_df[col] = self.resulting_df[col].astype(categorical_dtype)
+
     def _merge_input_to_final(self):
         """Merges the 'input_df' to 'final_df', if a list of columns was passed to the instance the merge is executed
         on those columns, otherwise on all 'matching_id_cols'
@@ -117,17 +262,66 @@ class SingleColumnFilters:
     def _merge_input_to_final_on_merging_cols(self, input_df_cols):
         input_df_cols.extend(self.merging_cols)
         self.extended_resulting_df = self.resulting_df.merge(
-            self.input_df[input_df_cols],
+            self._semi_join_input(input_df_cols, self.merging_cols),
             how='left', on=self.merging_cols
         )
 
     def _merge_input_to_final_on_matching_id_cols(self, input_df_cols):
         input_df_cols.extend(self.matching_id_cols)
         self.extended_resulting_df = self.resulting_df.merge(
-            self.input_df[input_df_cols],
+            self._semi_join_input(input_df_cols, self.matching_id_cols),
             how='left', on=self.matching_id_cols
         )
 
+    def _semi_join_input(self, input_df_cols, keys):
+        """The columns 'input_df_cols' of the 'input_df' rows whose 'keys' are in the 'resulting_df', the only rows
+        the left merge uses, so the merge hashes and copies those instead of the whole input. With duplicated keys
+        the repeated rows are dropped too: the analysis only checks which values make it to the 'final_df', never
+        how many times, and every repeated row would be repeated for each result row with its key.
+
+        :param input_df_cols: (list) the columns of the 'input_df' to merge, 'keys' included
+        :param keys: (list) the columns to merge on
+        :return: (DataFrame)
+        """
+        self._check_key_dtypes(keys)
+        in_result = rows_with_keys(self.input_df, keys, self.result_index.key_index(keys))
+        reduced_df = self.input_df.loc[in_result, input_df_cols]
+        logging.info("{} of {} input rows have keys in the result".format(len(reduced_df), len(self.input_df)))
+        if reduced_df.duplicated(keys).any():
+            reduced_df = reduced_df.drop_duplicates()
+            self._check_merge_fanout(reduced_df, keys)
+        return reduced_df
+
+    def _check_key_dtypes(self, keys):
+        """Raises, as 'pd.merge' does, if some of the 'keys' hold text in one DF and numbers or dates in the other.
+        The semi join would find none of the input keys in the result and the merge with no input rows would succeed,
+        leaving every input column of the 'final_df' empty, instead of falling back to the 'resulting_df'.
+
+        :param keys: (list) the columns to merge on
+        """
+        for key in keys:
+            input_kind, result_kind = _key_kind(self.input_df[key]), _key_kind(self.resulting_df[key])
+            if None not in (input_kind, result_kind) and input_kind != result_kind:
+                raise ValueError("You are trying to merge on {} and {} columns for key '{}'".format(
+                    self.input_df[key].dtype, self.resulting_df[key].dtype, key))
+
+    def _check_merge_fanout(self, reduced_df, keys):
+        """Warns if the merge with 'reduced_df' would have more than 'MAX_MERGE_FANOUT' rows per result row, the
+        rows are not dropped, a 'final_df' missing some of them could make unsafe filters.
+
+        :param reduced_df: (DataFrame) the input rows to merge, from '_semi_join_input'
+        :param keys: (list) the columns to merge on
+        """
+        # every result row is repeated once per input row with its key, the result keys are counted once per result
+        key_rows = reduced_df.groupby(keys, sort=False, dropna=False).size()
+        result_rows = self.result_index.key_counts(keys).reindex(key_rows.index)
+        merged_rows = len(self.resulting_df) + int(((key_rows - 1) * result_rows).sum())
+        fanout = merged_rows / max(len(self.resulting_df), 1)
+        if fanout > MAX_MERGE_FANOUT:
+            logging.warning(
+                "Merging on {} repeats every result row {:.1f} times on average ({} rows), consider 'merging_cols' "
+                "unique in the input".format(keys, fanout, int(merged_rows)))
+
     def _set_final_df_to_work_with(self):
         """Checks if the 'input_df' was merged to 'final_df', to work with that merged DF, which increases the scope
         of the analysis because all columns are considered, otherwise only the 'matching cols'.
@@ -138,6 +332,9 @@ class SingleColumnFilters:
         else:
             self.final_df = self.resulting_df
             logging.warning('The input df could not be merged into final, that decreases the chances of success')
+        self.final_profile = ColumnProfile(self.final_df)
+        # the left merge keeps every row of the result, so its columns have the same distinct values in 'final_df'
+        self.final_profile.share(self.result_profile, self.resulting_df.columns)
 
     def columns_usage_percentage(self):
         """Preliminary analysis that measure the ratio of unique values in 'input_df' that make it to the 'final_df',
@@ -145,134 +342,246 @@ class SingleColumnFilters:
         reading the table using Athena to filter a bucket would increase speed.
 
         """
-        for col in self.matching_cols:
-            if 'date' in col or is_bool_dtype(self.input_df[col]):
-                pass
-            matching_rows = set(self.input_df[col].unique()).intersection(self.final_df[col].unique())
-            if not matching_rows:
-                logging.info('{} is in both DFs, but no matching data was found'.format(col))
-                percentage = 0
-                if col in self.merging_cols:
-                    raise ValueError('No keys to perform merge')
-            else:
-                percentage = len(matching_rows) / len(self.input_df[col].unique())
-            self.usage_percentage.update({col: percentage})
+        with self._stage('usage_percentage', self.input_profile.n_rows):
+            column_usage_percentage = self._instrumented('usage_percentage', self._column_usage_percentage)
+            percentages = self._map_columns(column_usage_percentage, self.matching_cols)
+        self.usage_percentage.update(zip(self.matching_cols, percentages))
         self.overall_percentage = statistics.mean(self.usage_percentage.values())
 
+    def _column_usage_percentage(self, col):
+        if 'date' in col or is_bool_dtype(self.input_df[col]):
+            pass
+        if self._rules_out_natural_divider(col):
+            return self._estimated_usage_percentage(col)
+        input_distinct = self.input_profile.distinct(col)
+        matching_rows = int(self.final_profile.isin(col, input_distinct).sum())
+        if not matching_rows:
+            logging.info('{} is in both DFs, but no matching data was found'.format(col))
+            if self.merging_cols and col in self.merging_cols:
+                raise ValueError('No keys to perform merge')
+            return 0
+        return matching_rows / len(input_distinct)
+
+    def _estimated_usage_percentage(self, col):
+        """Usage percentage of a high cardinality column that is not counted in either DF: the distinct input values
+        found in the 'final_df' (probing the BloomFilter of the 'final_df' column with the input column) over the
+        estimate of the distinct values of the input given by its sketch.
+
+        :param col: (str) the name of the column in both DFs
+        :return: (float)
+        """
+        matching_rows = len(self._distinct_input_values_in_final(col))
+        if not matching_rows:
+            logging.info('{} is in both DFs, but no matching data was found'.format(col))
+            if self.merging_cols and col in self.merging_cols:
+                raise ValueError('No keys to perform merge')
+            return 0
+        return min(matching_rows / (sum(self.input_profile.n_unique_bounds(col)) / 2), 1)
+
+    def _distinct_input_values_in_final(self, col):
+        return self.final_profile.distinct_in(col, self.input_df[col])
+
     def get_dtypes_for_natural_divider_cols(self):
         """For each column in 'input_df' determine its dtype (many columns have dtype object which is not useful
         for this analysis). And add to a dictionary if 'is_natural_divider'
 
         """
+        # shallow copies, parsing the date columns must not modify the DFs passed to the instance
+        self.input_df = self.input_df.copy(deep=False)
+        self.input_profile.df = self.input_df
+        self.final_df = self.final_df.copy(deep=False)
+        self.final_profile.df = self.final_df
         for col in self.input_df.columns:
+            col_dtype = self.input_df[col].dtype
+            if isinstance(col_dtype, pd.CategoricalDtype):
+                col_dtype = col_dtype.categories.dtype
             if 'date' in col or 'Date' in col:
-                self.input_df[col] = pd.to_datetime(self.input_df[col])
+                self._parse_date_col(col)
                 self.natural_dividers_dtypes.update({col: 'date'})
-            elif is_string_dtype(self.input_df[col]):
-                if self._is_natural_divider(self.input_df[col]):
+            elif is_string_dtype(col_dtype):
+                if self._is_natural_divider(col):
                     self.natural_dividers_dtypes.update({col: 'string'})
-            elif is_integer_dtype(self.input_df[col]):
-                if self._is_natural_divider(self.input_df[col]):
+            elif is_integer_dtype(col_dtype):
+                if self._is_natural_divider(col):
                     self.natural_dividers_dtypes.update({col: 'integer'})
-            elif is_bool_dtype(self.input_df[col]):
+            elif is_bool_dtype(col_dtype):
                 self.natural_dividers_dtypes.update({col: 'boolean'})
 
-    def _is_natural_divider(self, df_series):
+    def _parse_date_col(self, col):
+        """Parses the column 'col' of 'input_df' and 'final_df' to datetime, unless it was already parsed when the
+        DFs were loaded.
+
+        :param col: (str) the name of the date column
+        """
+        for df, profile in ((self.input_df, self.input_profile), (self.final_df, self.final_profile)):
+            if col in df.columns and not is_datetime64_any_dtype(df[col]):
+                df[col] = pd.to_datetime(df[col])
+                profile.invalidate(col)
+
+    def _is_natural_divider(self, col):
         """Determines if a column of the 'input_df' would serve as a good filter, if the ratio of unique values to
         the number of rows is high the column is consider a 'natural divider' date columns are always natural dividers,
         but this function they may not show as, be cautious.
 
-        :param df_series: (pandas series) series to be checked to see if it is a 'natural divider'
+        :param col: (str) the name of the column in the 'input_df' to be checked to see if it is a 'natural divider'
         :return: Boolean
         """
-        unique_rows = len(df_series.unique())
+        total_rows = self.input_profile.n_rows
+        if self._rules_out_natural_divider(col):
+            logging.info('Column: {} has about {} unique rows in {} rows, not a natural divider'.format(
+                col, int(self.input_profile.n_unique_bounds(col)[0]), str(total_rows)))
+            return
+        unique_rows = self.input_profile.n_unique(col)
         if unique_rows == 1:
             return
-        total_rows = len(df_series)
         ratio = total_rows / unique_rows
         logging.info('Column: {} has {} unique rows in {} rows, a {} to 1 relationship'.format(
-            df_series._name, str(unique_rows), str(total_rows), str(ratio)))
-        if ratio > NATURAL_DIVIDER_THRESOLD and self.usage_percentage[df_series._name] != 1:
+            col, str(unique_rows), str(total_rows), str(ratio)))
+        if ratio > NATURAL_DIVIDER_THRESOLD and self.usage_percentage[col] != 1:
             return 1
 
+    def _rules_out_natural_divider(self, col):
+        """Whether the high cardinality column 'col' (ids, free text) of the 'input_df' is told apart from the natural
+        dividers by a sketch, without counting its values. It runs ahead of the usage percentages, which would
+        otherwise count every input column shared with the 'final_df' (all of them after a merge), and only for the
+        columns that look high cardinality in a sample, see 'worth_sketching'.
+
+        :param col: (str) the name of the column in the 'input_df'
+        :return: (bool)
+        """
+        if not self.input_profile.worth_sketching(col):
+            return False
+        min_unique_rows = self.input_profile.n_unique_bounds(col)[0]
+        return bool(min_unique_rows) and self.input_profile.n_rows / min_unique_rows <= NATURAL_DIVIDER_THRESOLD
+
     def _handle_na_in_date_cols(self, col):
         """This function checks for nans values in the 'input_df' DF for a given column, if there are such values
-        in the 'input_df' but not in the 'final_df' it has found a valuable filter. It adds that finding to the
-        'filtering_quick_gains' list.
+        in the 'input_df' but not in the 'final_df' it has found a valuable filter.
 
         :param col: (str) the name of the column in the 'input_df'
+        :return: (list) the finding, empty if there is none
         """
-        number_of_nans = self.input_df[col].isna().sum()
-        if number_of_nans and self.final_df[col].isna().sum() == 0:
+        number_of_nans = self.input_profile.nan_count(col)
+        if number_of_nans and self.final_profile.nan_count(col) == 0:
             logging.info('Found query optimizing chance in col: {}, filter: nan'.format(col))
-            self.filtering_quick_gains.append({
+            return [{
                 'column': col,
                 'dtype': 'date',
                 'filter_out': 'nan',
                 'useless_rows': number_of_nans,
                 'weighted_benefit': number_of_nans
-            })
+            }]
+        return []
+
+    def _determine_slicing_col_filters(self, col):
+        """Runs the date range or the category analysis of a natural divider column.
+
+        :param col: (str) the name of the column in the 'input_df'
+        :return: (list) the findings for the column, to be added to 'filtering_quick_gains'
+        """
+        if 'date' in self.natural_dividers_dtypes[col]:
+            if self.date_window:
+                return self._determine_date_window_filters(col)
+            return self._determine_date_range_filters(col)
+        return self._determine_category_col_filters(col)
 
     def _determine_date_range_filters(self, col):
-        """For each of the time ranges determined in the 'date_slices' class dictionary this functions checks if
-        there is data in the 'final_df' if not it continues with the next date range, otherwise it checks if there is
-        data for that same date range in the 'input_df', if so, there is un needed rows in the 'input_df' that should
-        be filtered. That information is stored in function variables to later, determine the best date range filter
-        that can be applied to that column, that information is stored in a dictionary and appended to
-        'filtering_quick_gains' an instance list.
+        """For each of the time ranges determined in the 'date_slices' dictionary (the class one or the one passed to
+        the instance) this functions checks if there is data in the 'final_df' if not it continues with the next date
+        range, otherwise it checks if there is data for that same date range in the 'input_df', if so, there is un
+        needed rows in the 'input_df' that should be filtered. The rows before every cutoff are counted at once with
+        'count_below' over the sorted dates of each DF. That information is stored in function variables to later,
+        determine the best date range filter that can be applied to that column, that information is stored in a
+        dictionary.
 
         :param col: (str) the name of the column in the 'input_df'
+        :return: (list) the nan and date range findings for the column
         """
-        self._handle_na_in_date_cols(col)
-        non_na_inputdf = self.input_df.dropna(subset=[col])
-        self.final_df[col] = pd.to_datetime(self.final_df[col])
-        non_na_finaldf = self.final_df.dropna(subset=[col])
+        findings = self._handle_na_in_date_cols(col)
+        cutoffs = pd.to_datetime(list(self.date_slices.values())).values
+        lesser_date_final = self.final_profile.count_below(col, cutoffs)
+        lesser_date_input = self.input_profile.count_below(col, cutoffs)
         weighted_benefit = 0
-        for period, date_ in self.date_slices.items():
-            lesser_date_final = non_na_finaldf.loc[non_na_finaldf[col] < date_]
-            if not len(lesser_date_final):
-                lesser_date_input = non_na_inputdf.loc[non_na_inputdf[col] < date_]
-                if len(lesser_date_input) > weighted_benefit:
-                    logging.info('Found query optimizing chance in col: {}, filter: {}'.format(col, period))
-                    weighted_benefit = useless_rows = len(lesser_date_input)
-                    the_column = col
-                    filter_out = (period, date_)
+        for (period, date_), final_rows, input_rows in zip(
+                self.date_slices.items(), lesser_date_final, lesser_date_input):
+            if not final_rows and input_rows > weighted_benefit:
+                logging.info('Found query optimizing chance in col: {}, filter: {}'.format(col, period))
+                weighted_benefit = useless_rows = int(input_rows)
+                the_column = col
+                filter_out = (period, date_)
         if weighted_benefit > 0:
-            self.filtering_quick_gains.append({
+            findings.append({
                 'column': the_column,
                 'dtype': 'date',
                 'filter_out': filter_out,
                 'useless_rows': useless_rows,
                 'weighted_benefit': weighted_benefit
             })
+        return findings
+
+    def _determine_date_window_filters(self, col):
+        """Instead of testing the fixed 'date_slices' this function takes the earliest and latest dates of the
+        column in the 'final_df', every row of the 'input_df' outside that window is un needed, that is the largest
+        safe date filter. With 'date_window' 'month' or 'quarter' the window is widened to whole months / quarters, a
+        bit less rows are filtered but the filter matches date partitions.
+
+        :param col: (str) the name of the column in the 'input_df'
+        :return: (list) the nan and date window findings for the column
+        """
+        findings = self._handle_na_in_date_cols(col)
+        lower_date, upper_date = self.final_profile.extent(col)
+        if lower_date is None:
+            return findings
+        rounding = DATE_WINDOW_ROUNDING[self.date_window]
+        if rounding:
+            lower_date = lower_date.to_period(rounding).start_time
+            upper_date = upper_date.to_period(rounding).end_time
+        non_nan_rows = self.input_profile.n_rows - self.input_profile.nan_count(col)
+        rows_before_window = self.input_profile.count_below(col, [lower_date.to_datetime64()])[0]
+        rows_until_window_end = self.input_profile.count_below(col, [upper_date.to_datetime64()], inclusive=True)[0]
+        useless_rows = int(rows_before_window + non_nan_rows - rows_until_window_end)
+        if useless_rows > 0:
+            logging.info('Found query optimizing chance in col: {}, filter: {} ({} - {})'.format(
+                col, DATE_WINDOW_FILTER, lower_date, upper_date))
+            findings.append({
+                'column': col,
+                'dtype': 'date',
+                'filter_out': (DATE_WINDOW_FILTER, (lower_date, upper_date)),
+                'useless_rows': useless_rows,
+                'weighted_benefit': useless_rows
+            })
+        return findings
 
     def _determine_category_col_filters(self, col):
         """If a columns 'col' unique values are not fully present in the 'final_df' this function determines the
         unique values in the 'input_df' for the column 'col' not present in the 'resulting_df' / 'final_df' and
-        adds that information to a instance dictionary for further analysis
+        returns that information in a dictionary for further analysis
 
         :param col: (str) the name of the column in the 'input_df'
+        :return: (list) the finding, empty if there is none
         """
         if self.usage_percentage[col] == 1:
-            return
-        unused_categos = set(self.input_df[col].unique()) - set(self.final_df[col].unique())
-        unused_inputdf_rows = len(self.input_df.loc[self.input_df[col].isin(unused_categos)])
+            return []
+        unused_counts = self._unused_category_counts(col)
+        self.unused_category_rankings[col] = self.rank_unused_categories(col, unused_counts=unused_counts)
+        unused_categos = set(unused_counts.index)
+        unused_inputdf_rows = int(unused_counts.sum())
         expected_unused_rows_per_catego = unused_inputdf_rows / len(unused_categos)
-        self.filtering_quick_gains.append({
-            'column': col,
-            'dtype': self.natural_dividers_dtypes[col],
-            'filter_out': unused_categos,
-            'useless_rows': unused_inputdf_rows,
-            'weighted_benefit': expected_unused_rows_per_catego
-        })
         if len(unused_categos) > 100:
             logging.info(
                 "Found query optimizing chance in col: {}, reading ({}) unused rows, consider filtering out: {}".format(
-                    col, unused_inputdf_rows, random.sample(unused_categos, 100)))
+                    col, unused_inputdf_rows, random.sample(list(unused_categos), 100)))
         else:
             logging.info(
                 "Found query optimizing chance in col: {}, reading ({}) unused rows, consider filtering out: {}".format(
                     col, unused_inputdf_rows, unused_categos))
+        return [{
+            'column': col,
+            'dtype': self.natural_dividers_dtypes[col],
+            'filter_out': unused_categos,
+            'useless_rows': unused_inputdf_rows,
+            'weighted_benefit': expected_unused_rows_per_catego
+        }]
 
     def find_largest_unused_catego_in_column(self, col):
         """Checks which value in a column in in 'input_df' that does not appear in 'final_df' appears the must
@@ -280,14 +589,58 @@ class SingleColumnFilters:
 
         :param col: (str) the name of the column
         """
-        unused_categos = set(self.input_df[col].unique()) - set(self.final_df[col].unique())
-        if not unused_categos:
+        ranking = self.rank_unused_categories(col, top_k=1)
+        if not ranking:
             raise ValueError("This column has no unused categories")
-        category_potential = dict()
-        for category in unused_categos:
-            unused_rows_for_category = len(self.input_df.loc[self.input_df[col] == category])
-            category_potential.update({category: unused_rows_for_category})
-        return max(category_potential.items(), key=operator.itemgetter(1))[0]
+        return ranking[0]['category']
+
+    def _unused_category_counts(self, col):
+        input_counts = self.input_profile.value_counts(col)
+        return input_counts.loc[~self.final_profile.isin(col, input_counts.index)]
+
+    def rank_unused_categories(self, col, top_k=MAX_CATEGORIES_PER_COLUMN, unused_counts=None):
+        """The 'top_k' categories of the column 'col' in 'input_df' that are not in 'final_df' with the most rows,
+        all of them ranked at once from the value counts of both DFs, with the rows filtered out by excluding each
+        category together with the ones above it, to choose IN lists of sensible length.
+
+        :param col: (str) the name of the column
+        :param top_k: (int) number of categories ranked
+        :param unused_counts: (pandas series) the input value counts of the unused categories, if already known
+        :return: (list) ranked dicts with the 'category', its 'rows' and the 'cumulative_rows' and 'cumulative_ratio'
+            of excluding it and the categories above it
+        """
+        if unused_counts is None:
+            unused_counts = self._unused_category_counts(col)
+        top_counts = unused_counts.nlargest(top_k)
+        cumulative_rows = top_counts.cumsum()
+        return [{
+            'category': category,
+            'rows': int(rows),
+            'cumulative_rows': int(cumulative),
+            'cumulative_ratio': cumulative / self.input_profile.n_rows
+        } for category, rows, cumulative in zip(top_counts.index, top_counts.values, cumulative_rows.values)]
+
+    def unused_categories_filter(self, col, max_categories=MAX_CATEGORIES_PER_COLUMN,
+                                 min_marginal_ratio=MIN_MARGINAL_RATIO):
+        """Filter excluding together the top ranked unused categories of the column 'col', as long as each one
+        removes at least 'min_marginal_ratio' of the input rows, for an IN list predicate (see 'predicates.to_sql').
+
+        :param col: (str) the name of the column
+        :param max_categories: (int) maximum number of categories in the filter
+        :param min_marginal_ratio: (float) minimum ratio of the input rows each category has to remove
+        :return: (tuple) in the format of 'best_filter' with a list of categories, None if no category qualifies
+        """
+        min_rows = max(min_marginal_ratio * self.input_profile.n_rows, 1)
+        ranking = [ranked for ranked in self.rank_unused_categories(col, max_categories) if ranked['rows'] >= min_rows]
+        if not ranking:
+            return None
+        return (
+            col,
+            [ranked['category'] for ranked in ranking],
+            self.natural_dividers_dtypes.get(col, 'string'),
+            ranking[-1]['cumulative_rows'],
+            ranking[-1]['cumulative_ratio']
+        )
 
     def _determine_best_slicing_col_filter(self):
         """For the items in 'filtering_quick_gains' fin the one which yields the must benefit;
@@ -303,11 +656,14 @@ class SingleColumnFilters:
             logging.info("The suggested column to filter is {}, recommended value to filter: {}".format(
                 max_eficiency_potential_info['column'], category_to_filter
             ))
+            category_rows = int(self.input_profile.value_counts(max_eficiency_potential_info['column'])[
+                category_to_filter])
             self.best_filter = (
                 max_eficiency_potential_info['column'],
                 category_to_filter,
                 max_eficiency_potential_info['dtype'],
-                max_eficiency_potential_info['excpeted_unused_rows_per_catego'],
+                category_rows,
+                category_rows / self.input_profile.n_rows
             )
         else:
             logging.info("The suggested column to filter is {}, recommended period to filter: {}".format(
@@ -318,7 +674,7 @@ class SingleColumnFilters:
                 max_eficiency_potential_info['filter_out'],
                 max_eficiency_potential_info['dtype'],
                 max_eficiency_potential_info['weighted_benefit'],
-                max_eficiency_potential_info['weighted_benefit'] / len(self.input_df)
+                max_eficiency_potential_info['weighted_benefit'] / self.input_profile.n_rows
             )
 
     def _filter_and_save_inputfile(self, input_file_name):
@@ -330,31 +686,121 @@ class SingleColumnFilters:
         Returns:
         None
         """
-        # filter input DF with best filter found in analisis
-        if self.best_filter[2] == 'date':
-            nan_rows = self.input_df.loc[self.input_df[self.best_filter[0]].isnull()]
-            self.input_df = self.input_df.loc[
-                self.input_df[self.best_filter[0]] > self.best_filter[1][1]
-            ]
-            self.input_df = pd.concat([self.input_df, nan_rows])
-        else:
-            self.input_df = self.input_df.loc[
-                self.input_df[self.best_filter[0]] != self.best_filter[1]
-            ]
+        self.input_df = self._apply_best_filter(self.input_df)
         self.input_df.to_csv(input_file_name, index=False, encoding='utf-8', escapechar='\\')
 
+    def _apply_best_filter(self, df):
+        """Filters out of 'df' the rows matched by 'best_filter', nan rows are kept for date range filters.
+
+        :param df: (DataFrame) the 'input_df' or a chunk of it
+        :return: (DataFrame) the filtered df
+        """
+        return df.loc[self._best_filter_mask(df)]
+
+    def _best_filter_mask(self, df):
+        """The rows of 'df' kept by '_apply_best_filter'.
+
+        :param df: (DataFrame) the 'input_df' or a chunk of it
+        :return: (pandas series) boolean, True for the rows kept
+        """
+        return self._filter_mask(df, self.best_filter)
+
+    @staticmethod
+    def _filter_mask(df, filter_):
+        """The rows of 'df' kept by 'filter_', a filter in the format of 'best_filter'.
+
+        :param df: (DataFrame) the 'input_df' or a chunk of it
+        :param filter_: (tuple) column, filter out (one value or a list of them) and dtype, the rest of the items are
+            ignored
+        :return: (pandas series) boolean, True for the rows kept
+        """
+        col, filter_out, dtype = filter_[:3]
+        if dtype != 'date':
+            if isinstance(filter_out, (list, set, frozenset)):
+                return ~df[col].isin(list(filter_out))
+            # nan is a category like any other, '!=' would keep its rows
+            return df[col].notna() if pd.isnull(filter_out) else df[col] != filter_out
+        if filter_out == 'nan':
+            return df[col].notna()
+        if filter_out[0] == DATE_WINDOW_FILTER:
+            return df[col].between(*filter_out[1]) | df[col].isnull()
+        return (df[col] >= pd.Timestamp(filter_out[1])) | df[col].isnull()
+
+    def plan_filters(self, max_filters=MAX_FILTERS, min_marginal_ratio=MIN_MARGINAL_RATIO):
+        """Ranks a set of filters to apply together instead of just the 'best_filter', from the findings of
+        'make_analysis', with 'greedy_filter_plan'. The candidates are the date findings and, for the category
+        findings, the 'MAX_CATEGORIES_PER_COLUMN' unused categories with most rows, one by one and together in the
+        IN list of 'unused_categories_filter'. The plan is stored in 'filter_plan'.
+
+        :param max_filters: (int) maximum number of filters in the plan
+        :param min_marginal_ratio: (float) minimum ratio of the input rows a filter has to add to the plan
+        """
+        input_df = self._live_input_df()
+        filters = self._candidate_filters(min_marginal_ratio)
+        packed_rows = np.array([pack_rows(~self._filter_mask(input_df, filter_).values) for filter_ in filters])
+        self.filter_plan = greedy_filter_plan(filters, packed_rows, len(input_df), max_filters, min_marginal_ratio)
+        for step in self.filter_plan:
+            logging.info("Planned filter: {}, cumulative rows filtered out: {}".format(
+                step['filter'][:2], step['cumulative_rows']))
+
+    def _live_input_df(self):
+        return self.input_df
+
+    def _candidate_filters(self, min_marginal_ratio=MIN_MARGINAL_RATIO):
+        """The filters, in the format of 'best_filter', 'plan_filters' chooses from.
+
+        :param min_marginal_ratio: (float) minimum ratio of the input rows each category of an IN list has to remove
+        :return: (list)
+        """
+        n_rows = self.input_profile.n_rows
+        filters = list()
+        for finding in self.filtering_quick_gains:
+            col, dtype = finding['column'], finding['dtype']
+            if dtype == 'date':
+                filters.append((col, finding['filter_out'], dtype, finding['useless_rows'],
+                                finding['useless_rows'] / n_rows))
+                continue
+            filters.extend(
+                (col, ranked['category'], dtype, ranked['rows'], ranked['rows'] / n_rows)
+                for ranked in self.rank_unused_categories(col)
+            )
+            categories_filter = self.unused_categories_filter(col, min_marginal_ratio=min_marginal_ratio)
+            if categories_filter is not None and len(categories_filter[1]) > 1:
+                filters.append(categories_filter)
+        return filters
+
+    def release_frames(self):
+        """Drops the references to the analysed DFs and their profiles once the analysis is over, the findings
+        ('usage_percentage', 'filtering_quick_gains', 'best_filter', ...) are kept, they are all the reports need.
+
+        """
+        self.extended_resulting_df = pd.DataFrame()
+        self.final_df = pd.DataFrame()
+        self.final_profile = ColumnProfile(self.final_df)
+        self.input_df = pd.DataFrame()
+        self.input_profile = ColumnProfile(self.input_df)
+        self.resulting_df = pd.DataFrame()
+        self.result_profile = ColumnProfile(self.resulting_df)
+        self.result_index = ResultIndex(self.resulting_df, self.result_profile)
+
 
 class MultiColumnFilters(SingleColumnFilters):
 
-    def __init__(self, input_df, resulting_df, merging_cols=None):
+    def __init__(self, input_df, resulting_df, merging_cols=None, instrumentation=None):
         self.input_df = input_df
+        self.input_file_name = None
         self.resulting_df = resulting_df
         self.merging_cols = merging_cols
+        self.instrumentation = instrumentation if instrumentation is not None else Instrumentation()
+        self.input_profile = ColumnProfile(input_df)
+        self.result_profile = ColumnProfile(resulting_df)
+        self.result_index = ResultIndex(resulting_df, self.result_profile)
         super(SingleColumnFilters, self).__init__()
         self.usage_percentage = dict()
         self.combo_cols = dict()
-        self.combos_to_check_in_final = list()
+        self.combos_to_check_in_final = pd.DataFrame()
         self.combos_to_exclude = pd.DataFrame()
+        self._executor = None
 
     def get_multi_column_filters(self):
         logging.info("Starting Multi Column Filter Analisis")
@@ -362,62 +808,40 @@ class MultiColumnFilters(SingleColumnFilters):
         if not self.matching_cols:
             logging.warning('Without shared columns this tool is worthless, consider renaming columns')
             return
-        self._merge_input_to_final()
-        self._set_final_df_to_work_with()
+        with self._stage('merge') as record:
+            self._merge_input_to_final()
+            self._set_final_df_to_work_with()
+            # a chunked input is only counted while it is merged
+            record['rows'] = self.input_profile.n_rows
+            record['merged_rows'] = len(self.final_df)
         self.columns_usage_percentage()
-        self._determine_possible_multi_column_filters()
-        self._determine_multi_column_filters()
-
-    def _combo_appears_often_in_input(self, combo, input_catego_groupby):
-        """Given a combination of values for the columns in 'combo_cols' this function weights the amount
-        of appearences in relation to the 'input_df' to determine if a filter excluding this combination is valuable.
-
-        :param row: (DataFrame) single row df
-        :param input_catego_df: (DataFrame): a DataFrame grouped by columns in 'combo_cols'
-        :return: Boolean
-        """
-        df = self.input_df.loc[input_catego_groupby.groups[combo]]
-        multi_col_filter_ratio = len(df) / len(self.input_df)
-        if multi_col_filter_ratio > MULTI_COL_FILTER_RATIO:
-            return 1
-        else:
-            return 0
+        with self._stage('possible_multi_column_filters', self.input_profile.n_rows):
+            self._determine_possible_multi_column_filters()
+        with self._stage('multi_column_filters', len(self.combos_to_check_in_final)):
+            self._determine_multi_column_filters()
 
     def _determine_possible_multi_column_filters(self):
-        """For the values / columns combinations generated using 'generate_possible_combinations', check if the
-        combination exists in the 'input_df'.
-
-        """
-        combinations_generator = self._generate_possible_combinations()
-        input_catego_groupby = self.input_df.groupby(self.combo_cols)
-        for combo in combinations_generator:
-            if combo in input_catego_groupby.groups:
-                if self._combo_appears_often_in_input(combo, input_catego_groupby):
-                    combo_row_df = pd.DataFrame([combo], columns=self.combo_cols)
-                    self.combos_to_check_in_final.append(combo_row_df)
-
-    def _generate_possible_combinations(self):
-        """For the columns in the 'combo_cols' list calculate all possible combinations of the columns unique values
+        """Counts the combinations of values for the columns in 'combo_cols' that are actually observed in the
+        'input_df' with a single groupby and keeps the ones that appear often enough, in relation to the 'input_df',
+        to make a filter excluding them valuable. The cost depends on the number of distinct combinations, not on
+        the cartesian product of the columns unique values.
 
         """
-        lists_for_prod = list()
         self._set_combo_columns()
-        for col in self.combo_cols:
-            unique_values = list(self.input_df[col].unique())
-            lists_for_prod.append(unique_values)
-        return itertools.product(*lists_for_prod)
+        combo_counts = self.input_df.groupby(self.combo_cols).size()
+        frequent_combos = combo_counts.loc[combo_counts / len(self.input_df) > MULTI_COL_FILTER_RATIO]
+        self.combos_to_check_in_final = frequent_combos.index.to_frame(index=False)
 
     def _determine_multi_column_filters(self):
-        """For the values / columns combinations already generated and found in 'input_df' check that is exists in
-        the 'final_df' and that it appears often, if so it is added to a DF for post in the report.
+        """For the values / columns combinations already found often in 'input_df' check that they exist in the
+        'final_df', a single hashed merge against the deduplicated 'final_df' combinations replaces a row by row
+        search, the matches are kept in a DF for post in the report.
 
         """
         resulting_catego_df = self.final_df[self.combo_cols].drop_duplicates()
-        combos_to_exclude = list()
-        for combo_row in self.combos_to_check_in_final:
-            if isin_row(combo_row, resulting_catego_df):
-                combos_to_exclude.append(combo_row)
-        self.combos_to_exclude = pd.concat(combos_to_exclude)
+        self.combos_to_exclude = self.combos_to_check_in_final.merge(
+            resulting_catego_df, how='inner', on=self.combo_cols
+        )
 
     def _set_combo_columns(self):
         """If the number of combinations is larger than 'MULTIPLE_COMBINATION_FILTERS' in take out the column with the
@@ -426,8 +850,8 @@ class MultiColumnFilters(SingleColumnFilters):
         :return:
         """
         for col in self.input_df.columns:
-            if self._is_natural_divider(self.input_df[col]):
-                self.combo_cols.update({col: len(self.input_df[col].unique())})
+            if self._is_natural_divider(col):
+                self.combo_cols.update({col: self.input_profile.n_unique(col)})
         number_of_combinations = reduce(lambda x, y: x * y, self.combo_cols.values())
         while number_of_combinations > MULTIPLE_COMBINATION_FILTERS:
             max_key = max(self.combo_cols.items(), key=operator.itemgetter(1))[0]
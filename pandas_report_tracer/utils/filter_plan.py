@@ -0,0 +1,61 @@
+import numpy as np
+
+MAX_CATEGORIES_PER_COLUMN = 20
+MAX_FILTERS = 5
+MIN_MARGINAL_RATIO = 0.01
+# number of set bits of every byte value
+POPCOUNT = np.array([bin(byte).count('1') for byte in range(256)], dtype=np.uint8)
+
+
+def pack_rows(removed_rows):
+    """Packs a boolean array with a bit per row, 8 times smaller than the boolean array.
+
+    :param removed_rows: (numpy array) boolean, True for the rows a filter removes
+    :return: (numpy array) uint8
+    """
+    return np.packbits(removed_rows)
+
+
+def count_rows(packed_rows):
+    """Number of rows set in packed bitmasks.
+
+    :param packed_rows: (numpy array) uint8, one bitmask or a 2d array with a bitmask per row
+    :return: (int or numpy array) the count of each bitmask
+    """
+    return POPCOUNT[packed_rows].sum(axis=-1, dtype=np.int64)
+
+
+def greedy_filter_plan(filters, packed_rows, n_rows, max_filters=MAX_FILTERS, min_marginal_ratio=MIN_MARGINAL_RATIO):
+    """Picks, one at a time, the filter that removes the most rows not removed yet by the filters already picked,
+    until there are 'max_filters' or the next one would remove less than 'min_marginal_ratio' of the rows. The rows
+    each filter removes are bitmasks, so the rows removed by several filters are only counted once.
+
+    :param filters: (list) the candidate filters, in the format of 'best_filter'
+    :param packed_rows: (numpy array) uint8, 2d, the packed bitmask of the rows each filter removes
+    :param n_rows: (int) the number of rows of the DF the bitmasks describe
+    :param max_filters: (int) maximum number of filters in the plan
+    :param min_marginal_ratio: (float) minimum ratio of 'n_rows' a filter has to add to the plan
+    :return: (list) ranked dicts with the 'filter', its 'marginal_rows' and the 'cumulative_rows' and
+        'cumulative_ratio' of the plan up to it
+    """
+    plan = list()
+    if not filters:
+        return plan
+    removed = np.zeros(packed_rows.shape[1], dtype=np.uint8)
+    candidates = np.ones(len(filters), dtype=bool)
+    min_marginal_rows = max(min_marginal_ratio * n_rows, 1)
+    while len(plan) < max_filters and candidates.any():
+        marginal_rows = np.where(candidates, count_rows(packed_rows & ~removed), -1)
+        best = int(marginal_rows.argmax())
+        if marginal_rows[best] < min_marginal_rows:
+            break
+        candidates[best] = False
+        removed |= packed_rows[best]
+        cumulative_rows = int(count_rows(removed))
+        plan.append({
+            'filter': filters[best],
+            'marginal_rows': int(marginal_rows[best]),
+            'cumulative_rows': cumulative_rows,
+            'cumulative_ratio': cumulative_rows / n_rows
+        })
+    return plan
@@ -0,0 +1,136 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+from .column_profile import ColumnProfile
+from .columns_to_work_with import SingleColumnFilters
+
+
+class IncrementalColumnProfile(ColumnProfile):
+    """ColumnProfile of the rows of a DF that are still 'live', the rows removed by 'remove_rows' are subtracted
+    from the cached value counts instead of scanning the columns again.
+
+    """
+
+    def __init__(self, df):
+        super().__init__(df)
+        self.live = np.ones(len(df), dtype=bool)
+        self._n_rows = len(df)
+
+    @property
+    def n_rows(self):
+        return self._n_rows
+
+    def value_counts(self, col):
+        if self._n_rows == len(self.df) or col in self._value_counts:
+            return super().value_counts(col)
+        counts = self.df[col][self.live].value_counts(dropna=False)
+        self._value_counts[col] = counts.loc[counts > 0]
+        return self._value_counts[col]
+
+    def n_unique_bounds(self, col, relative_error=None):
+        # a sketch of the column would count the removed rows too
+        return self.n_unique(col), self.n_unique(col)
+
+    def worth_sketching(self, col):
+        # a sketch of the column would count the removed rows too
+        return False
+
+    def remove_rows(self, removed):
+        """Subtracts the value counts of the 'removed' rows from the cached counts and drops them from the live rows.
+
+        :param removed: (numpy array) boolean, True for the live rows to remove
+        """
+        for col, counts in list(self._value_counts.items()):
+            removed_counts = self.df[col][removed].value_counts(dropna=False)
+            removed_counts = removed_counts.loc[removed_counts > 0]
+            # the removed values are all in the live counts, a positional subtraction avoids aligning the indexes
+            values = counts.values.copy()
+            values[counts.index.get_indexer(removed_counts.index)] -= removed_counts.values
+            self._value_counts[col] = pd.Series(values, index=counts.index, name=counts.name).loc[values > 0]
+        self._cumulative_counts.clear()
+        self.live &= ~removed
+        self._n_rows = int(self.live.sum())
+
+
+class IncrementalSingleColumnFilters(SingleColumnFilters):
+    """SingleColumnFilters for several runs of the analysis on the same input, each run with the best filter of the
+    previous one applied. The first 'make_analysis' is the full analysis, the next ones only drop the filtered rows
+    from the 'input_profile' and recompute the findings from the profiles: the filtered rows are never in the result
+    (that is what makes a filter safe), so the merge, the 'final_df' and its profile do not change. The input file is
+    written once, by 'save_inputfile', with every filter applied.
+
+    """
+
+    def __init__(self, input_df, resulting_df, merging_cols=None, input_file_name=None, input_profile=None,
+                 **kwargs):
+        super().__init__(input_df, resulting_df, merging_cols, input_file_name=input_file_name, **kwargs)
+        self.input_profile = IncrementalColumnProfile(input_df)
+        if input_profile is not None:
+            self.input_profile.seed(input_profile.cached_value_counts())
+        self.applied_filters = list()
+        self._analysed = False
+        self._pending_filter = False
+
+    def make_analysis(self, apply_filter=False, n_jobs=1):
+        """Runs the full analysis the first time and 'update_analysis' the next ones.
+
+        :param apply_filter: (bool) apply the best filter found before the next run, the file is not written
+        :param n_jobs: (int) number of threads the per column work is spread over
+        """
+        self._apply_pending_filter()
+        if self._analysed:
+            self.update_analysis(n_jobs)
+        else:
+            super().make_analysis(n_jobs=n_jobs)
+            self._analysed = True
+        self._pending_filter = apply_filter
+
+    def update_analysis(self, n_jobs=1):
+        """Recomputes the usage percentages, natural dividers and filters of the live rows from the updated
+        'input_profile', the 'final_profile' is reused as it is.
+
+        :param n_jobs: (int) number of threads the per column work is spread over
+        """
+        self.filtering_quick_gains = list()
+        self.natural_dividers_dtypes = dict()
+        self.unused_category_rankings = dict()
+        self.usage_percentage = dict()
+        with self._columns_executor(n_jobs):
+            self.columns_usage_percentage()
+            self._find_slicing_col_filters()
+        with self._stage('best_filter', len(self.filtering_quick_gains)):
+            self._determine_best_slicing_col_filter()
+
+    def _apply_pending_filter(self):
+        if not self._pending_filter:
+            return
+        live = self.input_profile.live
+        with self._stage('apply_filter', int(live.sum()), self.best_filter[0]):
+            removed = live.copy()
+            removed[live] = ~self._best_filter_mask(self.input_df.loc[live, [self.best_filter[0]]]).values
+            logging.info("Applying filter {}, {} rows removed".format(self.best_filter[:2], removed.sum()))
+            self.input_profile.remove_rows(removed)
+        self.applied_filters.append(self.best_filter)
+        self._pending_filter = False
+
+    def filtered_input_df(self):
+        """The rows of 'input_df' left by the filters applied so far.
+
+        :return: (DataFrame)
+        """
+        self._apply_pending_filter()
+        return self._live_input_df()
+
+    def _live_input_df(self):
+        return self.input_df.loc[self.input_profile.live]
+
+    def save_inputfile(self, input_file_name=None):
+        """Writes the input with every filter applied, replacing the original file.
+
+        :param input_file_name: (str) the path and name of the input csv, 'input_file_name' by default
+        """
+        self.filtered_input_df().to_csv(
+            input_file_name or self.input_file_name, index=False, encoding='utf-8', escapechar='\\'
+        )
@@ -0,0 +1,67 @@
+import logging
+import os
+
+from .chunked_analysis import ChunkedSingleColumnFilters
+from .loading import load_input
+from .predicates import export_predicates
+from .sampled_analysis import SampledSingleColumnFilters
+
+
+def parquet_copy_path(csv_file, parquet_copy_dir):
+    """Path of the Parquet copy of the input 'csv_file' in 'parquet_copy_dir', see 'export_predicates'.
+
+    :param csv_file: (str) path of the input csv
+    :param parquet_copy_dir: (str) directory of the Parquet copies, None for no copy
+    :return: (str) None without a 'parquet_copy_dir'
+    """
+    if not parquet_copy_dir:
+        return None
+    return os.path.join(parquet_copy_dir, os.path.splitext(os.path.basename(csv_file))[0] + '.parquet')
+
+
+def analyze_input(csv_file, result_index, merging_cols=None, renaming_cols=None, chunksize=None, sample_size=None,
+                  plan_filters=None, parquet_copy_dir=None, profile_cache=None, n_jobs=1, analysis_kwargs=None):
+    """Analyses one input against the result of 'result_index', the same way whether the inputs are analysed one
+    after the other or in worker processes: the input is streamed in chunks, estimated from a sample or loaded with
+    the columns the analysis uses, then the filter plan and the push down predicates asked for are added.
+
+    :param csv_file: (str) path of the input csv
+    :param result_index: (ResultIndex) index of the result all the inputs are analysed against
+    :param merging_cols: (list) columns to merge the input to the result, None to use the matching id columns
+    :param renaming_cols: (dict) columns of the input to rename to match the result
+    :param chunksize: (int) if set the input is streamed in batches of this number of rows
+    :param sample_size: (int) if set the findings are estimated from a sample of this number of rows
+    :param plan_filters: (int) if set a plan of at most this number of filters is ranked, see 'plan_filters'
+    :param parquet_copy_dir: (str) directory of the Parquet copies the saving of the predicates is measured on
+    :param profile_cache: (ProfileCache) cache of the input profiles, not used for streamed inputs
+    :param n_jobs: (int) number of threads the per column work is spread over
+    :param analysis_kwargs: (dict) extra arguments for the SingleColumnFilters object, e.g. 'date_window'
+    :return: (SingleColumnFilters) the analysed object, without its frames
+    """
+    analysis_kwargs = analysis_kwargs or dict()
+    if chunksize:
+        if sample_size:
+            logging.warning("'sample_size' is not supported when the input is streamed in chunks, ignoring it")
+        analysis = ChunkedSingleColumnFilters(
+            csv_file, result_index.resulting_df, merging_cols, renaming_cols, chunksize=chunksize,
+            result_profile=result_index.profile, result_index=result_index, **analysis_kwargs
+        )
+    else:
+        input_df = load_input(
+            csv_file, list(result_index.resulting_df.columns), merging_cols, renaming_cols,
+            result_dtypes=result_index.resulting_df.dtypes
+        )
+        analysis_kwargs = dict(analysis_kwargs, input_file_name=csv_file)
+        if profile_cache is not None:
+            analysis_kwargs['input_profile'] = profile_cache.load_profile(csv_file, input_df)
+        if sample_size:
+            analysis_kwargs.update(analysis_class=SampledSingleColumnFilters, sample_size=sample_size)
+        analysis = result_index.analysis(input_df, merging_cols, **analysis_kwargs)
+    analysis.make_analysis(n_jobs=n_jobs)
+    if plan_filters:
+        analysis.plan_filters(plan_filters)
+    analysis.predicates = export_predicates(analysis, parquet_copy_path(csv_file, parquet_copy_dir))
+    if profile_cache is not None and not chunksize:
+        profile_cache.store_profile(analysis.input_profile)
+    analysis.release_frames()
+    return analysis
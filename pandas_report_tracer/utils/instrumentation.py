@@ -0,0 +1,145 @@
+import contextlib
+import json
+import sys
+import threading
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    # Unix only, without it the memory of the stages is only measured with 'trace_memory'
+    resource = None
+
+
+def peak_rss_bytes():
+    """High water mark of the resident memory of the process, it never decreases so it only grows with a stage
+    that needs more memory than all the previous ones. 0 where 'resource' is not available (Windows).
+
+    :return: (int)
+    """
+    if resource is None:
+        return 0
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+
+class Instrumentation:
+    """Records the wall time, CPU time, memory and rows of the stages of an analysis, and of the columns within a
+    stage, as dicts in 'records'. Every record is also passed to the 'callback' and appended as a JSON line to the
+    'stats_file', if there are any, as soon as its stage is over.
+
+    The 'memory_bytes' of a record is the growth of the peak resident memory of the process during the stage, it is
+    cheap but 0 for a stage that needs less memory than an earlier one. With 'trace_memory' it is the peak of the
+    python and numpy allocations of the stage over the ones alive when it started, measured with tracemalloc, which
+    is precise but slows the analysis down. The CPU time and the traced memory are the ones of the whole process, so
+    with 'n_jobs' threads the records of the columns processed at the same time overlap.
+
+    """
+
+    def __init__(self, callback=None, stats_file=None, trace_memory=False):
+        self.callback = callback
+        self.records = list()
+        self.stats_file = stats_file
+        self.trace_memory = trace_memory
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._open_traces = 0
+        self._started_tracing = False
+
+    def __getstate__(self):
+        # the analyses run in other processes are pickled back with their records
+        state = dict(self.__dict__)
+        del state['_lock'], state['_local']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @contextlib.contextmanager
+    def stage(self, name, column=None, rows=None, **labels):
+        """Measures the block it wraps, the record is yielded so the rows can be set once they are known.
+
+        :param name: (str) name of the stage
+        :param column: (str) the column processed, None for a whole stage
+        :param rows: (int) rows processed by the stage
+        :param labels: extra items of the record, e.g. the input file
+        """
+        record = dict(labels, stage=name, column=column, rows=rows)
+        tracing = self._start_memory_trace()
+        start_rss = peak_rss_bytes()
+        start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        finally:
+            record['seconds'] = time.perf_counter() - start
+            record['cpu_seconds'] = time.process_time() - cpu_start
+            record['memory_bytes'] = self._stop_memory_trace(tracing) if tracing else peak_rss_bytes() - start_rss
+            self._add(record)
+
+    def _start_memory_trace(self):
+        """Starts tracing for a stage, the stages of a thread are nested so they keep a stack of their peaks.
+
+        :return: (dict) the trace of the stage, None without 'trace_memory'
+        """
+        if not self.trace_memory:
+            return None
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+            self._open_traces += 1
+        stack = self._trace_stack()
+        current, peak = tracemalloc.get_traced_memory()
+        if stack:
+            # the peak is reset for the nested stage, the enclosing one keeps the peak reached so far
+            stack[-1]['peak'] = max(stack[-1]['peak'], peak)
+        tracemalloc.reset_peak()
+        trace = {'start': current, 'peak': current}
+        stack.append(trace)
+        return trace
+
+    def _stop_memory_trace(self, trace):
+        stack = self._trace_stack()
+        stack.remove(trace)
+        peak = max(trace['peak'], tracemalloc.get_traced_memory()[1])
+        if stack:
+            stack[-1]['peak'] = max(stack[-1]['peak'], peak)
+        with self._lock:
+            self._open_traces -= 1
+            if not self._open_traces and self._started_tracing:
+                tracemalloc.stop()
+                self._started_tracing = False
+        return max(peak - trace['start'], 0)
+
+    def _trace_stack(self):
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = list()
+        return self._local.stack
+
+    def _add(self, record):
+        with self._lock:
+            self.records.append(record)
+            if self.stats_file:
+                with open(self.stats_file, 'a') as stats_file:
+                    stats_file.write(json.dumps(record, default=str) + '\n')
+        if self.callback is not None:
+            self.callback(record)
+
+    def stage_records(self):
+        """The records of the whole stages, without the ones of their columns.
+
+        :return: (list)
+        """
+        return [record for record in self.records if record['column'] is None]
+
+    def slowest_columns(self, n=10):
+        """The 'n' slowest column records.
+
+        :param n: (int)
+        :return: (list)
+        """
+        column_records = [record for record in self.records if record['column'] is not None]
+        return sorted(column_records, key=lambda record: record['seconds'], reverse=True)[:n]
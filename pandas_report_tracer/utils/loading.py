@@ -0,0 +1,159 @@
+import glob
+import os
+
+import pandas as pd
+
+CSV_EXTENSIONS = ('.csv', '.csv.gz')
+FEATHER_EXTENSIONS = ('.feather', '.arrow')
+PARQUET_EXTENSIONS = ('.parquet', '.pq')
+READ_CSV_KWARGS = {'escapechar': '\\'}
+
+
+def _file_format(path):
+    for file_format, extensions in (('csv', CSV_EXTENSIONS), ('feather', FEATHER_EXTENSIONS),
+                                    ('parquet', PARQUET_EXTENSIONS)):
+        if path.lower().endswith(extensions):
+            return file_format
+    raise ValueError("Unsupported file format: {}".format(path))
+
+
+def _is_date_col(col):
+    return 'date' in col or 'Date' in col
+
+
+def list_data_files(directory):
+    """Paths of the csv, parquet and feather files in 'directory'.
+
+    :param directory: (str)
+    :return: (list) sorted paths
+    """
+    return sorted(
+        path for path in glob.glob(os.path.join(directory, '*'))
+        if path.lower().endswith(CSV_EXTENSIONS + FEATHER_EXTENSIONS + PARQUET_EXTENSIONS)
+    )
+
+
+def read_columns(path, read_csv_kwargs=None):
+    """Reads only the header / schema of a data file.
+
+    :param path: (str) path of a csv, parquet or feather file
+    :param read_csv_kwargs: (dict) extra arguments for pd.read_csv
+    :return: (list) the column names
+    """
+    file_format = _file_format(path)
+    if file_format == 'csv':
+        read_csv_kwargs = read_csv_kwargs if read_csv_kwargs is not None else READ_CSV_KWARGS
+        return list(pd.read_csv(path, nrows=0, **read_csv_kwargs).columns)
+    import pyarrow
+    if file_format == 'parquet':
+        import pyarrow.parquet
+        return pyarrow.parquet.read_schema(path).names
+    return pyarrow.ipc.open_file(path).schema.names
+
+
+def columns_to_load(input_columns, result_columns, merging_cols=None):
+    """Works out which columns the analysis of an input against a result uses. If the DFs can be merged (there are
+    'merging_cols' or shared id columns) every input column is analysed, otherwise only the shared ones, and only the
+    shared columns of the result are ever read, the rest are dead weight.
+
+    :param input_columns: (list) columns of the input, already renamed
+    :param result_columns: (list) columns of the result
+    :param merging_cols: (list) columns the input is merged to the result on
+    :return: (tuple) list of input columns, list of result columns
+    """
+    matching_cols = [col for col in input_columns if col in set(result_columns)]
+    matching_id_cols = [col for col in matching_cols if 'id' in col or 'Id' in col]
+    if merging_cols or matching_id_cols:
+        return list(input_columns), matching_cols
+    return matching_cols, matching_cols
+
+
+def load_frame(path, columns=None, dtype=None, read_csv_kwargs=None):
+    """Loads 'columns' of a csv, parquet or feather file, the date columns (with 'date' or 'Date' in their name) are
+    parsed to datetime while reading, so the analysis does not re-parse them.
+
+    :param path: (str) path of the data file
+    :param columns: (list) columns to load, all of them if None
+    :param dtype: (dict) explicit dtypes by column, only used for csv files
+    :param read_csv_kwargs: (dict) extra arguments for pd.read_csv
+    :return: (DataFrame)
+    """
+    file_format = _file_format(path)
+    if file_format == 'csv':
+        read_csv_kwargs = read_csv_kwargs if read_csv_kwargs is not None else READ_CSV_KWARGS
+        header = columns if columns is not None else read_columns(path, read_csv_kwargs)
+        return pd.read_csv(
+            path, usecols=columns, dtype=dtype, parse_dates=[col for col in header if _is_date_col(col)],
+            **read_csv_kwargs
+        )
+    if file_format == 'parquet':
+        df = pd.read_parquet(path, columns=columns)
+    else:
+        df = pd.read_feather(path, columns=columns)
+    for col in df.columns:
+        if _is_date_col(col) and not pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = pd.to_datetime(df[col])
+    return df
+
+
+def load_result(result_path, input_paths, merging_dict=None, renaming_cols_dict=None):
+    """Loads the result with just the columns shared with at least one of the inputs.
+
+    :param result_path: (str) path of the result file
+    :param input_paths: (list) paths of the inputs that will be analysed against the result
+    :param merging_dict: (dict) input path to list of merging columns
+    :param renaming_cols_dict: (dict) input path to dict of columns to rename
+    :return: (DataFrame)
+    """
+    merging_dict = merging_dict or dict()
+    renaming_cols_dict = renaming_cols_dict or dict()
+    result_columns = read_columns(result_path)
+    needed_columns = set()
+    for input_path in input_paths:
+        renaming_cols = renaming_cols_dict.get(input_path, dict())
+        input_columns = [renaming_cols.get(col, col) for col in read_columns(input_path)]
+        needed_columns.update(columns_to_load(input_columns, result_columns, merging_dict.get(input_path))[1])
+    return load_frame(result_path, [col for col in result_columns if col in needed_columns])
+
+
+def shared_dtypes(result_dtypes, columns):
+    """Dtypes to read the input 'columns' shared with the result so they are comparable with it: the text columns of
+    the result are read as text and its float columns as floats, whatever the values of the input look like. The date
+    columns are parsed anyway and the other dtypes (int, bool) are left to inference since the input may have nans.
+
+    :param result_dtypes: (Series / dict) dtypes of the result by column
+    :param columns: (list) columns of the input, already renamed
+    :return: (dict) dtypes by column
+    """
+    dtypes = dict()
+    for col in columns:
+        if col not in result_dtypes or _is_date_col(col):
+            continue
+        if pd.api.types.is_object_dtype(result_dtypes[col]):
+            dtypes[col] = str
+        elif pd.api.types.is_float_dtype(result_dtypes[col]):
+            dtypes[col] = 'float64'
+    return dtypes
+
+
+def load_input(input_path, result_columns, merging_cols=None, renaming_cols=None, dtype=None, result_dtypes=None):
+    """Loads the columns of an input that its analysis against a result with 'result_columns' uses, renamed with
+    'renaming_cols'. With 'result_dtypes' the columns shared with the result are read with compatible dtypes (see
+    shared_dtypes), the explicit 'dtype' wins over them.
+
+    :param input_path: (str) path of the input file
+    :param result_columns: (list) columns of the result
+    :param merging_cols: (list) columns the input is merged to the result on
+    :param renaming_cols: (dict) columns of the input to rename to match the result
+    :param dtype: (dict) explicit dtypes by column (original names), only used for csv files
+    :param result_dtypes: (Series / dict) dtypes of the result by column, only used for csv files
+    :return: (DataFrame)
+    """
+    renaming_cols = renaming_cols or dict()
+    original_names = {renaming_cols.get(col, col): col for col in read_columns(input_path)}
+    input_columns = columns_to_load(list(original_names), result_columns, merging_cols)[0]
+    if result_dtypes is not None:
+        derived_dtypes = shared_dtypes(result_dtypes, input_columns)
+        dtype = dict({original_names[col]: col_dtype for col, col_dtype in derived_dtypes.items()}, **(dtype or {}))
+    input_df = load_frame(input_path, [original_names[col] for col in input_columns], dtype)
+    return input_df.rename(columns=renaming_cols)
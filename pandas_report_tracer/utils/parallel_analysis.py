@@ -0,0 +1,83 @@
+import concurrent.futures
+import logging
+import multiprocessing
+import os
+
+from .input_analysis import analyze_input
+from .result_index import ResultIndex
+from .scratch_store import open_frame
+
+MAX_WORKERS = os.cpu_count()
+
+# set in the parent before the workers are forked so they share the result DF copy on write, or once per worker by
+# '_set_resulting_df' where fork is not available or by '_open_resulting_df' when the result is spilled. Every input
+# a worker analyses reads the facts of the result from the same index
+_result_index = None
+
+
+def _set_resulting_df(resulting_df):
+    global _result_index
+    _result_index = ResultIndex(resulting_df) if resulting_df is not None else None
+
+
+def _open_resulting_df(path):
+    _set_resulting_df(open_frame(path))
+
+
+def _analyze_input(csv_file, merging_cols, renaming_cols, input_options):
+    """Worker side of 'analyze_inputs_in_parallel', runs 'analyze_input' against the shared result, the analysis is
+    returned without its frames so only the findings travel back to the parent.
+
+    :param csv_file: (str) path of the input csv
+    :param merging_cols: (list) columns to merge the input to the result, None to use the matching id columns
+    :param renaming_cols: (dict) columns of the input to rename to match the result
+    :param input_options: (dict) the other arguments of 'analyze_input'
+    :return: (SingleColumnFilters) the analysed object
+    """
+    return analyze_input(csv_file, _result_index, merging_cols, renaming_cols, **input_options)
+
+
+def analyze_inputs_in_parallel(filenames, resulting_df, merging_dict=None, renaming_cols_dict=None,
+                               max_workers=MAX_WORKERS, scratch_store=None, **input_options):
+    """Runs 'analyze_input' for each input csv in a pool of processes. The 'resulting_df' is loaded once by the
+    caller and shared with the workers: inherited copy on write where the fork start method is available, otherwise
+    sent once to each worker instead of once per input. With a 'scratch_store' it is spilled to it and every worker
+    maps the same file, so its numeric and date columns are in memory once for all of them.
+
+    :param filenames: (list) paths of the input csv files
+    :param resulting_df: (DataFrame) the result all the inputs are analysed against
+    :param merging_dict: (dict) input path to list of merging columns
+    :param renaming_cols_dict: (dict) input path to dict of columns to rename
+    :param max_workers: (int) number of worker processes
+    :param scratch_store: (ScratchStore) store to spill the result to
+    :param input_options: the other arguments of 'analyze_input', e.g. 'chunksize', 'plan_filters' or
+        'analysis_kwargs', the same for every input
+    :return: (list) the analysed SingleColumnFilters objects, in the order of 'filenames'
+    """
+    merging_dict = merging_dict or dict()
+    renaming_cols_dict = renaming_cols_dict or dict()
+    if scratch_store is not None:
+        executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers, initializer=_open_resulting_df, initargs=(scratch_store.spill('result', resulting_df),)
+        )
+    elif 'fork' in multiprocessing.get_all_start_methods():
+        _set_resulting_df(resulting_df)
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers, mp_context=multiprocessing.get_context('fork'))
+    else:
+        executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers, initializer=_set_resulting_df, initargs=(resulting_df,)
+        )
+    try:
+        with executor:
+            futures = [
+                executor.submit(
+                    _analyze_input, csv_file, merging_dict.get(csv_file), renaming_cols_dict.get(csv_file), input_options
+                ) for csv_file in filenames
+            ]
+            analyses = list()
+            for csv_file, future in zip(filenames, futures):
+                logging.info("Gathering analysis of: {}".format(csv_file))
+                analyses.append(future.result())
+    finally:
+        _set_resulting_df(None)
+    return analyses
@@ -0,0 +1,226 @@
+import datetime
+import logging
+import numbers
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from .columns_to_work_with import DATE_WINDOW_FILTER
+
+SQL_TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def _sql_identifier(col):
+    return '"{}"'.format(str(col).replace('"', '""'))
+
+
+def _sql_literal(value):
+    if isinstance(value, (bool, np.bool_)):
+        return 'TRUE' if value else 'FALSE'
+    if isinstance(value, numbers.Number):
+        return repr(value.item() if isinstance(value, np.generic) else value)
+    if isinstance(value, (datetime.date, np.datetime64)):
+        timestamp = pd.Timestamp(value)
+        fraction = '.{:06d}'.format(timestamp.microsecond) if timestamp.microsecond else ''
+        return "TIMESTAMP '{}{}'".format(timestamp.strftime(SQL_TIMESTAMP_FORMAT), fraction)
+    return "'{}'".format(str(value).replace("'", "''"))
+
+
+def _window_bounds(window):
+    """Inclusive lower and exclusive upper bounds of a date window, to the microsecond, the precision of SQL and
+    Arrow timestamps. They are rounded outwards, so the predicate keeps at least the rows the analysis keeps, and the
+    end of a month or quarter window (23:59:59.999999999) becomes the start of the next one.
+
+    :param window: (tuple) lower and upper dates, both included, as in the 'filter_out' of a date window filter
+    :return: (tuple) pandas Timestamps
+    """
+    lower_date, upper_date = [pd.Timestamp(date_) for date_ in window]
+    return lower_date.floor('us'), (upper_date + pd.Timedelta(1, 'ns')).ceil('us')
+
+
+def _filtered_values(filter_out):
+    """The values a category filter removes, a single value or a collection of them (as in the findings), split in
+    the non nan values and whether nans are removed too, nan is filtered out as any other category.
+
+    :param filter_out: (object) the 'filter_out' of a category filter
+    :return: (tuple) list of non nan values, bool
+    """
+    values = list(filter_out) if isinstance(filter_out, (list, set, frozenset)) else [filter_out]
+    non_nan_values = [value for value in values if not pd.isnull(value)]
+    return non_nan_values, len(non_nan_values) < len(values)
+
+
+def to_sql(filter_):
+    """SQL WHERE fragment keeping the rows the filter keeps in the analysis, with its nan handling: a category
+    filter keeps the nulls (unless nan is one of the categories filtered out) and a date range or window filter keeps
+    them too.
+
+    :param filter_: (tuple) column, filter out and dtype, in the format of 'best_filter'
+    :return: (str) the fragment, None if the filter keeps every row
+    """
+    col, filter_out, dtype = filter_[:3]
+    column = _sql_identifier(col)
+    if dtype != 'date':
+        values, removes_nans = _filtered_values(filter_out)
+        if not values:
+            return '{} IS NOT NULL'.format(column) if removes_nans else None
+        if len(values) == 1:
+            condition = '{} <> {}'.format(column, _sql_literal(values[0]))
+        else:
+            condition = '{} NOT IN ({})'.format(column, ', '.join(_sql_literal(value) for value in values))
+        if removes_nans:
+            return '({} IS NOT NULL AND {})'.format(column, condition)
+        return '({} OR {} IS NULL)'.format(condition, column)
+    if filter_out == 'nan':
+        return '{} IS NOT NULL'.format(column)
+    if filter_out[0] == DATE_WINDOW_FILTER:
+        lower_date, upper_date = _window_bounds(filter_out[1])
+        return '({} >= {} AND {} < {} OR {} IS NULL)'.format(
+            column, _sql_literal(lower_date), column, _sql_literal(upper_date), column)
+    return '({} >= {} OR {} IS NULL)'.format(column, _sql_literal(pd.Timestamp(filter_out[1])), column)
+
+
+def to_sql_where(filters):
+    """SQL WHERE condition applying all the 'filters' together.
+
+    :param filters: (list) filters in the format of 'best_filter'
+    :return: (str) the condition, 'TRUE' if the filters keep every row
+    """
+    fragments = [fragment for fragment in map(to_sql, filters) if fragment]
+    return '\n  AND '.join(fragments) if fragments else 'TRUE'
+
+
+def to_dataset_expression(filter_):
+    """'pyarrow.dataset' filter expression keeping the rows the filter keeps in the analysis, see 'to_sql'.
+
+    :param filter_: (tuple) column, filter out and dtype, in the format of 'best_filter'
+    :return: (pyarrow.compute.Expression) the expression, None if the filter keeps every row
+    """
+    import pyarrow
+    import pyarrow.dataset
+    col, filter_out, dtype = filter_[:3]
+    field = pyarrow.dataset.field(col)
+    if dtype != 'date':
+        values, removes_nans = _filtered_values(filter_out)
+        if not values:
+            return field.is_valid() if removes_nans else None
+        if removes_nans:
+            return ~field.isin(values + [None])
+        if len(values) == 1:
+            return (field != pyarrow.scalar(values[0])) | field.is_null()
+        return ~field.isin(values)
+    if filter_out == 'nan':
+        return field.is_valid()
+    if filter_out[0] == DATE_WINDOW_FILTER:
+        lower_date, upper_date = [pyarrow.scalar(date_) for date_ in _window_bounds(filter_out[1])]
+        return ((field >= lower_date) & (field < upper_date)) | field.is_null()
+    return (field >= pyarrow.scalar(pd.Timestamp(filter_out[1]))) | field.is_null()
+
+
+def to_dataset_filter(filters):
+    """'pyarrow.dataset' filter expression applying all the 'filters' together.
+
+    :param filters: (list) filters in the format of 'best_filter'
+    :return: (pyarrow.compute.Expression) the expression, None if the filters keep every row
+    """
+    expression = None
+    for filter_expression in map(to_dataset_expression, filters):
+        if filter_expression is None:
+            continue
+        expression = filter_expression if expression is None else expression & filter_expression
+    return expression
+
+
+def write_parquet_copy(df, parquet_path):
+    """Writes the input DF, as analysed (dates parsed), to a local Parquet file for 'measure_read'. Categorical
+    columns are written with the dtype of their categories so the filters compare plain values.
+
+    :param df: (DataFrame) the 'input_df'
+    :param parquet_path: (str) path of the Parquet file
+    """
+    decoded = {
+        col: df[col].cat.categories.dtype for col in df.columns if isinstance(df[col].dtype, pd.CategoricalDtype)
+    }
+    df.astype(decoded).to_parquet(parquet_path, index=False)
+
+
+def _is_stale(parquet_path, input_file_name=None):
+    """Whether the Parquet copy has to be (re)written: it does not exist or it is older than the input file.
+
+    :param parquet_path: (str) path of the Parquet copy
+    :param input_file_name: (str) path of the input file the copy was written from, if known
+    :return: (bool)
+    """
+    if not os.path.exists(parquet_path):
+        return True
+    if input_file_name is None or not os.path.exists(input_file_name):
+        return False
+    return os.path.getmtime(parquet_path) < os.path.getmtime(input_file_name)
+
+
+def measure_read(parquet_path, filters, columns=None):
+    """Reads the Parquet file with and without the 'filters' pushed down to the scan and measures both reads.
+
+    :param parquet_path: (str) path of the Parquet file
+    :param filters: (list) filters in the format of 'best_filter'
+    :param columns: (list) columns to read, all of them by default
+    :return: (dict) 'rows', 'bytes' (in memory size of the table read) and 'seconds' of the 'unfiltered' and the
+        'filtered' reads, plus the 'saved_rows' and 'saved_bytes'
+    """
+    import pyarrow.dataset
+    dataset = pyarrow.dataset.dataset(parquet_path, format='parquet')
+    measures = dict()
+    for read, expression in (('unfiltered', None), ('filtered', to_dataset_filter(filters))):
+        start = time.perf_counter()
+        table = dataset.to_table(columns=columns, filter=expression)
+        measures[read] = {'rows': table.num_rows, 'bytes': table.nbytes, 'seconds': time.perf_counter() - start}
+    measures['saved_rows'] = measures['unfiltered']['rows'] - measures['filtered']['rows']
+    measures['saved_bytes'] = measures['unfiltered']['bytes'] - measures['filtered']['bytes']
+    return measures
+
+
+def export_predicates(analysis, parquet_path=None):
+    """Push down predicates of the filters found by an analysis: the 'filter_plan' if 'plan_filters' was run,
+    otherwise the 'best_filter'. With a 'parquet_path' the saving of the predicates is measured reading that Parquet
+    copy of the input, written from the 'input_df' if the file does not exist or is older than the input file. If the
+    copy can not be written (the input is streamed in chunks) the measure is skipped.
+
+    :param analysis: (SingleColumnFilters) an analysed object, with its DFs if the copy has to be written
+    :param parquet_path: (str) path of a local Parquet copy of the input
+    :return: (dict) the 'filters' with their 'sql' fragment and 'dataset' expression, the combined 'sql_where' and
+        'dataset_filter', the 'claimed_rows' the analysis expects to save and the 'measure' of 'measure_read', empty
+        if the analysis found no filter
+    """
+    if getattr(analysis, 'best_filter', None) is None:
+        return dict()
+    if analysis.filter_plan:
+        filters = [step['filter'] for step in analysis.filter_plan]
+        claimed_rows = analysis.filter_plan[-1]['cumulative_rows']
+    else:
+        filters = [analysis.best_filter]
+        claimed_rows = analysis.best_filter[3]
+    predicates = {
+        'filters': [{'filter': filter_, 'sql': to_sql(filter_)} for filter_ in filters],
+        'sql_where': to_sql_where(filters),
+        'claimed_rows': claimed_rows,
+        'measure': None
+    }
+    try:
+        for exported_filter in predicates['filters']:
+            exported_filter['dataset'] = str(to_dataset_expression(exported_filter['filter']))
+        predicates['dataset_filter'] = str(to_dataset_filter(filters))
+    except ImportError:
+        return predicates
+    if parquet_path:
+        if _is_stale(parquet_path, getattr(analysis, 'input_file_name', None)):
+            try:
+                live_input_df = analysis._live_input_df()
+            except ValueError as e:
+                logging.warning("Not measuring the predicates, the Parquet copy {} can not be written: {}".format(
+                    parquet_path, e))
+                return predicates
+            write_parquet_copy(live_input_df, parquet_path)
+        predicates['measure'] = measure_read(parquet_path, filters)
+    return predicates
@@ -0,0 +1,106 @@
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+
+from .column_profile import ColumnProfile
+
+CACHE_DIR = os.path.join(tempfile.gettempdir(), 'pandas_report_tracer_profiles')
+MAX_CACHE_BYTES = 2 ** 30
+
+
+class ProfileCache:
+    """On disk cache of the per column value counts of data files (from which the distinct values, nan counts and
+    date extents are derived), one pickle per file keyed by its path, size and modification time, so any change to
+    the file invalidates its entry. The counts describe the DF as loaded by the 'loading' functions, with the date
+    columns already parsed. Once the directory holds more than 'max_bytes' the least recently used entries are
+    deleted. With 'cache_dir' None the cache is disabled, the profiles are just not seeded nor stored.
+
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def fingerprint(path):
+        """Key of the current version of the file 'path'.
+
+        :param path: (str) path of the data file
+        :return: (str) sha1 of the absolute path, size and modification time of the file
+        """
+        stat = os.stat(path)
+        key = '{}|{}|{}'.format(os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def _entry_path(self, fingerprint):
+        return os.path.join(self.cache_dir, '{}.pkl'.format(fingerprint))
+
+    def _read_entry(self, fingerprint):
+        entry_path = self._entry_path(fingerprint)
+        try:
+            with open(entry_path, 'rb') as entry:
+                value_counts = pickle.load(entry)
+        except FileNotFoundError:
+            return dict()
+        except (EOFError, pickle.UnpicklingError, AttributeError, ImportError) as e:
+            logging.warning("Ignoring the unreadable profile cache entry {}: {}".format(entry_path, e))
+            return dict()
+        # the modification time of the entry is its last use, for the eviction
+        os.utime(entry_path)
+        return value_counts
+
+    def load_profile(self, path, df):
+        """ColumnProfile of 'df', the DF loaded from 'path', with the value counts cached for the current version of
+        the file already in place, so those columns are not scanned again.
+
+        :param path: (str) path of the data file 'df' was loaded from
+        :param df: (DataFrame) the loaded DF
+        :return: (ColumnProfile) to pass to the analysis and then to 'store_profile'
+        """
+        profile = ColumnProfile(df)
+        if self.cache_dir is None:
+            return profile
+        profile.cache_key = self.fingerprint(path)
+        value_counts = self._read_entry(profile.cache_key)
+        profile.seed({col: counts for col, counts in value_counts.items() if col in df.columns})
+        logging.info("Profile cache: {} of {} columns of {} found".format(
+            len(profile.cached_value_counts()), len(df.columns), path))
+        return profile
+
+    def store_profile(self, profile):
+        """Saves the value counts of 'profile', a profile returned by 'load_profile', under the version of the file it
+        was loaded from, even if the file has changed since.
+
+        :param profile: (ColumnProfile)
+        """
+        if self.cache_dir is None:
+            return
+        value_counts = self._read_entry(profile.cache_key)
+        value_counts.update(profile.cached_value_counts())
+        entry_path = self._entry_path(profile.cache_key)
+        tmp_entry_path = '{}.{}.tmp'.format(entry_path, os.getpid())
+        with open(tmp_entry_path, 'wb') as entry:
+            pickle.dump(value_counts, entry, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_entry_path, entry_path)
+        self.evict()
+
+    def evict(self):
+        """Deletes the least recently used entries until the cache holds at most 'max_bytes'."""
+        entries = list()
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith('.pkl'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        cache_bytes = sum(size for _, size, _ in entries)
+        for _, size, entry_path in sorted(entries):
+            if cache_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(entry_path)
+            except FileNotFoundError:
+                pass
+            cache_bytes -= size
@@ -1,36 +1,124 @@
 import datetime
+import functools
+import json
+import os
+import uuid
 
 import jinja2
-from plotly.offline import plot
+from plotly.offline import get_plotlyjs
+from plotly.utils import PlotlyJSONEncoder
 import plotly.graph_objs as go
 
+COMBINED_TEMPLATE_FILE = "combined_inputs_to_final.html"
+# written once to the directory of the reports, they all load it instead of embedding its several MB
+PLOTLY_ASSET_FILE = "plotly.min.js"
+PLOT_HTML = '<div id="{id}" class="plotly-graph-div"></div><script>Plotly.newPlot("{id}", {data}, {layout});</script>'
+REPORT_DIR = "/tmp"
 TEMPLATE_FILE = "input_to_final.html"
 
 
-def print_report(obj, input_file, result_file, data_usage_plot):
+@functools.lru_cache(maxsize=None)
+def _template_env():
+    # the environment keeps the templates compiled, so they are parsed once per process
     template_loader = jinja2.FileSystemLoader(searchpath="./report_templates/")
-    template_env = jinja2.Environment(loader=template_loader)
-    template = template_env.get_template(TEMPLATE_FILE)
+    return jinja2.Environment(loader=template_loader)
 
+
+def _get_template(template_file):
+    return _template_env().get_template(template_file)
+
+
+def write_plotly_asset(output_dir=REPORT_DIR):
+    """Writes the plotly.js bundle the reports load to 'output_dir', unless it is already there.
+
+    :param output_dir: (str) directory of the reports
+    :return: (str) the path of the bundle
+    """
+    asset_path = os.path.join(output_dir, PLOTLY_ASSET_FILE)
+    if not os.path.exists(asset_path):
+        tmp_path = '{}.{}.tmp'.format(asset_path, os.getpid())
+        with open(tmp_path, 'w', encoding='utf-8') as asset_file:
+            asset_file.write(get_plotlyjs())
+        # atomic, so a report written at the same time by another process never loads half a bundle
+        os.replace(tmp_path, asset_path)
+    return asset_path
+
+
+def _write_report(output_text, file_prefix, output_dir):
+    write_plotly_asset(output_dir)
+    now = datetime.datetime.now()
+    report_path = os.path.join(output_dir, '{}_{}.html'.format(file_prefix, now.strftime("%d%m%Y_%H-%M-%S-%f")))
+    with open(report_path, 'w', encoding='utf-8') as html_file:
+        html_file.write(output_text)
+    return report_path
+
+
+def _analysis_context(obj, data_usage_plot):
+    """Template variables describing the analysis of one input.
+
+    :param obj: (object) of the class SingleColumnFilters
+    :param data_usage_plot: (str) html plot generated by 'generate_data_usage_plot'
+    :return: (dict)
+    """
+    combos_to_exclude = getattr(obj, 'combos_to_exclude', None)
+    instrumentation = getattr(obj, 'instrumentation', None)
+    return {
+        'best_filter': getattr(obj, 'best_filter', None),
+        'merging_cols': obj.merging_cols,
+        'matching_id_columns': obj.matching_id_cols,
+        'overall_percentage': obj.overall_percentage,
+        'data_usage_plot': data_usage_plot,
+        'filtering_quick_gains': obj.filtering_quick_gains,
+        'filter_plan': getattr(obj, 'filter_plan', list()),
+        'unused_category_rankings': getattr(obj, 'unused_category_rankings', dict()),
+        'predicates': getattr(obj, 'predicates', dict()),
+        'multi_columns_filter_df': combos_to_exclude.to_html() if combos_to_exclude is not None else '',
+        'stage_stats': instrumentation.stage_records() if instrumentation is not None else list(),
+        'slowest_columns': instrumentation.slowest_columns() if instrumentation is not None else list()
+    }
+
+
+def print_report(obj, input_file, result_file, data_usage_plot, output_dir=REPORT_DIR):
+    """Writes the report of the analysis of one input to 'output_dir'.
+
+    :param obj: (object) of the class SingleColumnFilters
+    :param input_file: (str) path of the input
+    :param result_file: (str) path of the result
+    :param data_usage_plot: (str) html plot generated by 'generate_data_usage_plot'
+    :param output_dir: (str) directory of the reports, the plotly.js bundle is written there the first time
+    :return: (str) the path of the report
+    """
+    template = _get_template(TEMPLATE_FILE)
     output_text = template.render(
-        best_filter=obj.best_filter,
         input_files=[input_file],
-        merging_cols=obj.merging_cols,
-        matching_id_columns=obj.matching_id_cols,
-        overall_percentage=obj.overall_percentage,
-        data_usage_plot=data_usage_plot,
-        filtering_quick_gains=obj.filtering_quick_gains,
-        multi_columns_filter_df=obj.combos_to_exclude.to_html(),
-        result_file=result_file
+        result_file=result_file,
+        **_analysis_context(obj, data_usage_plot)
     )
-    now = datetime.datetime.now()
-    html_file = open('/tmp/report_results_{}.html'.format(now.strftime("%d%m%Y_%H-%M-%S")), 'w')
-    html_file.write(output_text)
-    html_file.close()
+    return _write_report(output_text, 'report_results', output_dir)
+
+
+def print_combined_report(objs, input_files, result_file, output_dir=REPORT_DIR):
+    """Writes a single report with the analysis of several inputs against the same result.
+
+    :param objs: (list) objects of the class SingleColumnFilters
+    :param input_files: (list) paths of the inputs, in the same order as 'objs'
+    :param result_file: (str) path of the result
+    :param output_dir: (str) directory of the reports, the plotly.js bundle is written there the first time
+    :return: (str) the path of the report
+    """
+    template = _get_template(COMBINED_TEMPLATE_FILE)
+    analyses = list()
+    for obj, input_file in zip(objs, input_files):
+        analysis = _analysis_context(obj, generate_data_usage_plot(obj))
+        analysis['input_file'] = input_file
+        analyses.append(analysis)
+    output_text = template.render(analyses=analyses, result_file=result_file)
+    return _write_report(output_text, 'combined_report_results', output_dir)
 
 
 def generate_data_usage_plot(obj):
-    """Generates a plotly horizontal bar char on the axis 'x' and 'y'
+    """Generates a plotly horizontal bar char on the axis 'x' and 'y', only its data as compact JSON, the plotly.js
+    bundle is loaded by the report from the file written by 'write_plotly_asset'.
 
     :param obj: (object) of the class SingleColumnFilters
     :return: html plot
@@ -39,5 +127,8 @@ def generate_data_usage_plot(obj):
         x=list(obj.usage_percentage.values()),
         y=list(obj.usage_percentage.keys()),
         orientation='h'
-    )]
-    return plot(usage_data, auto_open=False, output_type='div')
+    ).to_plotly_json()]
+    return PLOT_HTML.format(
+        id=uuid.uuid4(), data=json.dumps(usage_data, cls=PlotlyJSONEncoder, separators=(',', ':')),
+        layout=json.dumps({'yaxis': {'automargin': True}}, separators=(',', ':'))
+    )
@@ -0,0 +1,109 @@
+import threading
+
+import pandas as pd
+
+from .column_profile import ColumnProfile
+
+
+def key_index(df, keys):
+    """Distinct values of the 'keys' columns of 'df', an Index for one key and a MultiIndex for several. Its hash
+    table is built the first time it is searched and kept with it, so every later search costs the size of the
+    searched keys only.
+
+    :param df: (DataFrame)
+    :param keys: (list) the names of the key columns
+    :return: (pandas index)
+    """
+    if len(keys) == 1:
+        return pd.Index(df[keys[0]]).unique()
+    return pd.MultiIndex.from_frame(df[keys]).unique()
+
+
+def rows_with_keys(df, keys, index):
+    """Which rows of 'df' have their 'keys' in 'index', nans match nans as in a merge.
+
+    :param df: (DataFrame)
+    :param keys: (list) the names of the key columns
+    :param index: (pandas index) returned by 'key_index'
+    :return: (numpy array) boolean
+    """
+    values = df[keys[0]] if len(keys) == 1 else pd.MultiIndex.from_frame(df[keys])
+    return index.get_indexer(values) >= 0
+
+
+class ResultIndex:
+    """The facts of a 'resulting_df' every analysis of an input against it needs, computed once: the ColumnProfile
+    of its columns (distinct values or a BloomFilter for the high cardinality ones, sorted dates) and the hashed
+    'key_index' of each set of merge keys. Any number of analyses can be run against it, also from several threads,
+    'prepare' computes up front every fact they read.
+
+    """
+
+    def __init__(self, resulting_df, profile=None):
+        self.resulting_df = resulting_df
+        self.profile = profile if profile is not None else ColumnProfile(resulting_df)
+        self._key_counts = dict()
+        self._key_indexes = dict()
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # the analyses run in other processes are pickled back with their index
+        state = dict(self.__dict__)
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def prepare(self, cols=None):
+        """Profiles the columns 'cols' of the result, all of them by default.
+
+        :param cols: (list) the names of the columns
+        :return: (ResultIndex) the index itself
+        """
+        for col in cols if cols is not None else self.resulting_df.columns:
+            self.profile.prepare(col)
+        return self
+
+    def key_index(self, keys):
+        """The 'key_index' of the result for the 'keys' columns, built the first time it is asked for.
+
+        :param keys: (list) the names of the key columns
+        :return: (pandas index)
+        """
+        with self._lock:
+            if tuple(keys) not in self._key_indexes:
+                index = key_index(self.resulting_df, keys)
+                # searched once so its hash table is built before any thread searches it
+                index.get_indexer(index[:1])
+                self._key_indexes[tuple(keys)] = index
+            return self._key_indexes[tuple(keys)]
+
+    def key_counts(self, keys):
+        """Number of rows of the result for each value of the 'keys' columns, computed the first time it is asked
+        for.
+
+        :param keys: (list) the names of the key columns
+        :return: (pandas series) counts indexed by the distinct keys
+        """
+        with self._lock:
+            if tuple(keys) not in self._key_counts:
+                self._key_counts[tuple(keys)] = self.resulting_df.groupby(keys, sort=False, dropna=False).size()
+            return self._key_counts[tuple(keys)]
+
+    def analysis(self, input_df, merging_cols=None, analysis_class=None, **kwargs):
+        """An analysis of 'input_df' against the result that reuses this index.
+
+        :param input_df: (DataFrame) the input
+        :param merging_cols: (list) columns to merge the input to the result, None to use the matching id columns
+        :param analysis_class: (class) SingleColumnFilters or one of its subclasses, SingleColumnFilters by default
+        :param kwargs: extra arguments for the analysis
+        :return: (SingleColumnFilters) the analysis, not run yet
+        """
+        if analysis_class is None:
+            from .columns_to_work_with import SingleColumnFilters
+            analysis_class = SingleColumnFilters
+        return analysis_class(
+            input_df, self.resulting_df, merging_cols, result_profile=self.profile, result_index=self, **kwargs
+        )
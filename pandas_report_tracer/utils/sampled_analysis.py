@@ -0,0 +1,152 @@
+import logging
+import math
+import statistics
+
+import pandas as pd
+from pandas.api.types import is_datetime64_any_dtype
+
+from .column_profile import ColumnProfile
+from .columns_to_work_with import NATURAL_DIVIDER_THRESOLD, SingleColumnFilters
+
+CONFIDENCE = 0.95
+CONFIRM_TOP = 3
+SAMPLE_SIZE = 100000
+
+
+def estimate_rows(sample_rows, sample_size, population_size, confidence=CONFIDENCE):
+    """Extrapolates the number of rows of a population matching a condition from the rows of a simple random sample
+    (without replacement) matching it, with a normal approximation confidence interval including the finite
+    population correction, so a sample as large as the population gives the exact count.
+
+    :param sample_rows: (int) rows of the sample matching the condition
+    :param sample_size: (int) rows of the sample
+    :param population_size: (int) rows of the population
+    :param confidence: (float) confidence level of the interval
+    :return: (tuple) estimate, (lower bound, upper bound)
+    """
+    proportion = sample_rows / sample_size
+    finite_population_correction = (population_size - sample_size) / max(population_size - 1, 1)
+    standard_error = math.sqrt(proportion * (1 - proportion) / sample_size * finite_population_correction)
+    z = statistics.NormalDist().inv_cdf((1 + confidence) / 2)
+    lower_bound = max(proportion - z * standard_error, 0) * population_size
+    upper_bound = min(proportion + z * standard_error, 1) * population_size
+    return proportion * population_size, (lower_bound, upper_bound)
+
+
+class SampledSingleColumnFilters(SingleColumnFilters):
+    """Fast estimate mode of SingleColumnFilters for very large inputs: the whole input is merged to the result, so
+    the 'final_df' side (the values and keys that make it to the result) is exact, but the input side is profiled on
+    a random sample of 'sample_size' rows. The 'useless_rows' and 'weighted_benefit' of the findings are extrapolated
+    to the whole input, with confidence intervals, and the findings of the 'confirm_top' columns with the largest
+    estimated benefit are then replaced by exact ones, counting only those columns of the whole input. The column of
+    the 'best_filter' is always confirmed, so the best filter and the filter applied are exact.
+
+    """
+
+    def __init__(self, input_df, resulting_df, merging_cols=None, sample_size=SAMPLE_SIZE, confidence=CONFIDENCE,
+                 confirm_top=CONFIRM_TOP, random_state=None, **kwargs):
+        super().__init__(input_df, resulting_df, merging_cols, **kwargs)
+        self.confidence = confidence
+        self.confirm_top = confirm_top
+        self.confirmed_cols = list()
+        self.random_state = random_state
+        self.sample_size = sample_size
+        self.population_rows = len(input_df)
+        self._population_df = input_df
+        self._population_profile = self.input_profile
+
+    def _set_final_df_to_work_with(self):
+        super()._set_final_df_to_work_with()
+        # the final side comes from the merge of the whole input, only the input side is sampled
+        self._population_df = self.input_df
+        self._population_profile = self.input_profile
+        if self.sample_size < len(self.input_df):
+            self.input_df = self.input_df.sample(n=self.sample_size, random_state=self.random_state)
+            self.input_profile = ColumnProfile(self.input_df)
+        logging.info("Estimating from a sample of {} of {} rows".format(len(self.input_df), self.population_rows))
+
+    def _column_usage_percentage(self, col):
+        try:
+            return super()._column_usage_percentage(col)
+        except ValueError:
+            # the whole input was merged, the sample may just have none of the few keys found in the result
+            return 0
+
+    def _is_natural_divider(self, col):
+        """As in SingleColumnFilters but with the rows of the whole input, the sample has about as many distinct
+        values of a natural divider column as the whole input but far less rows.
+
+        :param col: (str) the name of the column in the 'input_df'
+        :return: Boolean
+        """
+        unique_rows = self.input_profile.n_unique(col)
+        if unique_rows == 1:
+            return
+        if self.population_rows / unique_rows > NATURAL_DIVIDER_THRESOLD and self.usage_percentage[col] != 1:
+            return 1
+
+    def _determine_best_slicing_col_filter(self):
+        sample_rows = self.input_profile.n_rows
+        self.filtering_quick_gains = [self._extrapolate_finding(finding, sample_rows)
+                                      for finding in self.filtering_quick_gains]
+        # the rankings of the sample rows are dropped, the confirmed columns are ranked again on the whole input
+        self.unused_category_rankings = dict()
+        # from now on the input side is the whole input, its profile only scans the columns confirmed
+        self.input_df = self._population_df
+        self.input_profile = self._population_profile
+        self._confirm_findings(self._top_cols())
+        super()._determine_best_slicing_col_filter()
+        while self.best_filter[0] not in self.confirmed_cols:
+            self._confirm_findings([self.best_filter[0]])
+            super()._determine_best_slicing_col_filter()
+
+    def _extrapolate_finding(self, finding, sample_rows):
+        """The 'finding' of the sample scaled to the whole input, with the confidence intervals of its
+        'useless_rows' and 'weighted_benefit'.
+
+        :param finding: (dict) a finding of the sample, as in 'filtering_quick_gains'
+        :param sample_rows: (int) rows of the sample
+        :return: (dict) the extrapolated finding
+        """
+        useless_rows, useless_rows_interval = estimate_rows(
+            finding['useless_rows'], sample_rows, self.population_rows, self.confidence
+        )
+        benefit_per_row = finding['weighted_benefit'] / finding['useless_rows'] if finding['useless_rows'] else 0
+        return dict(
+            finding,
+            useless_rows=int(round(useless_rows)),
+            useless_rows_interval=useless_rows_interval,
+            weighted_benefit=useless_rows * benefit_per_row,
+            weighted_benefit_interval=tuple(bound * benefit_per_row for bound in useless_rows_interval),
+            estimated=True
+        )
+
+    def _top_cols(self):
+        """The 'confirm_top' columns with the largest estimated 'weighted_benefit'.
+
+        :return: (list)
+        """
+        ranked = sorted(self.filtering_quick_gains, key=lambda finding: finding['weighted_benefit'], reverse=True)
+        top_cols = list()
+        for finding in ranked:
+            if finding['column'] not in top_cols and len(top_cols) < self.confirm_top:
+                top_cols.append(finding['column'])
+        return top_cols
+
+    def _confirm_findings(self, cols):
+        """Replaces the estimated findings of the columns 'cols' with the exact findings of the whole input.
+
+        :param cols: (list) the names of the columns
+        """
+        for col in cols:
+            if self.natural_dividers_dtypes[col] == 'date' and not is_datetime64_any_dtype(self.input_df[col]):
+                self.input_df = self.input_df.copy(deep=False)
+                self.input_df[col] = pd.to_datetime(self.input_df[col])
+                self.input_profile.df = self.input_df
+                self.input_profile.invalidate(col)
+        findings = [finding for finding in self.filtering_quick_gains if finding['column'] not in cols]
+        for col in cols:
+            findings.extend(dict(finding, estimated=False) for finding in self._determine_slicing_col_filters(col))
+        self.filtering_quick_gains = findings
+        self.confirmed_cols.extend(cols)
+        logging.info("Confirmed with exact counts the findings of: {}".format(cols))
@@ -0,0 +1,76 @@
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+
+def open_frame(path):
+    """Opens a Feather (Arrow IPC) file written by 'ScratchStore.spill' memory-mapped: its numeric and date columns
+    without nans are read-only views of the mapped file, so their pages are shared by every process that opens it and
+    the OS can drop them instead of swapping, the rest of the columns are converted to pandas. The missing values of
+    the string columns are nans, as when the DF is read from a csv.
+
+    :param path: (str) path of the file
+    :return: (DataFrame)
+    """
+    import pyarrow
+    table = pyarrow.ipc.open_file(pyarrow.memory_map(path)).read_all()
+    df = table.to_pandas(split_blocks=True)
+    for col in df.columns:
+        if df[col].dtype == object and table.column(col).null_count:
+            df[col] = df[col].where(df[col].notna(), np.nan)
+    return df
+
+
+class ScratchStore:
+    """Temporary directory the frames that outlive an analysis (the result, the inputs passed between runs or to
+    worker processes) are spilled to as uncompressed Feather files, and reopened memory-mapped with 'open_frame', so
+    the resident memory does not grow with the number of runs or workers that use them. The directory is removed by
+    'close', or when the store is used as a context manager, at its exit.
+
+    """
+
+    def __init__(self, directory=None):
+        self.directory = tempfile.mkdtemp(prefix='pandas_report_tracer_', dir=directory)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def path(self, name):
+        return os.path.join(self.directory, '{}.arrow'.format(name))
+
+    def spill(self, name, df):
+        """Writes 'df' to the store under 'name', replacing the frame spilled before with that name.
+
+        :param name: (str) name of the frame
+        :param df: (DataFrame) its index is not kept
+        :return: (str) the path of the file, for 'open_frame'
+        """
+        import pyarrow.feather
+        pyarrow.feather.write_feather(df.reset_index(drop=True), self.path(name), compression='uncompressed')
+        return self.path(name)
+
+    def open(self, name):
+        """The frame spilled under 'name', memory-mapped.
+
+        :param name: (str) name of the frame
+        :return: (DataFrame)
+        """
+        return open_frame(self.path(name))
+
+    def spill_and_open(self, name, df):
+        """Spills 'df' and reopens it memory-mapped, the caller drops 'df' for the returned frame.
+
+        :param name: (str) name of the frame
+        :param df: (DataFrame)
+        :return: (DataFrame)
+        """
+        return open_frame(self.spill(name, df))
+
+    def close(self):
+        # the frames already opened stay valid, the mapped files are only unlinked
+        shutil.rmtree(self.directory, ignore_errors=True)
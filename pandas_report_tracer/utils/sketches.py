@@ -0,0 +1,146 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+FALSE_POSITIVE_RATE = 0.01
+HASH_BLOCK_ROWS = 2 ** 20
+# +- standard errors of the bounds of a sketch estimate, the raw HyperLogLog estimate also has a small bias in the
+# transition from linear counting
+BOUND_STANDARD_ERRORS = 4
+MAX_PRECISION = 18
+MIN_PRECISION = 4
+RELATIVE_ERROR = 0.01
+# odd 64 bit constant, remixes a hash into the step of the double hashing of the BloomFilter
+STEP_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+
+def hash_series(series):
+    """64 bit hashes of the values of 'series', nans included, in blocks of 'HASH_BLOCK_ROWS' so the memory needed
+    does not depend on the length of the series.
+
+    :param series: (pandas series)
+    :return: (generator) numpy arrays of uint64
+    """
+    for start in range(0, len(series), HASH_BLOCK_ROWS):
+        yield pd.util.hash_pandas_object(series.iloc[start:start + HASH_BLOCK_ROWS], index=False).values
+
+
+class HyperLogLog:
+    """HyperLogLog sketch of the number of distinct values: 2 ** 'precision' one byte registers, whatever the
+    number of values added, and a relative standard error of 1.04 / sqrt(2 ** 'precision').
+
+    """
+
+    def __init__(self, precision=14):
+        if not MIN_PRECISION <= precision <= MAX_PRECISION:
+            raise ValueError("precision must be between {} and {}".format(MIN_PRECISION, MAX_PRECISION))
+        self.precision = precision
+        self.registers = np.zeros(2 ** precision, dtype=np.uint8)
+
+    @classmethod
+    def for_error(cls, relative_error=RELATIVE_ERROR):
+        """Sketch with the lowest precision whose relative standard error is at most 'relative_error'.
+
+        :param relative_error: (float)
+        :return: (HyperLogLog)
+        """
+        precision = math.ceil(math.log2((1.04 / relative_error) ** 2))
+        return cls(min(max(precision, MIN_PRECISION), MAX_PRECISION))
+
+    @property
+    def relative_error(self):
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def add_hashes(self, hashes):
+        """Adds 64 bit hashes: the first 'precision' bits choose the register, which keeps the maximum position of
+        the first set bit of the remaining bits.
+
+        :param hashes: (numpy array) uint64
+        """
+        remaining_bits = 64 - self.precision
+        registers = (hashes >> np.uint64(remaining_bits)).astype(np.intp)
+        remaining = hashes & np.uint64(2 ** remaining_bits - 1)
+        # frexp gives the bit length of the remaining bits, 0 for 0
+        ranks = remaining_bits - np.frexp(remaining.astype(np.float64))[1] + 1
+        np.maximum.at(self.registers, registers, ranks.astype(np.uint8))
+
+    def add_series(self, series):
+        for hashes in hash_series(series):
+            self.add_hashes(hashes)
+
+    def count(self):
+        """Estimate of the number of distinct values added, with linear counting for small cardinalities.
+
+        :return: (float)
+        """
+        m = len(self.registers)
+        estimate = 0.7213 / (1 + 1.079 / m) * m ** 2 / np.exp2(-self.registers.astype(np.float64)).sum()
+        empty_registers = int((self.registers == 0).sum())
+        if estimate <= 2.5 * m and empty_registers:
+            return m * math.log(m / empty_registers)
+        return float(estimate)
+
+    def bounds(self):
+        """Range of the number of distinct values, +- 'BOUND_STANDARD_ERRORS' standard errors of the estimate.
+
+        :return: (tuple) lower bound, upper bound
+        """
+        estimate = self.count()
+        margin = BOUND_STANDARD_ERRORS * self.relative_error * estimate
+        return max(estimate - margin, 0), estimate + margin
+
+
+class BloomFilter:
+    """Set membership of hashed values in a packed numpy bit array, about 10 bits per value for a 1% false positive
+    rate instead of the boxed values of a python set or a pandas hash table. A value that was added is always found,
+    a value that was not is found with probability 'false_positive_rate', so the positives need an exact recheck.
+    Each value sets 'n_hashes' bits, derived from its 64 bit hash with double hashing.
+
+    """
+
+    def __init__(self, n_values, false_positive_rate=FALSE_POSITIVE_RATE):
+        n_values = max(int(math.ceil(n_values)), 1)
+        self.n_bits = max(int(math.ceil(-n_values * math.log(false_positive_rate) / math.log(2) ** 2)), 8)
+        self.n_hashes = max(int(round(self.n_bits / n_values * math.log(2))), 1)
+        self.bits = np.zeros((self.n_bits + 7) // 8, dtype=np.uint8)
+
+    def _positions(self, hashes):
+        """The bit positions of each hash, one array per hash function.
+
+        :param hashes: (numpy array) uint64
+        :return: (generator) numpy arrays of intp
+        """
+        n_bits = np.uint64(self.n_bits)
+        position = hashes % n_bits
+        step = ((hashes * STEP_MULTIPLIER) >> np.uint64(32)) % n_bits | np.uint64(1)
+        for _ in range(self.n_hashes):
+            yield position.astype(np.intp)
+            position = (position + step) % n_bits
+
+    def add_hashes(self, hashes):
+        for position in self._positions(hashes):
+            np.bitwise_or.at(self.bits, position >> 3, np.left_shift(1, position & 7).astype(np.uint8))
+
+    def add_series(self, series):
+        for hashes in hash_series(series):
+            self.add_hashes(hashes)
+
+    def contains_hashes(self, hashes):
+        """Vectorized membership test.
+
+        :param hashes: (numpy array) uint64
+        :return: (numpy array) boolean, False for the values certainly not added
+        """
+        found = np.ones(len(hashes), dtype=bool)
+        for position in self._positions(hashes):
+            found &= (self.bits[position >> 3] >> (position & 7) & 1).astype(bool)
+        return found
+
+    def contains_series(self, series):
+        """Membership test of the values of 'series', in blocks so it also works chunk by chunk on a streamed input.
+
+        :param series: (pandas series)
+        :return: (numpy array) boolean
+        """
+        return np.concatenate([self.contains_hashes(hashes) for hashes in hash_series(series)] or [np.array([], bool)])
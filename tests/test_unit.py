@@ -1,11 +1,39 @@
+import concurrent.futures
+import datetime
+import json
+
 import numpy as np
 import pandas as pd
 import os
+import subprocess
+import sys
+import tempfile
 import unittest
 
-from pandas.util.testing import assert_frame_equal
+from pandas.testing import assert_frame_equal
 
-from pandas_report_tracer.utils.columns_to_work_with import SingleColumnFilters, isin_row
+from benchmarks.run_benchmarks import compare_with_baseline, run_benchmarks
+from benchmarks.synthetic import make_frames
+from pandas_report_tracer.cli import command_argv, main as cli_main
+from pandas_report_tracer.utils.chunked_analysis import ChunkedColumnProfile, ChunkedSingleColumnFilters
+from pandas_report_tracer.utils.column_profile import ColumnProfile
+from pandas_report_tracer.utils.columns_to_work_with import (
+    DATE_WINDOW_FILTER, MultiColumnFilters, SingleColumnFilters, isin_row
+)
+from pandas_report_tracer.utils.filter_plan import greedy_filter_plan, pack_rows
+from pandas_report_tracer.utils.incremental_analysis import IncrementalSingleColumnFilters
+from pandas_report_tracer.utils.instrumentation import Instrumentation
+from pandas_report_tracer.utils.loading import columns_to_load, load_frame, load_input, shared_dtypes
+from pandas_report_tracer.utils.parallel_analysis import analyze_inputs_in_parallel
+from pandas_report_tracer.utils.predicates import export_predicates, to_dataset_expression, to_sql, to_sql_where
+from pandas_report_tracer.utils.profile_cache import ProfileCache
+from pandas_report_tracer.utils.report_generation import (
+    PLOTLY_ASSET_FILE, generate_data_usage_plot, print_combined_report, print_report
+)
+from pandas_report_tracer.utils.result_index import ResultIndex, key_index, rows_with_keys
+from pandas_report_tracer.utils.sampled_analysis import SampledSingleColumnFilters, estimate_rows
+from pandas_report_tracer.utils.scratch_store import ScratchStore
+from pandas_report_tracer.utils.sketches import BloomFilter, HyperLogLog
 
 HERE = os.path.dirname(os.path.abspath(__file__))
 
@@ -49,6 +77,38 @@ class TestSingleColumnFilters(unittest.TestCase):
         assert set(instance.matching_cols) == {'id1', 'column3', 'column1'}
         assert instance.matching_id_cols == ['id1']
 
+    def test_determine_date_range_filters_w_date_slices(self):
+        input_df = pd.DataFrame({
+            'index': list(range(100)),
+            'ship_date': ['2019-01-15'] * 50 + ['2019-03-15'] * 50,
+        })
+        date_slices = {'before_march': datetime.date(2019, 3, 1), 'before_feb': datetime.date(2019, 2, 1)}
+        instance = SingleColumnFilters(input_df, input_df.iloc[50:].copy(), ['index'], date_slices=date_slices)
+        instance.make_analysis()
+        assert instance.filtering_quick_gains == [{
+            'column': 'ship_date',
+            'dtype': 'date',
+            'filter_out': ('before_march', datetime.date(2019, 3, 1)),
+            'useless_rows': 50,
+            'weighted_benefit': 50
+        }]
+
+    def test_determine_date_window_filters(self):
+        input_df = pd.DataFrame({
+            'index': list(range(100)),
+            'ship_date': ['2019-01-15'] * 40 + ['2019-02-10'] * 20 + ['2019-02-20'] * 20 + ['2019-03-15'] * 20,
+        })
+        resulting_df = input_df.iloc[40:60].copy()
+        instance = SingleColumnFilters(input_df.copy(), resulting_df, ['index'], date_window='exact')
+        instance.make_analysis()
+        assert instance.best_filter[1] == ('outside_final_window', (pd.Timestamp('2019-02-10'), pd.Timestamp('2019-02-10')))
+        assert instance.best_filter[3] == 80
+        instance = SingleColumnFilters(input_df.copy(), resulting_df, ['index'], date_window='month')
+        instance.make_analysis()
+        assert instance.best_filter[1][1][0] == pd.Timestamp('2019-02-01')
+        assert instance.best_filter[3] == 60
+        assert len(instance._apply_best_filter(instance.input_df)) == 40
+
     def test_merge_input_to_final(self):
         instance = SingleColumnFilters(self.input_df, self.resulting_df)
         instance.find_matching_cols()
@@ -75,6 +135,31 @@ class TestSingleColumnFilters(unittest.TestCase):
         })
         assert df_equal_without_column_order(instance2.extended_resulting_df, expected_df)
 
+    def test_merge_drops_repeated_input_rows_and_warns_of_fanout(self):
+        input_df = pd.DataFrame({'id': [1, 1, 1, 2, 3] * 20, 'unit': ['KG', 'KG', 'LB', 'T', 'T'] * 20})
+        resulting_df = pd.DataFrame({'id': [1, 2], 'value': [10, 20]})
+        instance = SingleColumnFilters(input_df, resulting_df, merging_cols=['id'])
+        instance.find_matching_cols()
+        instance._merge_input_to_final()
+        assert 3 == len(instance.extended_resulting_df)
+        assert {'KG', 'LB', 'T'} == set(instance.extended_resulting_df['unit'])
+        instance = SingleColumnFilters(pd.DataFrame({'id': [1] * 30, 'unit': range(30)}), resulting_df, ['id'])
+        instance.find_matching_cols()
+        with self.assertLogs(level='WARNING') as logs:
+            instance._merge_input_to_final()
+        assert any('repeats every result row 15.5 times' in line for line in logs.output)
+
+    def test_merge_falls_back_on_keys_of_different_dtypes(self):
+        input_df = pd.DataFrame({'id': [str(i) for i in range(1000)], 'grade': ['a', 'b', 'c', 'd'] * 250})
+        resulting_df = pd.DataFrame({'id': range(750), 'grade': ['a', 'b', 'c'] * 250})
+        instance = SingleColumnFilters(input_df, resulting_df)
+        with self.assertLogs(level='WARNING'):
+            instance.make_analysis()
+        assert instance.extended_resulting_df.empty
+        assert list(instance.final_df.columns) == ['id', 'grade']
+        assert 0.75 == instance.usage_percentage['grade']
+        assert ('grade', 'd', 'string', 250, 0.25) == instance.best_filter
+
     def test_columns_usage_percentage(self):
         instance = SingleColumnFilters(self.input_df, self.resulting_df, merging_cols=['id2'])
         instance.find_matching_cols()
@@ -95,3 +180,813 @@ class TestSingleColumnFilters(unittest.TestCase):
         row_2 = rows.iloc[[1]]
         assert isin_row(row_1, self.input_df)
         assert not isin_row(row_2, self.input_df)
+
+
+class TestMultiColumnFilters(unittest.TestCase):
+
+    input_df = pd.DataFrame({
+        'index': list(range(240)),
+        'unit': ['KG', 'LB', 'T'] * 80,
+        'grade': ['a', 'b', 'c', 'd'] * 60,
+    })
+    resulting_df = input_df.loc[(input_df['unit'] != 'T') & (input_df['grade'] != 'd'), ['index']]
+
+    def test_determine_multi_column_filters(self):
+        instance = MultiColumnFilters(self.input_df, self.resulting_df.reset_index(drop=True), merging_cols=['index'])
+        instance.get_multi_column_filters()
+        assert instance.combo_cols == ['unit', 'grade']
+        assert len(instance.combos_to_check_in_final) == 12
+        expected_df = pd.DataFrame({
+            'unit': ['KG', 'KG', 'KG', 'LB', 'LB', 'LB'],
+            'grade': ['a', 'b', 'c', 'a', 'b', 'c'],
+        })
+        result = instance.combos_to_exclude.sort_values(['unit', 'grade']).reset_index(drop=True)
+        assert df_equal_without_column_order(result, expected_df)
+
+    def test_make_analysis_categorical(self):
+        input_df = self.input_df.copy()
+        resulting_df = self.resulting_df.reset_index(drop=True)
+        resulting_df['unit'] = input_df.loc[resulting_df['index'], 'unit'].values
+        plain = SingleColumnFilters(input_df.copy(), resulting_df.copy(), ['index'])
+        plain.make_analysis()
+        encoded = SingleColumnFilters(input_df, resulting_df, ['index'], categorical=True)
+        encoded.make_analysis()
+        assert input_df['unit'].dtype == object
+        assert encoded.input_df['unit'].dtype == encoded.resulting_df['unit'].dtype == 'category'
+        assert encoded.final_df['grade'].dtype == 'category'
+        assert encoded.usage_percentage == plain.usage_percentage
+        assert encoded.natural_dividers_dtypes == plain.natural_dividers_dtypes
+        assert encoded.filtering_quick_gains == plain.filtering_quick_gains
+
+    def test_categorical_skips_high_cardinality_columns(self):
+        input_df = pd.DataFrame({
+            'index': range(20000),
+            'code': ['code{}'.format(i) for i in range(20000)],
+            'grade': ['a', 'b', 'c', 'd'] * 5000
+        })
+        instance = SingleColumnFilters(input_df, input_df.loc[input_df['grade'] != 'd', ['index']], ['index'],
+                                       categorical=True)
+        instance._encode_categorical_cols()
+        assert instance.input_df['code'].dtype == object
+        assert instance.input_df['grade'].dtype == 'category'
+        assert 'code' not in instance.input_profile.cached_value_counts()
+
+    def test_make_analysis_in_threads(self):
+        serial = SingleColumnFilters(self.input_df.copy(), self.resulting_df.reset_index(drop=True), ['index'])
+        serial.make_analysis()
+        threaded = SingleColumnFilters(self.input_df.copy(), self.resulting_df.reset_index(drop=True), ['index'])
+        threaded.make_analysis(n_jobs=4)
+        assert threaded.usage_percentage == serial.usage_percentage
+        assert threaded.filtering_quick_gains == serial.filtering_quick_gains
+        assert [finding['column'] for finding in threaded.filtering_quick_gains] == ['unit', 'grade']
+
+
+class TestIncrementalSingleColumnFilters(unittest.TestCase):
+
+    input_df = TestMultiColumnFilters.input_df
+    resulting_df = TestMultiColumnFilters.resulting_df
+
+    def test_runs_match_a_new_analysis_of_the_filtered_input(self):
+        instance = IncrementalSingleColumnFilters(self.input_df, self.resulting_df, ['index'])
+        input_df = self.input_df
+        for run_number in range(2):
+            instance.make_analysis(apply_filter=True)
+            expected = SingleColumnFilters(input_df, self.resulting_df, ['index'])
+            expected.make_analysis()
+            assert instance.best_filter == expected.best_filter
+            assert instance.filtering_quick_gains == expected.filtering_quick_gains
+            assert instance.usage_percentage == expected.usage_percentage
+            input_df = expected._apply_best_filter(input_df)
+        assert_frame_equal(input_df, instance.filtered_input_df())
+        assert [('unit', 'T'), ('grade', 'd')] == [applied_filter[:2] for applied_filter in instance.applied_filters]
+
+    def test_save_inputfile(self):
+        instance = IncrementalSingleColumnFilters(self.input_df, self.resulting_df, ['index'])
+        instance.make_analysis(apply_filter=True)
+        instance.make_analysis(apply_filter=True)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            input_file_name = os.path.join(tmp_dir, 'input.csv')
+            instance.save_inputfile(input_file_name)
+            saved_df = pd.read_csv(input_file_name)
+        assert len(saved_df) == len(self.resulting_df)
+
+    def test_date_slice_keeps_the_result_rows_on_the_cutoff(self):
+        input_df = pd.DataFrame({
+            'index': range(200),
+            'ship_date': pd.to_datetime(['2018-06-01'] * 100 + ['2019-01-01'] * 50 + ['2019-03-01'] * 50)
+        })
+        resulting_df = input_df.iloc[100:]
+        instance = IncrementalSingleColumnFilters(
+            input_df, resulting_df, ['index'], date_slices={'ytd': datetime.date(2019, 1, 1)}
+        )
+        instance.make_analysis(apply_filter=True)
+        assert_frame_equal(resulting_df, instance.filtered_input_df())
+        assert ('ship_date', ('ytd', datetime.date(2019, 1, 1))) == instance.applied_filters[0][:2]
+
+
+class TestFilterPlan(unittest.TestCase):
+
+    def test_greedy_filter_plan_counts_overlapping_rows_once(self):
+        removed_rows = np.array([
+            [1, 1, 1, 1, 0, 0, 0, 0, 0, 0],
+            [1, 1, 1, 0, 0, 0, 0, 0, 0, 0],
+            [0, 0, 0, 0, 1, 1, 0, 0, 0, 0],
+        ], dtype=bool)
+        packed_rows = np.array([pack_rows(rows) for rows in removed_rows])
+        plan = greedy_filter_plan(['a', 'b', 'c'], packed_rows, 10, max_filters=3, min_marginal_ratio=0)
+        assert ['a', 'c'] == [step['filter'] for step in plan]
+        assert [4, 2] == [step['marginal_rows'] for step in plan]
+        assert 0.6 == plan[-1]['cumulative_ratio']
+        assert ['a'] == [step['filter'] for step in greedy_filter_plan(['a', 'b', 'c'], packed_rows, 10, 1)]
+
+    def test_plan_filters(self):
+        instance = SingleColumnFilters(
+            TestMultiColumnFilters.input_df, TestMultiColumnFilters.resulting_df, ['index']
+        )
+        instance.make_analysis()
+        instance.plan_filters()
+        assert [('unit', 'T'), ('grade', 'd')] == [step['filter'][:2] for step in instance.filter_plan]
+        # 20 of the 60 grade d rows are T rows too
+        assert [80, 40] == [step['marginal_rows'] for step in instance.filter_plan]
+
+    def test_rank_unused_categories(self):
+        input_df = pd.DataFrame({'index': range(200), 'grade': ['a'] * 100 + ['b'] * 60 + ['c'] * 30 + ['d'] * 10})
+        instance = SingleColumnFilters(input_df, input_df.loc[input_df['grade'] == 'a', ['index']], ['index'])
+        instance.make_analysis()
+        assert [('b', 60, 60), ('c', 30, 90), ('d', 10, 100)] == [
+            (ranked['category'], ranked['rows'], ranked['cumulative_rows'])
+            for ranked in instance.unused_category_rankings['grade']
+        ]
+        assert 'b' == instance.find_largest_unused_catego_in_column('grade')
+        assert ('grade', ['b', 'c'], 'string', 90, 0.45) == instance.unused_categories_filter('grade', 3, 0.1)
+
+    def test_plan_an_in_list_of_unused_categories(self):
+        input_df = pd.DataFrame({'index': range(200), 'grade': ['a'] * 100 + ['b'] * 60 + ['c'] * 30 + ['d'] * 10})
+        instance = SingleColumnFilters(input_df, input_df.loc[input_df['grade'] == 'a', ['index']], ['index'])
+        instance.make_analysis()
+        instance.plan_filters(min_marginal_ratio=0.1)
+        categories_filter = ('grade', ['b', 'c'], 'string', 90, 0.45)
+        assert [categories_filter] == [step['filter'] for step in instance.filter_plan]
+        assert 110 == SingleColumnFilters._filter_mask(input_df, categories_filter).sum()
+        assert '("grade" NOT IN (\'b\', \'c\') OR "grade" IS NULL)' == to_sql(categories_filter)
+        instance.best_filter = categories_filter
+        assert ['a', 'd'] == list(instance._apply_best_filter(input_df)['grade'].unique())
+
+    def test_nan_is_filtered_out_as_a_category(self):
+        input_df = pd.DataFrame({'index': range(200), 'grade': ['a'] * 100 + [np.nan] * 60 + ['c'] * 40})
+        instance = IncrementalSingleColumnFilters(
+            input_df, input_df.loc[input_df['grade'] == 'a', ['index']], ['index']
+        )
+        instance.make_analysis(apply_filter=True)
+        assert ('grade', 60, 0.3) == (instance.best_filter[0],) + instance.best_filter[3:]
+        assert pd.isnull(instance.best_filter[1])
+        assert '"grade" IS NOT NULL' == to_sql(instance.best_filter)
+        instance.make_analysis(apply_filter=True)
+        assert ('grade', 'c') == instance.best_filter[:2]
+        assert ['a'] == list(instance.filtered_input_df()['grade'].unique())
+
+
+class TestSampledSingleColumnFilters(unittest.TestCase):
+
+    def test_estimate_rows(self):
+        assert (30, (30, 30)) == estimate_rows(30, 100, 100)
+        estimate, (lower_bound, upper_bound) = estimate_rows(30, 100, 10000)
+        assert lower_bound < estimate == 3000 < upper_bound
+        assert estimate_rows(30, 100, 10000, confidence=0.99)[1][0] < lower_bound
+
+    def test_make_analysis_confirms_the_best_filter(self):
+        expected = SingleColumnFilters(TestMultiColumnFilters.input_df, TestMultiColumnFilters.resulting_df, ['index'])
+        expected.make_analysis()
+        instance = SampledSingleColumnFilters(
+            TestMultiColumnFilters.input_df, TestMultiColumnFilters.resulting_df, ['index'], sample_size=120,
+            confirm_top=1, random_state=0
+        )
+        instance.make_analysis()
+        assert instance.best_filter == expected.best_filter
+        assert [instance.best_filter[0]] == instance.confirmed_cols
+        estimated = [finding for finding in instance.filtering_quick_gains if finding['estimated']]
+        assert 1 == len(estimated)
+        lower_bound, upper_bound = estimated[0]['useless_rows_interval']
+        assert lower_bound <= 60 <= upper_bound
+
+
+class TestColumnProfile(unittest.TestCase):
+
+    df = pd.DataFrame({
+        'column1': [3, 1, 3, np.nan, 3],
+        'column2': ['a', 'b', 'b', 'b', np.nan],
+    })
+
+    def test_value_counts_and_distinct(self):
+        profile = ColumnProfile(self.df)
+        assert profile.value_counts('column1').loc[3] == 3
+        assert set(profile.distinct('column2').dropna()) == {'a', 'b'}
+        assert profile.n_unique('column1') == 3
+        assert profile.n_rows == 5
+
+    def test_nan_count_and_extent(self):
+        profile = ColumnProfile(self.df)
+        assert profile.nan_count('column1') == 1
+        assert profile.nan_count('column2') == 1
+        assert profile.extent('column1') == (1, 3)
+        assert profile.extent('column2') == ('a', 'b')
+
+    def test_count_below(self):
+        profile = ColumnProfile(self.df)
+        assert list(profile.count_below('column1', [0, 1, 2, 3, 4])) == [0, 0, 1, 1, 4]
+
+    def test_share(self):
+        profile = ColumnProfile(self.df)
+        shared_profile = ColumnProfile(self.df.iloc[:0])
+        shared_profile.share(profile, ['column2'])
+        assert shared_profile.value_counts('column2') is profile.value_counts('column2')
+        assert 'column2' not in shared_profile.cached_value_counts()
+
+    def test_invalidate(self):
+        df = self.df.copy()
+        profile = ColumnProfile(df)
+        assert profile.n_unique('column1') == 3
+        df['column1'] = df['column1'].fillna(1)
+        assert profile.n_unique('column1') == 3
+        profile.invalidate('column1')
+        assert profile.n_unique('column1') == 2
+
+
+class TestChunkedSingleColumnFilters(unittest.TestCase):
+
+    input_df = TestSingleColumnFilters.input_df
+    resulting_df = TestSingleColumnFilters.resulting_df
+
+    def test_chunked_column_profile(self):
+        profile = ChunkedColumnProfile()
+        profile.add_chunk(pd.DataFrame({'date': ['2019-01-01', np.nan, '2019-01-02']}))
+        profile.add_chunk(pd.DataFrame({'date': ['2019-01-01', np.nan]}))
+        assert profile.n_rows == 5
+        assert profile.nan_count('date') == 2
+        assert profile.value_counts('date').loc['2019-01-01'] == 2
+        profile.invalidate('date')
+        assert profile.value_counts('date').loc[pd.Timestamp('2019-01-01')] == 2
+        assert profile.nan_count('date') == 2
+
+    def test_columns_usage_percentage_in_chunks(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            input_file_name = os.path.join(tmp_dir, 'input.csv')
+            self.input_df.to_csv(input_file_name, index=False)
+            instance = ChunkedSingleColumnFilters(input_file_name, self.resulting_df, merging_cols=['id2'], chunksize=2)
+            instance.find_matching_cols()
+            instance._merge_input_to_final()
+            instance._set_final_df_to_work_with()
+            instance.columns_usage_percentage()
+        assert len(instance.final_df) == len(self.resulting_df)
+        assert {'column1': 0.80, 'column2': 0.80, 'id1': 0.75, 'id2': 0.80} == instance.usage_percentage
+
+    def test_dtypes_drifting_between_chunks(self):
+        # 'code' is read as int in the first two chunks and as object in the last two
+        input_df = pd.DataFrame({
+            'row_id': range(400),
+            'code': [1, 2] * 100 + ['1', '2', 'x', '1'] * 50,
+            'grade': ['a', 'b', 'c', 'd'] * 100
+        })
+        resulting_df = pd.DataFrame({'row_id': [row_id for row_id in range(400) if str(input_df['code'][row_id]) == '1']})
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            input_file_name = os.path.join(tmp_dir, 'input.csv')
+            input_df.to_csv(input_file_name, index=False)
+            expected = SingleColumnFilters(pd.read_csv(input_file_name), resulting_df, ['row_id'])
+            expected.make_analysis()
+            instance = ChunkedSingleColumnFilters(input_file_name, resulting_df, ['row_id'], chunksize=100)
+            instance.make_analysis(apply_filter=True)
+            filtered_df = pd.read_csv(input_file_name)
+        assert expected.usage_percentage == instance.usage_percentage
+        assert expected.filtering_quick_gains == instance.filtering_quick_gains
+        assert expected.best_filter == instance.best_filter
+        assert resulting_df['row_id'].isin(filtered_df['row_id']).all()
+
+    def test_dates_and_high_cardinality_columns_in_chunks(self):
+        input_df = pd.DataFrame({
+            'row_id': range(400),
+            'ship_date': pd.date_range('2018-06-01', periods=400, freq='D'),
+            'grade': ['a', 'b', 'c', 'd'] * 100
+        })
+        resulting_df = input_df.loc[(input_df['grade'] != 'd') & (input_df['ship_date'] >= '2019-01-01')]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            input_file_name = os.path.join(tmp_dir, 'input.csv')
+            input_df.to_csv(input_file_name, index=False)
+            expected = SingleColumnFilters(load_frame(input_file_name), resulting_df, ['row_id'])
+            expected.make_analysis()
+            instance = ChunkedSingleColumnFilters(input_file_name, resulting_df, ['row_id'], chunksize=100)
+            instance.input_profile = ChunkedColumnProfile(max_counted_values=50)
+            instance.make_analysis()
+        # 'row_id' is sketched after the first chunk, the dates are counted as dates
+        assert 'row_id' not in instance.input_profile.cached_value_counts()
+        assert 0 < expected.usage_percentage['ship_date'] == instance.usage_percentage['ship_date']
+        assert abs(expected.usage_percentage['row_id'] - instance.usage_percentage['row_id']) < 0.05
+        assert expected.usage_percentage['grade'] == instance.usage_percentage['grade']
+        assert expected.filtering_quick_gains == instance.filtering_quick_gains
+        assert expected.best_filter == instance.best_filter
+
+    def test_input_without_rows(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            input_file_name = os.path.join(tmp_dir, 'input.csv')
+            self.input_df.iloc[:0].to_csv(input_file_name, index=False)
+            instance = ChunkedSingleColumnFilters(input_file_name, self.resulting_df, merging_cols=['id2'], chunksize=2)
+            instance.find_matching_cols()
+            # depending on the pandas version a csv with just a header is read as one empty chunk or as none
+            instance._read_input_chunks = lambda: iter(())
+            with self.assertLogs(level='WARNING'):
+                instance._merge_input_to_final()
+        assert instance.extended_resulting_df.empty
+        assert instance.input_df.empty
+
+
+class TestParallelAnalysis(unittest.TestCase):
+
+    input_df = TestMultiColumnFilters.input_df
+    resulting_df = TestMultiColumnFilters.resulting_df.reset_index(drop=True)
+
+    def test_analyze_inputs_in_parallel(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filenames = [os.path.join(tmp_dir, 'input_{}.csv'.format(number)) for number in range(2)]
+            self.input_df.to_csv(filenames[0], index=False)
+            self.input_df.loc[self.input_df['unit'] != 'T'].to_csv(filenames[1], index=False)
+            analyses = analyze_inputs_in_parallel(
+                filenames, self.resulting_df, merging_dict={filename: ['index'] for filename in filenames},
+                max_workers=2
+            )
+            expected = list()
+            for filename in filenames:
+                instance = SingleColumnFilters(pd.read_csv(filename), self.resulting_df.copy(), ['index'])
+                instance.make_analysis()
+                expected.append(instance)
+        for analysis, instance in zip(analyses, expected):
+            assert analysis.filtering_quick_gains == instance.filtering_quick_gains
+            assert analysis.best_filter == instance.best_filter
+            assert analysis.input_df.empty
+
+
+class TestLoading(unittest.TestCase):
+
+    input_df = pd.DataFrame({
+        'revision_id': [1, 2, 3], 'unit': ['a', 'b', 'a'], 'start_date': ['2019-01-01', '2019-02-01', None]
+    })
+
+    def test_columns_to_load(self):
+        assert (['id', 'unit', 'other'], ['id', 'unit']) == columns_to_load(['id', 'unit', 'other'], ['id', 'unit', 'x'])
+        assert (['unit'], ['unit']) == columns_to_load(['unit', 'other'], ['unit', 'x'])
+        assert (['unit', 'other'], ['unit']) == columns_to_load(['unit', 'other'], ['unit', 'x'], merging_cols=['unit'])
+
+    def test_load_frame_parses_dates(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            input_file_name = os.path.join(tmp_dir, 'input.csv')
+            self.input_df.to_csv(input_file_name, index=False)
+            input_df = load_frame(input_file_name, ['unit', 'start_date'])
+        assert ['unit', 'start_date'] == list(input_df.columns)
+        assert pd.api.types.is_datetime64_any_dtype(input_df['start_date'])
+        assert input_df['start_date'].isna().sum() == 1
+
+    def test_load_frame_of_parquet_and_feather_files(self):
+        input_df = pd.DataFrame({'unit': ['KG', 'LB'], 'start_date': ['2019-01-01', '2019-02-01']})
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for file_name, write in (('input.parquet', input_df.to_parquet), ('input.feather', input_df.to_feather)):
+                write(os.path.join(tmp_dir, file_name))
+                loaded_df = load_frame(os.path.join(tmp_dir, file_name), ['start_date'])
+                assert ['start_date'] == list(loaded_df.columns)
+                assert pd.api.types.is_datetime64_any_dtype(loaded_df['start_date'])
+
+    def test_load_input_renames_and_prunes(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            input_file_name = os.path.join(tmp_dir, 'input.csv')
+            self.input_df.to_csv(input_file_name, index=False)
+            input_df = load_input(input_file_name, ['revisionId', 'unit'], renaming_cols={'revision_id': 'revisionId'})
+        assert ['revisionId', 'unit', 'start_date'] == list(input_df.columns)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            input_file_name = os.path.join(tmp_dir, 'input.csv')
+            self.input_df.to_csv(input_file_name, index=False)
+            input_df = load_input(input_file_name, ['unit', 'start_date'])
+        assert ['unit', 'start_date'] == list(input_df.columns)
+
+    def test_load_input_with_the_dtypes_of_the_result(self):
+        resulting_df = pd.DataFrame({'revisionId': ['1', '2'], 'unit': [1.0, 2.0], 'start_date': ['2019-01-01'] * 2})
+        assert {'revisionId': str, 'unit': 'float64'} == shared_dtypes(resulting_df.dtypes, ['revisionId', 'unit'])
+        input_df = pd.DataFrame({'revision_id': [1, 2, 3], 'unit': [1, 2, 1], 'start_date': ['2019-01-01'] * 3})
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            input_file_name = os.path.join(tmp_dir, 'input.csv')
+            input_df.to_csv(input_file_name, index=False)
+            input_df = load_input(
+                input_file_name, list(resulting_df.columns), renaming_cols={'revision_id': 'revisionId'},
+                dtype={'unit': 'int64'}, result_dtypes=resulting_df.dtypes
+            )
+        assert ['1', '2', '3'] == list(input_df['revisionId'])
+        assert pd.api.types.is_integer_dtype(input_df['unit'])
+        assert pd.api.types.is_datetime64_any_dtype(input_df['start_date'])
+
+    def test_analysis_does_not_modify_the_loaded_dfs(self):
+        input_df = self.input_df.rename(columns={'revision_id': 'revisionId'})
+        resulting_df = input_df.iloc[:2].copy()
+        instance = SingleColumnFilters(input_df, resulting_df, ['revisionId'])
+        instance.make_analysis()
+        assert pd.api.types.is_object_dtype(input_df['start_date'])
+        assert pd.api.types.is_datetime64_any_dtype(instance.input_df['start_date'])
+
+
+class TestProfileCache(unittest.TestCase):
+
+    input_df = TestMultiColumnFilters.input_df
+    resulting_df = TestMultiColumnFilters.resulting_df
+
+    def test_store_and_load_profile(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            input_file_name = os.path.join(tmp_dir, 'input.csv')
+            self.input_df.to_csv(input_file_name, index=False)
+            cache = ProfileCache(os.path.join(tmp_dir, 'cache'))
+            instance = SingleColumnFilters(
+                self.input_df, self.resulting_df, ['index'], input_profile=cache.load_profile(input_file_name, self.input_df)
+            )
+            instance.make_analysis()
+            cache.store_profile(instance.input_profile)
+            input_profile = cache.load_profile(input_file_name, self.input_df)
+            cached_instance = SingleColumnFilters(self.input_df, self.resulting_df, ['index'], input_profile=input_profile)
+            self.input_df.iloc[:10].to_csv(input_file_name, index=False)
+            changed_file_profile = cache.load_profile(input_file_name, self.input_df.iloc[:10])
+        assert set(input_profile.cached_value_counts()) == set(self.input_df.columns)
+        assert not changed_file_profile.cached_value_counts()
+        cached_instance.make_analysis()
+        assert cached_instance.filtering_quick_gains == instance.filtering_quick_gains
+        assert cached_instance.usage_percentage == instance.usage_percentage
+
+    def test_evict(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = ProfileCache(os.path.join(tmp_dir, 'cache'), max_bytes=1)
+            input_file_name = os.path.join(tmp_dir, 'input.csv')
+            self.input_df.to_csv(input_file_name, index=False)
+            profile = cache.load_profile(input_file_name, self.input_df)
+            profile.value_counts('unit')
+            cache.store_profile(profile)
+            assert not os.listdir(cache.cache_dir)
+
+
+class TestPredicates(unittest.TestCase):
+
+    def test_to_sql(self):
+        assert '("unit" <> \'T\' OR "unit" IS NULL)' == to_sql(('unit', 'T', 'string', 80, 0.33))
+        assert '("qty" NOT IN (1, 2) OR "qty" IS NULL)' == to_sql(('qty', [1, 2], 'int'))
+        assert '"qty" IS NOT NULL' == to_sql(('qty', {np.nan}, 'int'))
+        assert '"qty" IS NOT NULL' == to_sql(('qty', np.nan, 'int'))
+        assert '"ship_date" IS NOT NULL' == to_sql(('ship_date', 'nan', 'date'))
+        assert '("ship_date" >= TIMESTAMP \'2019-01-01 00:00:00\' OR "ship_date" IS NULL)' == to_sql(
+            ('ship_date', ('ytd', datetime.date(2019, 1, 1)), 'date'))
+        assert 'TRUE' == to_sql_where([])
+
+    def test_date_slice_keeps_the_cutoff(self):
+        import pyarrow
+        import pyarrow.dataset
+        df = pd.DataFrame({'ship_date': pd.to_datetime(['2018-12-31', '2019-01-01', None, '2019-01-02'])})
+        filter_ = ('ship_date', ('ytd', datetime.date(2019, 1, 1)), 'date')
+        assert [False, True, True, True] == list(SingleColumnFilters._filter_mask(df, filter_))
+        dataset = pyarrow.dataset.dataset(pyarrow.Table.from_pandas(df))
+        assert 3 == dataset.count_rows(filter=to_dataset_expression(filter_))
+
+    def test_date_window_keeps_the_fractions_of_a_second(self):
+        import pyarrow
+        import pyarrow.dataset
+        df = pd.DataFrame({'ship_date': pd.to_datetime([
+            '2019-01-01 11:59:59.9', '2019-01-01 12:00:00.5', '2019-01-31 23:59:59.999999999', '2019-02-01'
+        ])})
+        exact_filter = ('ship_date', (DATE_WINDOW_FILTER, tuple(df['ship_date'][:2])), 'date')
+        month_filter = ('ship_date', (DATE_WINDOW_FILTER, (pd.Timestamp('2019-01-01'), df['ship_date'][2])), 'date')
+        assert ('("ship_date" >= TIMESTAMP \'2019-01-01 11:59:59.900000\' AND "ship_date" < TIMESTAMP '
+                '\'2019-01-01 12:00:00.500001\' OR "ship_date" IS NULL)') == to_sql(exact_filter)
+        assert ('("ship_date" >= TIMESTAMP \'2019-01-01 00:00:00\' AND "ship_date" < TIMESTAMP '
+                '\'2019-02-01 00:00:00\' OR "ship_date" IS NULL)') == to_sql(month_filter)
+        dataset = pyarrow.dataset.dataset(pyarrow.Table.from_pandas(df))
+        for filter_, kept_rows in ((exact_filter, 2), (month_filter, 3)):
+            assert kept_rows == SingleColumnFilters._filter_mask(df, filter_).sum()
+            assert kept_rows == dataset.count_rows(filter=to_dataset_expression(filter_))
+
+    def test_export_predicates_measures_the_saving(self):
+        instance = SingleColumnFilters(
+            TestMultiColumnFilters.input_df, TestMultiColumnFilters.resulting_df, ['index']
+        )
+        instance.make_analysis()
+        instance.plan_filters()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            predicates = export_predicates(instance, os.path.join(tmp_dir, 'input.parquet'))
+        assert 2 == len(predicates['filters'])
+        assert predicates['claimed_rows'] == predicates['measure']['saved_rows'] == 120
+        assert predicates['measure']['filtered']['rows'] == len(TestMultiColumnFilters.resulting_df)
+
+    def test_export_predicates_rewrites_a_stale_copy(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            input_file_name = os.path.join(tmp_dir, 'input.csv')
+            parquet_path = os.path.join(tmp_dir, 'input.parquet')
+            TestMultiColumnFilters.input_df.iloc[:10].to_parquet(parquet_path, index=False)
+            os.utime(parquet_path, (0, 0))
+            TestMultiColumnFilters.input_df.to_csv(input_file_name, index=False)
+            instance = SingleColumnFilters(
+                TestMultiColumnFilters.input_df, TestMultiColumnFilters.resulting_df, ['index'],
+                input_file_name=input_file_name
+            )
+            instance.make_analysis()
+            predicates = export_predicates(instance, parquet_path)
+        assert predicates['measure']['unfiltered']['rows'] == len(TestMultiColumnFilters.input_df)
+
+    def test_export_predicates_skips_the_measure_of_a_chunked_analysis(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            input_file_name = os.path.join(tmp_dir, 'input.csv')
+            TestMultiColumnFilters.input_df.to_csv(input_file_name, index=False)
+            instance = ChunkedSingleColumnFilters(
+                input_file_name, TestMultiColumnFilters.resulting_df, ['index'], chunksize=50
+            )
+            instance.make_analysis()
+            with self.assertLogs(level='WARNING'):
+                predicates = export_predicates(instance, os.path.join(tmp_dir, 'input.parquet'))
+        assert predicates['sql_where']
+        assert predicates['measure'] is None
+
+
+class TestSketches(unittest.TestCase):
+
+    def test_hyperloglog_bounds(self):
+        for n_unique in [10, 5000, 200000]:
+            sketch = HyperLogLog.for_error(0.01)
+            sketch.add_series(pd.Series(np.arange(n_unique * 2) % n_unique))
+            lower_bound, upper_bound = sketch.bounds()
+            assert lower_bound <= n_unique <= upper_bound
+
+    def test_for_error(self):
+        assert 14 == HyperLogLog.for_error(0.01).precision
+        assert HyperLogLog.for_error(0.01).relative_error <= 0.01
+
+    def test_bloom_filter(self):
+        bloom_filter = BloomFilter(1000, false_positive_rate=0.01)
+        bloom_filter.add_series(pd.Series(['key{}'.format(i) for i in range(1000)]))
+        assert bloom_filter.contains_series(pd.Series(['key{}'.format(i) for i in range(1000)])).all()
+        assert bloom_filter.contains_series(pd.Series(['other{}'.format(i) for i in range(1000)])).mean() < 0.05
+
+    def test_isin_with_a_bloom_filter(self):
+        profile = ColumnProfile(pd.DataFrame({'id': np.arange(200000)}))
+        values = pd.Index(np.arange(150000, 250000))
+        assert (profile.isin('id', values) == (values < 200000)).all()
+        assert 'id' not in profile.cached_value_counts()
+        # the hashes of the BloomFilter also filled the sketch of the column
+        assert 'id' in profile._n_unique_bounds
+        lower_bound, upper_bound = profile.n_unique_bounds('id')
+        assert lower_bound <= 200000 <= upper_bound
+
+    def test_isin_counts_low_cardinality_columns(self):
+        profile = ColumnProfile(pd.DataFrame({'grade': np.arange(200000) % 4}))
+        assert [True, False] == list(profile.isin('grade', pd.Index([0, 5])))
+        assert 'grade' in profile.cached_value_counts()
+        assert not profile._n_unique_bounds and not profile._bloom_filters
+
+    def test_natural_divider_skips_counting_high_cardinality_columns(self):
+        input_df = pd.DataFrame({
+            'row_id': np.arange(10000),
+            'grade': np.arange(10000) % 4
+        })
+        # 'row_id' is not in the result, so it is not counted by the usage check
+        resulting_df = input_df[input_df['grade'] != 3].drop(columns='row_id').drop_duplicates()
+        instance = SingleColumnFilters(input_df, resulting_df)
+        instance.make_analysis()
+        assert 'grade' in instance.natural_dividers_dtypes
+        assert 'row_id' not in instance.natural_dividers_dtypes
+        assert 'row_id' not in instance.input_profile.cached_value_counts()
+
+    def test_usage_percentage_of_high_cardinality_columns_is_estimated(self):
+        input_df = pd.DataFrame({
+            'index': np.arange(160000),
+            'row_id': np.arange(160000) * 7,
+            'grade': np.arange(160000) % 4
+        })
+        resulting_df = input_df.loc[input_df['grade'] != 3, ['index']]
+        instance = SingleColumnFilters(input_df, resulting_df, ['index'])
+        instance.make_analysis()
+        assert 'grade' in instance.natural_dividers_dtypes
+        assert {'index', 'row_id'}.isdisjoint(instance.input_profile.cached_value_counts())
+        # the 'final_df' columns are probed with their BloomFilter, not counted, the input ones are only sketched
+        assert {'index', 'row_id'}.isdisjoint(instance.final_profile.cached_value_counts())
+        assert {'index', 'row_id'}.isdisjoint(instance.result_profile.cached_value_counts())
+        assert 'row_id' in instance.final_profile._bloom_filters
+        assert not instance.input_profile._bloom_filters
+        assert abs(instance.usage_percentage['row_id'] - 0.75) < 0.05
+        assert 0.75 == instance.usage_percentage['grade']
+
+
+class TestBenchmarks(unittest.TestCase):
+
+    def test_make_frames(self):
+        input_df, resulting_df = make_frames(rows=2000, category_cols=2, cardinality=8, nan_ratio=0.1)
+        assert 2000 == len(input_df)
+        assert 0 < len(resulting_df) <= 0.3 * len(input_df)
+        assert resulting_df['row_id'].isin(input_df['row_id']).all()
+        assert 8 == input_df['category_1'].nunique()
+        assert input_df['ship_date'].isna().any()
+
+    def test_compare_with_baseline(self):
+        data_params = {'rows': 2000, 'category_cols': 2}
+        baseline = run_benchmarks(data_params, repeat=1, stages=['merge', 'usage_percentage'])
+        results = {'data_params': data_params, 'stages': {
+            name: dict(measures, seconds=measures['seconds'] * 2) for name, measures in baseline['stages'].items()
+        }}
+        assert not compare_with_baseline(baseline, baseline)
+        regressions = compare_with_baseline(results, baseline)
+        assert ['merge', 'usage_percentage'] == [regression['stage'] for regression in regressions]
+
+
+class TestInstrumentation(unittest.TestCase):
+
+    def test_stats_of_the_stages_and_columns(self):
+        received = list()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            stats_file = os.path.join(tmp_dir, 'stats.jsonl')
+            instance = SingleColumnFilters(
+                TestMultiColumnFilters.input_df, TestMultiColumnFilters.resulting_df, ['index'],
+                instrumentation=Instrumentation(received.append, stats_file)
+            )
+            instance.make_analysis()
+            with open(stats_file) as stats:
+                assert len(instance.stats) == len(stats.readlines())
+        assert received == instance.stats
+        stages = [record['stage'] for record in instance.instrumentation.stage_records()]
+        assert ['merge', 'usage_percentage', 'natural_dividers', 'slicing_filters', 'best_filter'] == stages
+        usage_columns = [record['column'] for record in instance.stats
+                         if record['stage'] == 'usage_percentage' and record['column'] is not None]
+        assert sorted(usage_columns) == sorted(instance.usage_percentage)
+        assert all(record['rows'] == len(TestMultiColumnFilters.input_df) for record in instance.stats
+                   if record['stage'] != 'best_filter')
+
+    def test_trace_memory_of_nested_stages(self):
+        instrumentation = Instrumentation(trace_memory=True)
+        with instrumentation.stage('outer'):
+            with instrumentation.stage('inner', column='col'):
+                inner_array = np.ones(10 ** 6)
+            del inner_array
+        inner, outer = instrumentation.records
+        assert inner['memory_bytes'] >= 8 * 10 ** 6
+        assert outer['memory_bytes'] >= inner['memory_bytes']
+
+
+class TestResultIndex(unittest.TestCase):
+
+    def test_rows_with_keys(self):
+        result_df = pd.DataFrame({'id1': [1, np.nan, 3], 'id2': ['a', 'b', 'c']})
+        input_df = pd.DataFrame({'id1': [1, 1, np.nan, 4], 'id2': ['a', 'b', 'b', 'c']})
+        assert [True, True, True, False] == list(rows_with_keys(input_df, ['id1'], key_index(result_df, ['id1'])))
+        assert [True, False, True, False] == list(
+            rows_with_keys(input_df, ['id1', 'id2'], key_index(result_df, ['id1', 'id2'])))
+
+    def test_analyses_in_threads(self):
+        input_df, resulting_df = TestMultiColumnFilters.input_df, TestMultiColumnFilters.resulting_df
+        result_index = ResultIndex(resulting_df).prepare()
+        inputs = [input_df, input_df.iloc[::2], input_df.iloc[:150]]
+
+        def analyse(analysis):
+            analysis.make_analysis()
+            return analysis
+
+        with concurrent.futures.ThreadPoolExecutor(3) as executor:
+            analyses = list(executor.map(analyse, [result_index.analysis(df, ['index']) for df in inputs]))
+        for df, analysis in zip(inputs, analyses):
+            expected = analyse(SingleColumnFilters(df, resulting_df, ['index']))
+            assert expected.filtering_quick_gains == analysis.filtering_quick_gains
+            assert expected.best_filter == analysis.best_filter
+            assert analysis.result_profile is result_index.profile
+        assert [('index',)] == list(result_index._key_indexes)
+
+
+class TestScratchStore(unittest.TestCase):
+
+    def test_spill_and_open(self):
+        input_df, resulting_df = make_frames(rows=2000, category_cols=2, cardinality=8, nan_ratio=0.1)
+        with ScratchStore() as scratch_store:
+            mapped_df = scratch_store.spill_and_open('result', resulting_df)
+            assert os.path.exists(scratch_store.path('result'))
+        assert not os.path.exists(scratch_store.directory)
+        assert_frame_equal(resulting_df.reset_index(drop=True), mapped_df)
+        # a view of the mapped file
+        assert not mapped_df['row_id'].values.flags.writeable
+        expected = SingleColumnFilters(input_df, resulting_df, ['row_id'])
+        expected.make_analysis()
+        analysis = SingleColumnFilters(input_df, mapped_df, ['row_id'])
+        analysis.make_analysis()
+        assert expected.filtering_quick_gains == analysis.filtering_quick_gains
+
+    def test_analyze_inputs_in_parallel(self):
+        input_df = TestParallelAnalysis.input_df
+        with tempfile.TemporaryDirectory() as tmp_dir, ScratchStore(tmp_dir) as scratch_store:
+            filename = os.path.join(tmp_dir, 'input.csv')
+            input_df.to_csv(filename, index=False)
+            analyses = analyze_inputs_in_parallel(
+                [filename], TestParallelAnalysis.resulting_df, merging_dict={filename: ['index']}, max_workers=1,
+                scratch_store=scratch_store
+            )
+        expected = SingleColumnFilters(input_df, TestParallelAnalysis.resulting_df, ['index'])
+        expected.make_analysis()
+        assert expected.best_filter == analyses[0].best_filter
+
+
+class TestReportGeneration(unittest.TestCase):
+
+    def test_reports_share_the_plotly_asset(self):
+        analysis = SingleColumnFilters(
+            TestMultiColumnFilters.input_df, TestMultiColumnFilters.resulting_df.reset_index(drop=True), ['index']
+        )
+        analysis.make_analysis()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            report_paths = [
+                print_report(analysis, 'input.csv', 'result.csv', generate_data_usage_plot(analysis), tmp_dir),
+                print_combined_report([analysis, analysis], ['input.csv', 'other.csv'], 'result.csv', tmp_dir)
+            ]
+            assert {PLOTLY_ASSET_FILE} | {os.path.basename(path) for path in report_paths} == set(os.listdir(tmp_dir))
+            for report_path in report_paths:
+                with open(report_path) as report_file:
+                    report = report_file.read()
+                assert 'src="./plotly.min.js"' in report
+                assert 'Plotly.newPlot' in report
+                assert os.path.getsize(report_path) < 100000
+
+
+class TestCli(unittest.TestCase):
+
+    input_df = TestMultiColumnFilters.input_df
+    resulting_df = TestMultiColumnFilters.resulting_df.reset_index(drop=True)
+
+    def write_inputs(self, tmp_dir):
+        input_path, result_path = os.path.join(tmp_dir, 'input'), os.path.join(tmp_dir, 'result')
+        os.makedirs(input_path)
+        os.makedirs(result_path)
+        input_file = os.path.join(input_path, 'input.csv')
+        self.input_df.to_csv(input_file, index=False)
+        self.resulting_df.to_csv(os.path.join(result_path, 'result.csv'), index=False)
+        return [
+            '--input-path', input_path, '--result-path', result_path, '--merging-dict',
+            json.dumps({input_file: ['index']}), '--report-dir', tmp_dir
+        ]
+
+    def test_headless_analyze_does_not_import_plotly(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            findings_file = os.path.join(tmp_dir, 'findings.json')
+            argv = ['analyze'] + self.write_inputs(tmp_dir) + ['--no-report', '--findings', findings_file]
+            output = subprocess.check_output([
+                sys.executable, '-c', 'import sys; from pandas_report_tracer.cli import main; main({!r}); '
+                                      'print("plotly" in sys.modules, "jinja2" in sys.modules)'.format(argv)
+            ], cwd=os.path.dirname(HERE))
+            with open(findings_file) as findings:
+                saved_findings = json.load(findings)
+        assert b'False False' == output.strip()
+        expected = SingleColumnFilters(self.input_df, self.resulting_df, ['index'])
+        expected.make_analysis()
+        assert [finding['column'] for finding in expected.filtering_quick_gains] == [
+            finding['column'] for finding in saved_findings[0]['filtering_quick_gains']
+        ]
+        assert list(expected.best_filter[:2]) == saved_findings[0]['best_filter'][:2]
+
+    def test_parallel_analyze_applies_every_option(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            argv = self.write_inputs(tmp_dir) + [
+                '--no-report', '--plan-filters', '2', '--sample-size', '100', '--parquet-copy-dir', tmp_dir
+            ]
+            all_findings = list()
+            for extra_argv in ([], ['--parallel-workers', '1']):
+                findings_file = os.path.join(tmp_dir, 'findings.json')
+                assert 0 == cli_main(['analyze'] + argv + extra_argv + ['--findings', findings_file])
+                with open(findings_file) as findings:
+                    all_findings.append(json.load(findings)[0])
+        sequential, parallel = all_findings
+        # the findings not confirmed are extrapolated from a random sample, the confirmed best filter and plan are not
+        for key in ('best_filter', 'filter_plan'):
+            assert sequential[key] == parallel[key]
+        assert 2 == len(parallel['filter_plan'])
+        assert parallel['predicates']['measure']['saved_rows'] == parallel['predicates']['claimed_rows']
+        # the usage of the sampled columns is estimated
+        assert 'estimated' in parallel['filtering_quick_gains'][0]
+
+    def test_command_argv(self):
+        assert ['analyze', '--chunksize', '1000', '--categorical', '--merging-dict', '{"a.csv": ["id"]}'] == command_argv(
+            'analyze', chunksize=1000, categorical=True, date_window=None, combined=False, merging_dict={'a.csv': ['id']}
+        )
+
+    def test_report_of_saved_analyses(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            saved_file = os.path.join(tmp_dir, 'analyses.pickle')
+            assert 0 == cli_main(['analyze'] + self.write_inputs(tmp_dir) + ['--no-report', '--save-analyses', saved_file])
+            assert 0 == cli_main(['report', saved_file, '--combined', '--report-dir', tmp_dir])
+            assert 1 == len([name for name in os.listdir(tmp_dir) if name.startswith('combined_report_results')])
+
+    def test_iterate(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            argv = self.write_inputs(tmp_dir)
+            assert 0 == cli_main(['iterate'] + argv + ['--no-report', '--max-runs', '2'])
+            filtered_df = pd.read_csv(os.path.join(argv[1], 'input.csv'))
+        assert len(filtered_df) < len(self.input_df)
+        assert filtered_df['index'].isin(self.resulting_df['index']).sum() == len(self.resulting_df)
+
+    def test_iterate_removes_the_scratch_store_on_failure(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            scratch_dir = os.path.join(tmp_dir, 'scratch')
+            os.makedirs(scratch_dir)
+            argv = self.write_inputs(tmp_dir) + ['--no-report', '--scratch-dir', scratch_dir]
+            # no csv has these merge keys
+            argv[argv.index('--merging-dict') + 1] = json.dumps({os.path.join(argv[1], 'input.csv'): ['missing']})
+            with self.assertRaises(Exception):
+                cli_main(['iterate'] + argv)
+            assert not os.listdir(scratch_dir)